@@ -1,13 +1,55 @@
 from flask import Flask, render_template_string, request, jsonify
 import requests
 from datetime import datetime
-import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from prefetcher import Prefetcher, RateBudget
+from weather_history import WeatherHistory
+from upstream_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+from weather_cache import WeatherCache
 
 app = Flask(__name__)
 
 # API Configuration
-API_KEY = "YOUR_API_KEY_HERE"  # Replace with your OpenWeatherMap API key
-BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
+API_KEY = os.environ.get('OPENWEATHER_API_KEY', "YOUR_API_KEY_HERE")  # Replace with your OpenWeatherMap API key
+BASE_URL = os.environ.get('OPENWEATHER_URL', "http://api.openweathermap.org/data/2.5/weather")
+
+# Cache Configuration (weather updates roughly every 10 minutes)
+CACHE_TTL = 600            # seconds a reading is served as fresh
+CACHE_STALE_TTL = 600      # further seconds it is served while being refreshed
+CACHE_NEGATIVE_TTL = 60    # seconds a "city not found" answer is cached
+CACHE_SIZE = 1000          # cities kept in memory
+
+# Upstream Connection Configuration
+UPSTREAM_POOL_SIZE = 200       # keep-alive connections kept open (one per batch worker)
+UPSTREAM_TIMEOUT = 10          # seconds per attempt
+UPSTREAM_RETRIES = 2           # extra attempts on connection errors / 429 / 5xx
+UPSTREAM_BACKOFF = 0.2         # base seconds for jittered exponential backoff
+BREAKER_THRESHOLD = 5          # consecutive failures that open the circuit
+BREAKER_RESET = 30             # seconds before a trial call is let through
+
+# Prefetch Configuration (keeps popular cities fresh ahead of expiry)
+PREFETCH_ENABLED = True
+PREFETCH_TOP_N = 50        # most requested cities kept warm
+PREFETCH_LEAD = 60         # refresh when an entry expires within this many seconds
+PREFETCH_INTERVAL = 10     # seconds between scheduler runs
+PREFETCH_HALF_LIFE = 3600  # seconds for a city's request count to halve
+UPSTREAM_RATE = 1.0        # upstream calls per second allowed (free tier: 60/min)
+UPSTREAM_BURST = 60        # calls that may be saved up for bursts
+PREFETCH_RESERVE = 20      # budget always left to user requests
+
+# History Configuration
+HISTORY_DB = os.environ.get('WEATHER_HISTORY_DB', 'weather_history.db')
+HISTORY_LIMIT = 1000       # readings returned per history query
+
+# Batch Configuration
+BATCH_MAX_CITIES = 200     # cities accepted in one batch request
+BATCH_WORKERS = 200        # concurrent upstream lookups across all batches
+BATCH_DEADLINE = 8         # seconds before a batch returns what it has
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -294,7 +336,7 @@ HTML_TEMPLATE = """
                 const result = await response.json();
                 
                 if (result.success) {
-                    alert(`Weather data saved to ${result.filename}`);
+                    alert(`Weather data for ${result.city} saved to history`);
                 } else {
                     alert('Failed to save weather data');
                 }
@@ -337,6 +379,79 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(HTML_TEMPLATE)
 
+def normalize_city(city):
+    """Cache key for a city: collapsed whitespace, case-insensitive"""
+    return ' '.join(city.split()).casefold()
+
+def fetch_weather(city):
+    """Call OpenWeatherMap; returns (status_code, payload)"""
+    params = {
+        'q': city,
+        'appid': API_KEY,
+        'units': 'metric'
+    }
+    upstream_budget.spend()
+    response = upstream.get(BASE_URL, params=params)
+    payload = response.json() if response.status_code == 200 else None
+    return response.status_code, payload
+
+upstream = UpstreamClient(pool_size=UPSTREAM_POOL_SIZE, retries=UPSTREAM_RETRIES,
+                          backoff=UPSTREAM_BACKOFF, timeout=UPSTREAM_TIMEOUT,
+                          breaker=CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET))
+
+def cache_ttl_for(result):
+    """Cache readings and "not found" answers; never cache errors"""
+    status, _ = result
+    if status == 200:
+        return CACHE_TTL
+    if status == 404:
+        return CACHE_NEGATIVE_TTL
+    return 0
+
+weather_cache = WeatherCache(ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, max_size=CACHE_SIZE,
+                             ttl_for=cache_ttl_for)
+
+upstream_budget = RateBudget(rate=UPSTREAM_RATE, burst=UPSTREAM_BURST)
+
+prefetcher = Prefetcher(weather_cache, fetch_weather, upstream_budget, top_n=PREFETCH_TOP_N,
+                        lead=PREFETCH_LEAD, interval=PREFETCH_INTERVAL,
+                        half_life=PREFETCH_HALF_LIFE, reserve=PREFETCH_RESERVE)
+
+def get_cached_weather(city):
+    """(status_code, payload) for a city and how it was served (HIT/STALE/MISS)"""
+    city = ' '.join(city.split())
+    key = normalize_city(city)
+    result, source = weather_cache.get(key, lambda: fetch_weather(city))
+    if result[0] == 200:
+        prefetcher.record(key, city)   # only real cities are worth keeping warm
+    return result, source
+
+def describe_error(city, status):
+    """Error message for a non-200 upstream status"""
+    if status == 404:
+        return f'City "{city}" not found'
+    elif status == 401:
+        return 'Invalid API key'
+    else:
+        return f'Error: {status}'
+
+def upstream_error(e):
+    """(message, status_code) for an exception raised while fetching"""
+    if isinstance(e, CircuitOpenError):
+        return 'Weather service temporarily unavailable', 503
+    elif isinstance(e, requests.exceptions.ConnectionError):
+        return 'Connection error. Check your internet.', 500
+    elif isinstance(e, requests.exceptions.Timeout):
+        return 'Request timed out', 500
+    else:
+        return str(e), 500
+
+def weather_response(city, status, data):
+    """Turn an upstream (status_code, payload) into the API response"""
+    if status == 200:
+        return jsonify(data), 200
+    return jsonify({'error': describe_error(city, status)}), status
+
 @app.route('/api/weather')
 def get_weather():
     city = request.args.get('city', '')
@@ -348,45 +463,158 @@ def get_weather():
         return jsonify({'error': 'Please configure your API key'}), 500
     
     try:
-        params = {
-            'q': city,
-            'appid': API_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(BASE_URL, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            return jsonify(response.json())
-        elif response.status_code == 404:
-            return jsonify({'error': f'City "{city}" not found'}), 404
-        elif response.status_code == 401:
-            return jsonify({'error': 'Invalid API key'}), 401
-        else:
-            return jsonify({'error': f'Error: {response.status_code}'}), response.status_code
-            
-    except requests.exceptions.ConnectionError:
-        return jsonify({'error': 'Connection error. Check your internet.'}), 500
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Request timed out'}), 500
+        (status, data), source = get_cached_weather(city)
+    except Exception as e:
+        message, status = upstream_error(e)
+        return jsonify({'error': message}), status
+    
+    response, status = weather_response(city, status, data)
+    response.headers['X-Cache'] = source
+    return response, status
+
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='weather-batch')
+
+def parse_cities(value):
+    """Cities from a comma separated string or a list, deduplicated in order"""
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        return []
+    cities, seen = [], set()
+    for city in value:
+        if not isinstance(city, str):
+            continue
+        city = ' '.join(city.split())
+        key = normalize_city(city)
+        if key and key not in seen:
+            seen.add(key)
+            cities.append(city)
+    return cities
+
+def lookup_for_batch(city):
+    """One batch entry: (status_code, payload or error message)"""
+    try:
+        (status, data), _ = get_cached_weather(city)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return upstream_error(e)[::-1]
+    if status == 200:
+        return status, data
+    return status, describe_error(city, status)
+
+def get_batch_weather(cities, deadline):
+    """Look cities up concurrently; whatever misses the deadline is reported as 504"""
+    start = time.perf_counter()
+    futures = {city: batch_pool.submit(lookup_for_batch, city) for city in cities}
+    wait(futures.values(), timeout=deadline)
+    
+    results, errors, timed_out = {}, {}, []
+    for city, future in futures.items():
+        if not future.done():
+            # Left running: its answer still lands in the cache for the next request
+            timed_out.append(city)
+            errors[city] = {'error': 'Timed out', 'status': 504}
+            continue
+        status, payload = future.result()
+        if status == 200:
+            results[city] = payload
+        else:
+            errors[city] = {'error': payload, 'status': status}
+    return {
+        'results': results,
+        'errors': errors,
+        'complete': not timed_out,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+@app.route('/api/weather/batch', methods=['GET', 'POST'])
+def get_weather_batch():
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        cities = parse_cities(body.get('cities'))
+        deadline = body.get('deadline', BATCH_DEADLINE)
+    else:
+        cities = parse_cities(request.args.get('cities', ''))
+        deadline = request.args.get('deadline', BATCH_DEADLINE)
+    
+    if not cities:
+        return jsonify({'error': 'At least one city is required'}), 400
+    if len(cities) > BATCH_MAX_CITIES:
+        return jsonify({'error': f'At most {BATCH_MAX_CITIES} cities per batch'}), 400
+    try:
+        deadline = float(deadline)
+    except (TypeError, ValueError):
+        deadline = math.nan
+    if not math.isfinite(deadline) or deadline <= 0:
+        return jsonify({'error': 'deadline must be a positive number of seconds'}), 400
+    deadline = min(deadline, BATCH_DEADLINE)
+    
+    if API_KEY == "YOUR_API_KEY_HERE":
+        return jsonify({'error': 'Please configure your API key'}), 500
+    
+    return jsonify(get_batch_weather(cities, deadline))
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify(dict(weather_cache.stats(), upstream=upstream.stats(),
+                        prefetch=prefetcher.stats()))
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_history():
+    """The shared WeatherHistory, opened on first use"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = WeatherHistory(HISTORY_DB)
+    return _history
+
+def parse_time(value, default):
+    """Epoch seconds or an ISO 8601 date/time -> epoch seconds"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 @app.route('/api/save', methods=['POST'])
 def save_weather():
     try:
         data = request.json
-        filename = f"weather_{data['name']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        city, observed_at, saved_at = get_history().append(data)
         
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=4)
-        
-        return jsonify({'success': True, 'filename': filename})
+        return jsonify({'success': True, 'city': city, 'observed_at': observed_at,
+                        'saved_at': saved_at})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/history')
+def weather_history():
+    city = request.args.get('city', '')
+    
+    if not city:
+        return jsonify({'error': 'City name is required'}), 400
+    
+    try:
+        start = parse_time(request.args.get('start'), 0)
+        end = parse_time(request.args.get('end'), None)
+        limit = max(1, min(int(request.args.get('limit', HISTORY_LIMIT)), HISTORY_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'start/end must be epoch seconds or ISO dates'}), 400
+    
+    readings = get_history().query(city, start, end, limit)
+    return jsonify({'city': city, 'count': len(readings), 'readings': readings})
+
 if __name__ == '__main__':
     print("🌤️  Weather App starting...")
     print("📍 Open your browser and go to: http://127.0.0.1:5000")
     print("⌨️  Press Ctrl+C to stop the server")
+    if PREFETCH_ENABLED:
+        prefetcher.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Benchmarks for the weather app, against the local fake upstream
+
+Usage:
+python benchmark.py cache [--users 50] [--cities 5] [--rounds 4] [--latency 0.2]
+python benchmark.py session [--requests 500] [--latency 0]
+python benchmark.py batch [--cities 200] [--latency 0.2]
+python benchmark.py prefetch [--users 20] [--cities 20] [--duration 10] [--ttl 2] [--latency 0.2]
+"""
+
+import argparse
+import random
+import threading
+import time
+
+import requests
+
+import Weather
+from fake_upstream import FakeUpstream
+from prefetcher import Prefetcher, RateBudget
+from upstream_client import UpstreamClient
+from weather_cache import MISS, WeatherCache
+
+
+class NoCache:
+    """Stand-in for Weather.weather_cache that always calls upstream"""
+
+    def get(self, key, fetch):
+        return fetch(), MISS
+
+    def clear(self):
+        pass
+
+
+def use_upstream(upstream):
+    Weather.BASE_URL = upstream.url
+    Weather.API_KEY = 'benchmark'
+
+
+def run_users(users, requests_per_user, cities):
+    """`users` threads each requesting random cities; returns (seconds, latencies)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def user():
+        client = Weather.app.test_client()
+        for _ in range(requests_per_user):
+            city = random.choice(cities)
+            start = time.perf_counter()
+            response = client.get(f'/api/weather?city={city}')
+            assert response.status_code == 200, response.status_code
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_cache(args):
+    """Upstream calls and latency: no cache vs TTL cache with coalescing"""
+    cities = [f'City{i}' for i in range(args.cities)]
+    cache = Weather.weather_cache
+    with FakeUpstream(latency=args.latency) as upstream:
+        use_upstream(upstream)
+        for label, replacement in (('no cache', NoCache()), ('cache', cache)):
+            Weather.weather_cache = replacement
+            replacement.clear()
+            upstream.reset_counts()
+            elapsed, latencies = run_users(args.users, args.rounds, cities)
+            print(f'{label:>9}: {len(latencies)} requests in {elapsed:.2f}s, '
+                  f'{upstream.requests} upstream calls, '
+                  f'p50 {percentile(latencies, 50) * 1000:.1f} ms  '
+                  f'p99 {percentile(latencies, 99) * 1000:.1f} ms')
+    Weather.weather_cache = cache
+
+
+def bench_session(args):
+    """Per-call requests.get vs the pooled keep-alive session"""
+    client = UpstreamClient()
+    callers = (('requests.get', lambda url, params: requests.get(url, params=params, timeout=10)),
+               ('session', client.get))
+    with FakeUpstream(latency=args.latency) as upstream:
+        for label, get in callers:
+            upstream.reset_counts()
+            latencies = []
+            start = time.perf_counter()
+            for i in range(args.requests):
+                call_start = time.perf_counter()
+                response = get(upstream.url, {'q': f'City{i % 50}', 'appid': 'benchmark'})
+                assert response.status_code == 200, response.status_code
+                latencies.append(time.perf_counter() - call_start)
+            elapsed = time.perf_counter() - start
+            print(f'{label:>12}: {args.requests} calls in {elapsed:.2f}s, '
+                  f'{len(upstream.connections)} connections, '
+                  f'mean {elapsed / args.requests * 1000:.2f} ms  '
+                  f'p99 {percentile(latencies, 99) * 1000:.2f} ms')
+    client.close()
+
+
+def bench_batch(args):
+    """A dashboard of --cities cities: one request per city vs one batch request"""
+    cities = [f'City{i}' for i in range(args.cities)]
+    client = Weather.app.test_client()
+    with FakeUpstream(latency=args.latency) as upstream:
+        use_upstream(upstream)
+        
+        Weather.weather_cache.clear()
+        start = time.perf_counter()
+        for city in cities:
+            assert client.get(f'/api/weather?city={city}').status_code == 200
+        print(f'  one by one: {time.perf_counter() - start:.2f}s')
+        
+        for label in ('batch (cold)', 'batch (warm)'):
+            if label.endswith('(cold)'):
+                Weather.weather_cache.clear()
+            upstream.reset_counts()
+            start = time.perf_counter()
+            body = client.post('/api/weather/batch', json={'cities': cities}).get_json()
+            elapsed = time.perf_counter() - start
+            assert body['complete'] and len(body['results']) == len(cities)
+            print(f'{label:>12}: {elapsed:.2f}s, {upstream.requests} upstream calls '
+                  f'on {len(upstream.connections)} connections')
+
+
+def bench_prefetch(args):
+    """Share of requests that wait on upstream, with and without prefetching"""
+    cities = [f'City{i}' for i in range(args.cities)]
+    weights = [1 / (rank + 1) for rank in range(args.cities)]   # Zipf-like popularity
+    cache, prefetcher = Weather.weather_cache, Weather.prefetcher
+    with FakeUpstream(latency=args.latency) as upstream:
+        use_upstream(upstream)
+        for label in ('on demand', 'prefetch'):
+            Weather.weather_cache = WeatherCache(ttl=args.ttl, stale_ttl=0)
+            Weather.prefetcher = Prefetcher(Weather.weather_cache, Weather.fetch_weather,
+                                            RateBudget(rate=1000, burst=1000),
+                                            top_n=args.cities, lead=args.ttl / 2,
+                                            interval=args.ttl / 10)
+            if label == 'prefetch':
+                Weather.prefetcher.start()
+            deadline = time.perf_counter() + args.duration
+            latencies, misses = [], [0]
+            lock = threading.Lock()
+
+            def user():
+                client = Weather.app.test_client()
+                while time.perf_counter() < deadline:
+                    city = random.choices(cities, weights)[0]
+                    start = time.perf_counter()
+                    response = client.get(f'/api/weather?city={city}')
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        misses[0] += response.headers['X-Cache'] == MISS
+                    time.sleep(0.01)
+
+            threads = [threading.Thread(target=user) for _ in range(args.users)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            Weather.prefetcher.stop()
+            print(f'{label:>9}: {len(latencies)} requests, '
+                  f'{misses[0] / len(latencies):.1%} waited on upstream, '
+                  f'p50 {percentile(latencies, 50) * 1000:.1f} ms  '
+                  f'p99 {percentile(latencies, 99) * 1000:.1f} ms')
+    Weather.weather_cache, Weather.prefetcher = cache, prefetcher
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'cache': bench_cache,
+    'prefetch': bench_prefetch,
+    'session': bench_session,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--users', type=int, default=50, help='concurrent users')
+    parser.add_argument('--cities', type=int, default=5, help='distinct cities requested')
+    parser.add_argument('--rounds', type=int, default=4, help='requests per user')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run')
+    parser.add_argument('--ttl', type=float, default=2, help='cache TTL in seconds')
+    parser.add_argument('--requests', type=int, default=500, help='sequential upstream calls')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='fake upstream latency in seconds')
+    args = parser.parse_args()
+
+    random.seed(0)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
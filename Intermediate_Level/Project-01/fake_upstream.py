@@ -0,0 +1,155 @@
+"""
+Local stand-in for the OpenWeatherMap current-weather API
+
+Answers GET /data/2.5/weather?q=<city>&appid=<key>&units=metric with a
+deterministic, OpenWeatherMap-shaped payload after a configurable delay, so
+tests and benchmarks can run without a network or an API key.
+
+- city "nowhere" (any case) -> 404, like an unknown city
+- appid "bad-key" -> 401
+- `fail_rate` makes that share of requests return 500
+- `fail_next` makes the next N requests return 500 (deterministic, for tests)
+
+Run standalone and point Weather.py at it:
+python fake_upstream.py --port 8081 --latency 0.2
+OPENWEATHER_URL=http://127.0.0.1:8081/data/2.5/weather OPENWEATHER_API_KEY=test python Weather.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PATH = '/data/2.5/weather'
+
+
+def fake_weather(city):
+    """Stable made-up weather for a city name"""
+    seed = zlib.crc32(city.lower().encode())
+    temp = (seed % 400) / 10 - 5
+    return {
+        'name': city.title(),
+        'sys': {'country': 'XX'},
+        'dt': int(time.time()),
+        'main': {'temp': temp, 'feels_like': temp - 1.5, 'humidity': seed % 100,
+                 'pressure': 990 + seed % 40},
+        'wind': {'speed': (seed % 150) / 10},
+        'weather': [{'main': 'Clouds', 'description': 'scattered clouds'}],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        upstream = self.server.upstream
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        upstream._count(self.client_address)
+        time.sleep(upstream.latency)
+
+        city = params.get('q', '')
+        if url.path != PATH:
+            self._send(404, {'cod': '404', 'message': 'Not found'})
+        elif params.get('appid') == 'bad-key':
+            self._send(401, {'cod': 401, 'message': 'Invalid API key'})
+        elif upstream._should_fail():
+            self._send(500, {'cod': '500', 'message': 'Internal error'})
+        elif not city or city.strip().lower() == 'nowhere':
+            self._send(404, {'cod': '404', 'message': 'city not found'})
+        else:
+            self._send(200, fake_weather(city.strip()))
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # batch fan-out opens many connections at once
+
+
+class FakeUpstream:
+    """Threaded fake API server; use as a context manager or start()/stop()"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_next = 0
+        self.requests = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.upstream = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{PATH}'
+
+    def _count(self, client_address):
+        with self._lock:
+            self.requests += 1
+            self.connections.add(client_address)
+
+    def _should_fail(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+        return random.random() < self.fail_rate
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='fake-upstream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenWeatherMap API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of 500s')
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.host, args.port, args.latency, args.fail_rate)
+    print(f"Fake OpenWeatherMap on {upstream.url} ({args.latency * 1000:.0f} ms latency)")
+    try:
+        upstream._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Background refresh of popular cities before their cache entries expire
+
+Every lookup is recorded with a decaying score (halved every `half_life`
+seconds), so the top cities follow current traffic. Every `interval`
+seconds the top `top_n` cities whose entry expires within `lead` seconds
+(or has already gone) are fetched again. The first user after expiry then
+gets a cache hit and does not wait for the upstream call.
+
+Prefetching only uses spare upstream budget. Every upstream call spends a token
+from a shared RateBudget, and a refresh only runs while more than `reserve`
+tokens are left for user traffic.
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateBudget:
+    """Token bucket of upstream calls: `rate` per second, up to `burst` saved"""
+
+    def __init__(self, rate=1.0, burst=60, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def spend(self, n=1):
+        """Record upstream calls; user traffic is never refused, only counted"""
+        with self._lock:
+            self._refill()
+            self.tokens = max(-self.burst, self.tokens - n)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+
+class Prefetcher:
+    """Keeps the hottest cities in `cache` fresh using `fetch(city)`"""
+
+    def __init__(self, cache, fetch, budget, top_n=50, lead=60, interval=10,
+                 half_life=3600, reserve=20, workers=8, max_tracked=10000,
+                 clock=time.monotonic):
+        self.cache = cache
+        self.fetch = fetch
+        self.budget = budget
+        self.top_n = top_n
+        self.lead = lead
+        self.interval = interval
+        self.half_life = half_life
+        self.reserve = reserve
+        self.workers = workers
+        self.max_tracked = max_tracked
+        self.clock = clock
+        self._scores = {}       # key -> [score, city as last requested]
+        self._decayed_at = clock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.over_budget = 0
+
+    def record(self, key, city):
+        """Count one request for `key`"""
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                self._scores[key] = [1.0, city]
+            else:
+                entry[0] += 1
+
+    def _decay(self):
+        now = self.clock()
+        factor = 0.5 ** ((now - self._decayed_at) / self.half_life)
+        self._decayed_at = now
+        for key, entry in list(self._scores.items()):
+            entry[0] *= factor
+            if entry[0] < 0.01:
+                del self._scores[key]
+        if len(self._scores) > self.max_tracked:
+            keep = heapq.nlargest(self.max_tracked, self._scores.items(),
+                                  key=lambda item: item[1][0])
+            self._scores = dict(keep)
+
+    def hot(self):
+        """[(key, city, score)] for the current top-N cities, hottest first"""
+        with self._lock:
+            self._decay()
+            top = heapq.nlargest(self.top_n, self._scores.items(),
+                                 key=lambda item: item[1][0])
+        return [(key, city, score) for key, (score, city) in top]
+
+    def due(self):
+        """Hot (key, city) pairs expiring within `lead`, as far as the budget allows"""
+        due = []
+        for key, city, _ in self.hot():
+            remaining = self.cache.expires_in(key)
+            if remaining is not None and remaining > self.lead:
+                continue
+            if self.budget.available() - len(due) < self.reserve + 1:
+                self.over_budget += 1
+                break
+            due.append((key, city))
+        return due
+
+    def run_once(self):
+        """Refresh hot cities close to expiry; returns how many were refreshed"""
+        self.runs += 1
+        due = self.due()
+        refresh = lambda item: self.cache.refresh(item[0], lambda: self.fetch(item[1]))
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='weather-prefetch') as pool:
+            results = list(pool.map(refresh, due))
+        refreshed = sum(results)
+        self.refreshed += refreshed
+        self.failed += len(results) - refreshed
+        return refreshed
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Prefetch failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='weather-prefetch',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            'tracked': len(self._scores),
+            'runs': self.runs,
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'over_budget': self.over_budget,
+            'budget_tokens': round(self.budget.available(), 1),
+            'running': self._thread is not None,
+        }
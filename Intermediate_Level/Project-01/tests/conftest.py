@@ -0,0 +1,16 @@
+import pytest
+
+
+class Clock:
+    """Fake time source: pass as clock=, move it by setting .now"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_upstream import FakeUpstream
+from upstream_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+def test_session_reuses_connections():
+    client = UpstreamClient()
+    with FakeUpstream() as upstream:
+        for _ in range(5):
+            assert client.get(upstream.url, params={'q': 'Paris'}).status_code == 200
+        assert upstream.requests == 5
+        assert len(upstream.connections) == 1
+    client.close()
+
+
+def test_retries_server_errors_then_succeeds():
+    client = UpstreamClient(retries=2, backoff=0.001)
+    with FakeUpstream() as upstream:
+        upstream.fail_next = 2
+        assert client.get(upstream.url, params={'q': 'Paris'}).status_code == 200
+        assert upstream.requests == 3
+        # Client errors are answers, not failures: no retry
+        upstream.reset_counts()
+        assert client.get(upstream.url, params={'q': 'nowhere'}).status_code == 404
+        assert upstream.requests == 1
+    client.close()
+
+
+def test_breaker_opens_and_recovers(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    client = UpstreamClient(retries=0, breaker=breaker)
+    with FakeUpstream() as upstream:
+        upstream.fail_next = 2
+        assert client.get(upstream.url).status_code == 500
+        assert client.get(upstream.url).status_code == 500
+        with pytest.raises(CircuitOpenError):
+            client.get(upstream.url)
+        assert upstream.requests == 2
+
+        clock.now = 31   # half-open: one trial call, which succeeds
+        assert client.get(upstream.url, params={'q': 'Paris'}).status_code == 200
+        assert breaker.state == CircuitBreaker.CLOSED
+    client.close()
+
+
+def test_half_open_trial_records_any_error(monkeypatch, clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = UpstreamClient(retries=0, breaker=breaker)
+
+    def broken_body(*args, **kwargs):
+        raise requests.exceptions.ChunkedEncodingError("connection broken mid-body")
+
+    monkeypatch.setattr(client.session, 'get', broken_body)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get('http://upstream.invalid/')
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 31   # the half-open trial fails the same way and reopens the circuit
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get('http://upstream.invalid/')
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 62   # the next trial is let through instead of being refused forever
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get('http://upstream.invalid/')
+    client.close()
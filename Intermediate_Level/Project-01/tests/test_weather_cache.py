@@ -0,0 +1,130 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Weather
+from fake_upstream import FakeUpstream
+from prefetcher import Prefetcher, RateBudget
+from weather_cache import WeatherCache, HIT, STALE, MISS
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = WeatherCache(ttl=60)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'sunny'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('paris', fetch)))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [('sunny', MISS)] * 20
+
+
+def test_stale_value_served_while_refreshing(clock):
+    cache = WeatherCache(ttl=10, stale_ttl=10, clock=clock)
+    values = iter(['old', 'new'])
+    fetch = lambda: next(values)
+
+    assert cache.get('oslo', fetch) == ('old', MISS)
+    clock.now = 5
+    assert cache.get('oslo', fetch) == ('old', HIT)
+    clock.now = 15
+    assert cache.get('oslo', fetch) == ('old', STALE)
+    for _ in range(100):   # background refresh
+        if cache.get('oslo', fetch)[0] == 'new':
+            break
+        time.sleep(0.01)
+    assert cache.get('oslo', fetch) == ('new', HIT)
+    clock.now = 100
+    with pytest.raises(StopIteration):
+        cache.get('oslo', fetch)   # too old to serve: a real miss
+
+
+def test_weather_endpoint_caches_by_normalized_city(monkeypatch):
+    with FakeUpstream(latency=0.01) as upstream:
+        monkeypatch.setattr(Weather, 'BASE_URL', upstream.url)
+        monkeypatch.setattr(Weather, 'API_KEY', 'test')
+        Weather.weather_cache.clear()
+        client = Weather.app.test_client()
+
+        first = client.get('/api/weather?city=London')
+        second = client.get('/api/weather?city=%20london%20')
+        missing = client.get('/api/weather?city=Nowhere')
+        assert first.status_code == second.status_code == 200
+        assert (first.headers['X-Cache'], second.headers['X-Cache']) == (MISS, HIT)
+        assert second.get_json()['name'] == 'London'
+        assert missing.status_code == 404
+        assert upstream.requests == 2
+
+
+def test_batch_endpoint_fans_out_and_dedupes(monkeypatch):
+    with FakeUpstream(latency=0.2) as upstream:
+        monkeypatch.setattr(Weather, 'BASE_URL', upstream.url)
+        monkeypatch.setattr(Weather, 'API_KEY', 'test')
+        Weather.weather_cache.clear()
+        client = Weather.app.test_client()
+
+        cities = [f'City{i}' for i in range(30)]
+        start = time.perf_counter()
+        body = client.get('/api/weather/batch?cities=' + ','.join(cities + ['city0', 'Nowhere'])).get_json()
+        assert time.perf_counter() - start < 1.0   # concurrent, not 30 x 200 ms
+        assert sorted(body['results']) == sorted(cities)
+        assert body['errors'] == {'Nowhere': {'error': 'City "Nowhere" not found', 'status': 404}}
+        assert body['complete'] and upstream.requests == 31
+
+        body = client.post('/api/weather/batch', json={'cities': ['City1', 'Slowtown'],
+                                                       'deadline': 0.05}).get_json()
+        assert list(body['results']) == ['City1']   # cached
+        assert body['errors']['Slowtown']['status'] == 504 and not body['complete']
+
+
+def test_batch_endpoint_rejects_malformed_bodies(monkeypatch):
+    monkeypatch.setattr(Weather, 'API_KEY', 'test')
+    client = Weather.app.test_client()
+    for body in ('["London"]', '{"cities": 5}', '{"cities": ["London"], "deadline": NaN}',
+                 '{"cities": ["London"], "deadline": Infinity}',
+                 '{"cities": ["London"], "deadline": 0}', '{"cities": ["London"], "deadline": "soon"}'):
+        response = client.post('/api/weather/batch', data=body, content_type='application/json')
+        assert response.status_code == 400, body
+    assert client.get('/api/weather/batch?cities=London&deadline=nan').status_code == 400
+
+
+def test_prefetcher_refreshes_hot_cities_within_budget(clock):
+    cache = WeatherCache(ttl=600, clock=clock)
+    budget = RateBudget(rate=0, burst=3, clock=clock)
+    fetched = []
+
+    def fetch(city):
+        budget.spend()
+        fetched.append(city)
+        return city
+
+    prefetcher = Prefetcher(cache, fetch, budget, top_n=2, lead=60, reserve=1, clock=clock)
+    for city, hits in (('London', 5), ('Paris', 3), ('Oslo', 1)):
+        cache.get(city.lower(), lambda: fetch(city))
+        for _ in range(hits):
+            prefetcher.record(city.lower(), city)
+    fetched.clear()
+
+    clock.now = 500   # still 100 s from expiry
+    assert prefetcher.run_once() == 0
+    clock.now = 550
+    assert prefetcher.run_once() == 0    # due, but the budget is spent
+    budget.tokens = 3
+    assert prefetcher.run_once() == 2
+    assert fetched == ['London', 'Paris']
+    assert cache.get('london', fetch) == ('London', HIT)
+    assert cache.expires_in('oslo') < 60   # not hot enough to prefetch
@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Weather
+from fake_upstream import fake_weather
+from weather_history import WeatherHistory, import_files, expand_paths
+
+
+def reading(city, dt):
+    return dict(fake_weather(city), dt=dt)
+
+
+def test_query_by_city_and_time_range(tmp_path):
+    history = WeatherHistory(str(tmp_path / 'history.db'))
+    for dt in (100, 200, 300):
+        history.append(reading('London', dt), saved_at=dt + 1)
+    history.append(reading('Paris', 200))
+
+    rows = history.query(' london ', start=150, end=300)
+    assert [row['observed_at'] for row in rows] == [200]
+    assert rows[0]['data']['name'] == 'London'
+    assert len(history.query('London')) == 3
+    history.close()
+
+
+def test_import_old_files(tmp_path):
+    for stamp in ('20241201_080000', '20241202_080000'):
+        with open(tmp_path / f'weather_Oslo_{stamp}.json', 'w') as f:
+            json.dump(fake_weather('Oslo'), f, indent=4)
+    (tmp_path / 'weather_broken_20241203_080000.json').write_text('{')
+
+    history = WeatherHistory(str(tmp_path / 'history.db'))
+    paths = expand_paths([str(tmp_path)])
+    assert import_files(history, paths) == (2, 1)
+    assert import_files(history, paths) == (2, 1)   # re-import adds nothing
+    assert history.count() == 2
+    history.close()
+
+
+def test_save_and_history_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(Weather, 'HISTORY_DB', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(Weather, '_history', None)
+    client = Weather.app.test_client()
+
+    saved = client.post('/api/save', json=reading('Tokyo', 1733040000)).get_json()
+    assert saved['success'] and saved['city'] == 'Tokyo'
+    body = client.get('/api/history?city=tokyo&start=1733000000&end=1733100000').get_json()
+    assert body['count'] == 1
+    assert client.get('/api/history?city=tokyo&start=yesterday').status_code == 400
+    Weather.get_history().close()
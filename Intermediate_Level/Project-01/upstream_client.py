@@ -0,0 +1,144 @@
+"""
+Pooled HTTP client for the OpenWeatherMap backend
+
+One shared requests.Session keeps connections alive between calls (no new
+TCP/TLS handshake per lookup) with a bounded connection pool. Failed calls are
+retried a few times with jittered exponential backoff, and a circuit breaker
+stops calling an upstream that keeps failing, so requests fail fast instead
+of piling up behind timeouts.
+"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upstream statuses worth retrying (rate limited / server side trouble)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures
+
+    While open, calls are refused for `reset_timeout` seconds; then one trial
+    call is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("Upstream circuit is open")
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                # Only the trial call goes through
+                self.rejected += 1
+                raise CircuitOpenError("Upstream circuit is half-open")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class UpstreamClient:
+    """Session-backed GET with pooling, retries and a circuit breaker"""
+
+    def __init__(self, pool_size=20, retries=2, backoff=0.2, max_backoff=2.0,
+                 timeout=10, breaker=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.calls = 0
+        self.retried = 0
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_backoff))
+        time.sleep(delay)
+
+    def get(self, url, params=None):
+        """GET `url`; retries connection errors, timeouts and 429/5xx
+
+        Returns the final response (which may still be an error status) or
+        raises the last requests exception / CircuitOpenError.
+        """
+        self.breaker.allow()
+        self.calls += 1
+        healthy = False
+        try:
+            response = self._get_with_retries(url, params)
+            healthy = response.status_code not in RETRY_STATUSES
+            return response
+        finally:
+            # Every call the breaker let through reports back, whatever it
+            # raised; otherwise a half-open trial would never end
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def _get_with_retries(self, url, params):
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if last:
+                    raise
+                self.retried += 1
+                self._sleep_before_retry(attempt)
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                response.close()
+                self.retried += 1
+                self._sleep_before_retry(attempt, response)
+                continue
+            return response
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'retried': self.retried,
+            'circuit': self.breaker.state,
+            'rejected': self.breaker.rejected,
+        }
+
+    def close(self):
+        self.session.close()
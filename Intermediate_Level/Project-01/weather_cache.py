@@ -0,0 +1,168 @@
+"""
+TTL cache with request coalescing and stale-while-revalidate
+
+Used by Weather.py in front of the OpenWeatherMap API:
+
+- fresh entries (younger than `ttl`) are served from memory
+- stale entries (up to `ttl + stale_ttl` old) are served immediately while a
+  single background refresh fetches a new value
+- on a miss, concurrent callers for the same key share one upstream call
+  (single-flight) instead of each making their own
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# How a value was served
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class WeatherCache:
+    """Bounded LRU cache of fetched values keyed by normalized city"""
+
+    def __init__(self, ttl=600, stale_ttl=600, max_size=1000, ttl_for=None,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        # ttl_for(value) -> seconds to cache it (0 = don't cache); default: ttl
+        self.ttl_for = ttl_for or (lambda value: self.ttl)
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (value, fetched_at, ttl)
+        self._flights = {}              # key -> _Flight
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+
+    def get(self, key, fetch):
+        """Return (value, HIT|STALE|MISS), calling fetch() only when needed
+
+        Exceptions from fetch() propagate to every caller waiting on that
+        fetch and are not cached.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched_at, ttl = entry
+                age = now - fetched_at
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, HIT
+                if age < ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._flights:
+                        self._flights[key] = _Flight()
+                        threading.Thread(target=self._refresh, args=(key, fetch),
+                                         name='weather-refresh', daemon=True).start()
+                    return value, STALE
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._run(key, fetch, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value, MISS
+
+    def _run(self, key, fetch, flight):
+        with self._lock:
+            self.fetches += 1
+        try:
+            flight.value = fetch()
+            self.put(key, flight.value)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _refresh(self, key, fetch):
+        flight = self._flights[key]
+        self._run(key, fetch, flight)
+        if flight.error is not None:
+            with self._lock:
+                self.refresh_errors += 1   # keep serving the stale value
+
+    def refresh(self, key, fetch):
+        """Fetch `key` now, unless a fetch for it is already running
+
+        Returns True if a new value was stored. Used to refresh entries ahead
+        of expiry; errors are counted and the old entry is kept.
+        """
+        with self._lock:
+            if key in self._flights:
+                return False
+            flight = self._flights[key] = _Flight()
+        self._run(key, fetch, flight)
+        if flight.error is not None:
+            with self._lock:
+                self.refresh_errors += 1
+            return False
+        return True
+
+    def put(self, key, value):
+        ttl = self.ttl_for(value)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self.clock(), ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def age(self, key):
+        """Seconds since `key` was fetched, or None if it isn't cached"""
+        entry = self._entries.get(key)
+        return None if entry is None else self.clock() - entry[1]
+
+    def expires_in(self, key):
+        """Seconds until `key` stops being fresh (negative once stale), or None"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1] + entry[2] - self.clock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'fetches': self.fetches,
+                'coalesced': self.coalesced,
+                'refresh_errors': self.refresh_errors,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,189 @@
+"""
+Append-only history of saved weather readings
+
+Replaces the one-JSON-file-per-save layout (weather_<name>_<timestamp>.json)
+with a single SQLite table indexed on (city, observed time), so "London over
+the last week" is one index range scan instead of a directory walk.
+
+Import existing files (compaction):
+python weather_history.py import [PATH ...] [--db weather_history.db] [--delete]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY,
+    city_key TEXT NOT NULL,
+    city TEXT NOT NULL,
+    country TEXT,
+    observed_at INTEGER NOT NULL,
+    saved_at INTEGER NOT NULL,
+    temp REAL,
+    humidity INTEGER,
+    payload TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_readings_city_time
+    ON readings(city_key, observed_at, saved_at);
+"""
+
+INSERT_SQL = """
+INSERT OR IGNORE INTO readings
+    (city_key, city, country, observed_at, saved_at, temp, humidity, payload)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+QUERY_SQL = """
+SELECT city, country, observed_at, saved_at, payload FROM readings
+WHERE city_key = ? AND observed_at >= ? AND observed_at < ?
+ORDER BY observed_at, saved_at
+LIMIT ?
+"""
+
+# weather_<name>_<YYYYmmdd>_<HHMMSS>.json as written by the old /api/save
+FILENAME_RE = re.compile(r'^weather_(?P<name>.+)_(?P<stamp>\d{8}_\d{6})\.json$')
+
+
+def city_key(name):
+    """Index key for a city: collapsed whitespace, case-insensitive"""
+    return ' '.join(name.split()).casefold()
+
+
+def reading_row(data, saved_at):
+    """Insert parameters for an OpenWeatherMap payload saved at `saved_at`"""
+    name = ' '.join(str(data['name']).split())
+    main = data.get('main') or {}
+    return (
+        city_key(name),
+        name,
+        (data.get('sys') or {}).get('country'),
+        int(data.get('dt') or saved_at),
+        int(saved_at),
+        main.get('temp'),
+        main.get('humidity'),
+        json.dumps(data, separators=(',', ':')),
+    )
+
+
+class WeatherHistory:
+    """SQLite-backed append-only log of weather readings"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA_SQL)
+        self._lock = threading.Lock()
+
+    def append(self, data, saved_at=None):
+        """Store one reading; returns (city, observed_at, saved_at)"""
+        row = reading_row(data, time.time() if saved_at is None else saved_at)
+        self.append_rows([row])
+        return row[1], row[3], row[4]
+
+    def append_rows(self, rows):
+        """Store many reading_row() tuples in one transaction; returns rows added"""
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(INSERT_SQL, rows)
+            return self._conn.total_changes - before
+
+    def query(self, city, start=0, end=None, limit=1000):
+        """Readings for `city` observed in [start, end), oldest first"""
+        end = 2 ** 62 if end is None else end
+        with self._lock:
+            rows = self._conn.execute(QUERY_SQL, (city_key(city), int(start), int(end),
+                                                  limit)).fetchall()
+        return [{'city': city, 'country': country, 'observed_at': observed_at,
+                 'saved_at': saved_at, 'data': json.loads(payload)}
+                for city, country, observed_at, saved_at, payload in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM readings').fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def saved_time(path):
+    """When an old weather_*.json file was saved: its name, else its mtime"""
+    match = FILENAME_RE.match(os.path.basename(path))
+    if match:
+        try:
+            return datetime.strptime(match.group('stamp'), '%Y%m%d_%H%M%S').timestamp()
+        except ValueError:
+            pass
+    return os.path.getmtime(path)
+
+
+def import_files(history, paths, delete=False, batch_size=1000):
+    """Import weather_*.json files; returns (imported, skipped) file counts"""
+    imported = skipped = 0
+    rows, done = [], []
+
+    def flush():
+        history.append_rows(rows)
+        if delete:
+            for path in done:
+                os.remove(path)
+        rows.clear()
+        done.clear()
+
+    for path in paths:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            rows.append(reading_row(data, saved_time(path)))
+            done.append(path)
+            imported += 1
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Skipping {path}: {e}")
+            skipped += 1
+        if len(rows) >= batch_size:
+            flush()
+    flush()
+    return imported, skipped
+
+
+def expand_paths(paths):
+    """Files and directories -> weather_*.json files"""
+    files = []
+    for path in paths or ['.']:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'weather_*.json'))))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather history store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help='import weather_*.json files')
+    importer.add_argument('paths', nargs='*', help='files or directories (default: .)')
+    importer.add_argument('--db', default=os.environ.get('WEATHER_HISTORY_DB',
+                                                         'weather_history.db'))
+    importer.add_argument('--delete', action='store_true',
+                          help='remove each file once it is imported')
+    args = parser.parse_args()
+
+    history = WeatherHistory(args.db)
+    start = time.perf_counter()
+    imported, skipped = import_files(history, expand_paths(args.paths), args.delete)
+    print(f"Imported {imported} files ({skipped} skipped) into {args.db} "
+          f"in {time.perf_counter() - start:.2f}s; {history.count()} readings stored")
+    history.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,82 +6,236 @@ Setup:
 pip install flask
 """
 
-from flask import Flask, render_template_string, request, redirect, url_for, jsonify
-import sqlite3
-import hashlib
+from flask import (Flask, Response, request, redirect, url_for, jsonify,
+                   stream_with_context)
 import string
-import random
-from datetime import datetime
-import os
+import json
+import csv
+import io
+import time
+from itertools import islice
+
+from db_pool import get_pool
+from click_writer import ClickWriter
+from resolution_cache import ResolutionCache, MISS
+from url_store import CUSTOM_CODE_TAKEN
+from sqlite_store import SqliteUrlStore
+from memory_store import MemoryUrlStore
+from pages import PrecompressedPage
+import metrics
 
 app = Flask(__name__)
 app.config['DATABASE'] = 'urls.db'
 
+# Storage engine: 'sqlite' (DATABASE) or 'memory' (dicts, persisted to STORE_LOG)
+app.config['STORE'] = 'sqlite'
+app.config['STORE_LOG'] = 'urls.log'       # append-only log for the memory store (None = none)
+
+# Click analytics are written in the background, in batches
+app.config['CLICK_FLUSH_SIZE'] = 500        # max clicks per transaction
+app.config['CLICK_FLUSH_INTERVAL'] = 1.0    # seconds before a partial batch is written
+app.config['CLICK_QUEUE_SIZE'] = 10000      # bounded queue length
+app.config['CLICK_QUEUE_POLICY'] = 'drop'   # 'drop' or 'block' when the queue is full
+app.config['CLICK_RETENTION_MONTHS'] = 13   # monthly click partitions kept (None = keep all)
+app.config['CLICK_KEEP_IP'] = True          # store visitor IPs with raw clicks (uniques don't need them)
+app.config['ROLLUP_HOURLY_HOURS'] = 72      # hourly rollup buckets kept per link (None = keep all)
+
+# short_code -> URL resolutions are cached in memory
+app.config['URL_CACHE_SIZE'] = 10000        # max cached codes (0 disables the cache)
+app.config['URL_CACHE_TTL'] = 300           # seconds a resolved URL stays cached
+app.config['URL_CACHE_NEGATIVE_TTL'] = 30   # seconds an unknown code stays cached
+
+# Short codes are base62 sequence IDs, reserved in blocks per process
+app.config['SHORT_CODE_LENGTH'] = 6         # minimum code length
+app.config['SHORT_CODE_BLOCK'] = 1000       # IDs reserved per database round trip
+app.config['SHORT_CODE_KEY'] = 'url-shortener'  # permutation key; None = sequential codes
+
+# Bloom filter of known codes: definite misses skip the database (SQLite store)
+app.config['CODE_FILTER_CAPACITY'] = 1000000  # initial size in codes (None disables the filter)
+app.config['CODE_FILTER_ERROR_RATE'] = 0.01   # false-positive rate at capacity
+app.config['CODE_FILTER_CATCH_UP'] = 0.1      # seconds between loads of other workers' codes
+
+# Prometheus metrics at /metrics; sampling profiler at /debug/profiler
+app.config['PROFILER_INTERVAL'] = 0.005     # seconds between stack samples
+app.config['PROFILER_REMOTE'] = False       # allow /debug/profiler from non-local clients
+
+INVALID_CUSTOM_CODE = "Invalid custom code. Use 3-20 characters (letters, numbers, -, _)"
+
 # ==================== DATABASE FUNCTIONS ====================
 
 def get_db():
-    """Get database connection"""
-    db = sqlite3.connect(app.config['DATABASE'])
-    db.row_factory = sqlite3.Row
-    return db
+    """Check out a pooled database connection
 
-def init_db():
-    """Initialize the database"""
-    db = get_db()
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS urls (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            original_url TEXT NOT NULL,
-            short_code TEXT UNIQUE NOT NULL,
-            custom_code TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            clicks INTEGER DEFAULT 0,
-            last_accessed TIMESTAMP,
-            user_ip TEXT,
-            is_active INTEGER DEFAULT 1
+    Connections are reused across calls (WAL mode, tuned pragmas and a
+    prepared-statement cache); calling close() on it returns it to the pool.
+    """
+    return get_pool(app.config['DATABASE']).get()
+
+_store = None
+
+def get_store():
+    """Get the URL store (see url_store.py), creating it from app.config on first use"""
+    global _store
+    if _store is None:
+        options = dict(
+            code_length=app.config['SHORT_CODE_LENGTH'],
+            code_block=app.config['SHORT_CODE_BLOCK'],
+            code_key=app.config['SHORT_CODE_KEY'],
+            keep_ips=app.config['CLICK_KEEP_IP'],
+            rollup_hours=app.config['ROLLUP_HOURLY_HOURS'],
+        )
+        if app.config['STORE'] == 'memory':
+            _store = MemoryUrlStore(log_path=app.config['STORE_LOG'], **options)
+        elif app.config['STORE'] == 'sqlite':
+            _store = SqliteUrlStore(lambda: get_db(),
+                                    retention_months=app.config['CLICK_RETENTION_MONTHS'],
+                                    code_filter_capacity=app.config['CODE_FILTER_CAPACITY'],
+                                    code_filter_error_rate=app.config['CODE_FILTER_ERROR_RATE'],
+                                    code_filter_catch_up=app.config['CODE_FILTER_CATCH_UP'],
+                                    **options)
+        else:
+            raise ValueError(f"Unknown STORE {app.config['STORE']!r}")
+    return _store
+
+def reset_store():
+    """Close the current store so the next get_store() builds one from app.config"""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+_click_writer = None
+
+def get_click_writer():
+    """Get the background click writer, creating it from app.config on first use"""
+    global _click_writer
+    if _click_writer is None:
+        _click_writer = ClickWriter(
+            record_click_batch,
+            flush_size=app.config['CLICK_FLUSH_SIZE'],
+            flush_interval=app.config['CLICK_FLUSH_INTERVAL'],
+            max_queue=app.config['CLICK_QUEUE_SIZE'],
+            policy=app.config['CLICK_QUEUE_POLICY'],
         )
-    ''')
-    
-    db.execute('''
-        CREATE TABLE IF NOT EXISTS clicks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            short_code TEXT NOT NULL,
-            clicked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            user_ip TEXT,
-            user_agent TEXT,
-            referrer TEXT,
-            FOREIGN KEY (short_code) REFERENCES urls (short_code)
+    return _click_writer
+
+def record_click_batch(events):
+    """Write one batch of queued clicks to the store (runs on the writer thread)"""
+    with STORE_SECONDS.time(operation='record_clicks'):
+        get_store().record_clicks(events)
+
+def prune_click_partitions(keep_months=None):
+    """Drop click partitions outside the retention window; returns their names"""
+    keep_months = keep_months or app.config['CLICK_RETENTION_MONTHS']
+    if not keep_months:
+        return []
+    return get_store().prune(keep_months)
+
+_url_cache = None
+
+def get_url_cache():
+    """Get the short_code resolution cache, creating it from app.config on first use"""
+    global _url_cache
+    if _url_cache is None:
+        _url_cache = ResolutionCache(
+            max_size=app.config['URL_CACHE_SIZE'],
+            ttl=app.config['URL_CACHE_TTL'],
+            negative_ttl=app.config['URL_CACHE_NEGATIVE_TTL'],
         )
-    ''')
-    
-    db.commit()
-    db.close()
+    return _url_cache
+
+def init_db():
+    """Initialize the database"""
+    get_store().init()
     print("✓ Database initialized successfully")
 
-# ==================== HASHING & ENCODING FUNCTIONS ====================
+# ==================== METRICS ====================
 
-def generate_short_code(url, length=6):
-    """Generate a short code using hashing"""
-    # Create hash of the URL + timestamp for uniqueness
-    hash_input = f"{url}{datetime.now().isoformat()}"
-    hash_object = hashlib.md5(hash_input.encode())
-    hash_hex = hash_object.hexdigest()
-    
-    # Convert hex to base62 (alphanumeric)
-    chars = string.ascii_letters + string.digits
-    short_code = ''
+REQUEST_SECONDS = metrics.Histogram(
+    'urlshortener_request_seconds',
+    'Time from WSGI call to response, including Flask routing', ['endpoint'])
+VIEW_SECONDS = metrics.Histogram(
+    'urlshortener_view_seconds',
+    'Time spent in the view function and its request hooks', ['endpoint'])
+REDIRECT_STAGE_SECONDS = metrics.Histogram(
+    'urlshortener_redirect_stage_seconds',
+    'Time spent in each stage of a redirect', ['stage'])
+STORE_SECONDS = metrics.Histogram(
+    'urlshortener_store_seconds',
+    'Time spent in URL store (database) calls', ['operation'])
+
+def _cache_stat(name):
+    return lambda: get_url_cache().stats()[name]
+
+def _writer_stat(name):
+    return lambda: getattr(get_click_writer(), name)
+
+metrics.CallbackMetric(
+    'urlshortener_cache_lookups_total', 'Resolution cache lookups by result',
+    lambda: {('hit',): get_url_cache().hits,
+             ('negative_hit',): get_url_cache().negative_hits,
+             ('miss',): get_url_cache().misses},
+    type='counter', labelnames=['result'])
+metrics.CallbackMetric('urlshortener_cache_hit_ratio',
+                       'Share of lookups answered by the resolution cache',
+                       _cache_stat('hit_ratio'))
+metrics.CallbackMetric('urlshortener_cache_entries', 'Codes in the resolution cache',
+                       _cache_stat('size'))
+metrics.CallbackMetric('urlshortener_cache_evictions_total', 'LRU evictions',
+                       _cache_stat('evictions'), type='counter')
+metrics.CallbackMetric('urlshortener_click_queue_depth', 'Clicks waiting to be written',
+                       lambda: get_click_writer().depth())
+metrics.CallbackMetric('urlshortener_clicks_written_total', 'Clicks written by the background writer',
+                       _writer_stat('written'), type='counter')
+metrics.CallbackMetric('urlshortener_clicks_dropped_total', 'Clicks dropped because the queue was full',
+                       _writer_stat('dropped'), type='counter')
+metrics.CallbackMetric('urlshortener_click_batches_total', 'Click batches written',
+                       _writer_stat('batches'), type='counter')
+
+metrics.CallbackMetric('urlshortener_code_filter_bytes', 'Memory used by the code Bloom filter',
+                       lambda: get_store().code_filter.nbytes)
+metrics.CallbackMetric('urlshortener_code_filter_codes', 'Codes added to the code Bloom filter',
+                       lambda: get_store().code_filter.count)
+
+profiler = metrics.SamplingProfiler()
+
+class MetricsMiddleware:
+    """WSGI middleware timing each request through the whole Flask stack"""
     
-    # Use hash to generate short code
-    for i in range(length):
-        index = int(hash_hex[i:i+2], 16) % len(chars)
-        short_code += chars[index]
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
     
-    return short_code
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            # Streamed bodies are timed up to their first chunk only
+            REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                    endpoint=environ.get('metrics.endpoint', 'unmatched'))
+
+app.wsgi_app = MetricsMiddleware(app.wsgi_app)
 
-def generate_random_code(length=6):
-    """Generate a random alphanumeric code"""
-    chars = string.ascii_letters + string.digits
-    return ''.join(random.choice(chars) for _ in range(length))
+@app.before_request
+def _start_view_timer():
+    request.environ['metrics.endpoint'] = request.endpoint or 'unmatched'
+    request.environ['metrics.start'] = time.perf_counter()
+
+@app.teardown_request
+def _stop_view_timer(exc=None):
+    start = request.environ.get('metrics.start')
+    if start is not None:
+        VIEW_SECONDS.observe(time.perf_counter() - start,
+                             endpoint=request.environ['metrics.endpoint'])
+
+# ==================== HASHING & ENCODING FUNCTIONS ====================
+
+def normalize_url(url):
+    """Strip whitespace and default to https:// when no scheme is given"""
+    url = url.strip()
+    if url and not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
 
 def is_valid_custom_code(code):
     """Validate custom short code"""
@@ -96,147 +250,187 @@ def is_valid_custom_code(code):
 # ==================== URL OPERATIONS ====================
 
 def shorten_url(original_url, custom_code=None, user_ip=None):
-    """Shorten a URL and store in database"""
-    db = get_db()
+    """Shorten a URL and store it
     
-    # Check if custom code is provided
-    if custom_code:
-        if not is_valid_custom_code(custom_code):
-            return None, "Invalid custom code. Use 3-20 characters (letters, numbers, -, _)"
-        
-        # Check if custom code already exists
-        existing = db.execute(
-            'SELECT * FROM urls WHERE custom_code = ? OR short_code = ?',
-            (custom_code, custom_code)
-        ).fetchone()
-        
-        if existing:
-            return None, "Custom code already in use"
-        
-        short_code = custom_code
-    else:
-        # Generate short code
-        short_code = generate_short_code(original_url)
-        
-        # Ensure uniqueness
-        attempts = 0
-        while attempts < 10:
-            existing = db.execute(
-                'SELECT * FROM urls WHERE short_code = ?',
-                (short_code,)
-            ).fetchone()
-            
-            if not existing:
-                break
-            
-            short_code = generate_random_code()
-            attempts += 1
+    Generated codes are base62 sequence IDs that never collide with each
+    other, so no lookup is needed before inserting.
+    """
+    if custom_code and not is_valid_custom_code(custom_code):
+        return None, INVALID_CUSTOM_CODE
+    
+    with STORE_SECONDS.time(operation='create'):
+        short_code, error = get_store().create(original_url, custom_code, user_ip)
+    if short_code:
+        # Drop any cached "unknown code" entry
+        get_url_cache().invalidate(short_code)
+    return short_code, error
+
+def _shorten_chunk(chunk, user_ip):
+    """Validate one chunk and store it as a single unit of work"""
+    results = [None] * len(chunk)
+    rows = []          # (position, original_url, custom_code)
+    customs = set()
+    
+    for position, item in enumerate(chunk):
+        if isinstance(item, str):
+            item = {'url': item}
+        if not isinstance(item, dict):
+            results[position] = {'error': 'Invalid item'}
+            continue
         
-        if attempts >= 10:
-            return None, "Failed to generate unique code"
+        original_url = normalize_url(str(item.get('url') or ''))
+        custom_code = str(item.get('custom') or '').strip() or None
+        if not original_url:
+            results[position] = {'error': 'URL is required'}
+        elif custom_code and not is_valid_custom_code(custom_code):
+            results[position] = {'error': INVALID_CUSTOM_CODE}
+        elif custom_code and custom_code in customs:
+            results[position] = {'error': CUSTOM_CODE_TAKEN}
+        else:
+            if custom_code:
+                customs.add(custom_code)
+            rows.append((position, original_url, custom_code))
     
-    # Insert into database
-    try:
-        db.execute(
-            '''INSERT INTO urls (original_url, short_code, custom_code, user_ip)
-               VALUES (?, ?, ?, ?)''',
-            (original_url, short_code, custom_code, user_ip)
-        )
-        db.commit()
-        return short_code, None
-    except sqlite3.IntegrityError:
-        return None, "Short code already exists"
-    finally:
-        db.close()
+    with STORE_SECONDS.time(operation='create_many'):
+        created = get_store().create_many([(url, custom) for _, url, custom in rows], user_ip)
+    cache = get_url_cache()
+    for (position, original_url, _), (short_code, error) in zip(rows, created):
+        if error:
+            results[position] = {'error': error}
+        else:
+            cache.invalidate(short_code)
+            results[position] = {'success': True, 'short_code': short_code,
+                                 'original_url': original_url}
+    return results
 
-def get_original_url(short_code):
-    """Retrieve original URL from short code"""
-    db = get_db()
-    
-    url_data = db.execute(
-        'SELECT * FROM urls WHERE (short_code = ? OR custom_code = ?) AND is_active = 1',
-        (short_code, short_code)
-    ).fetchone()
-    
-    if url_data:
-        # Update click count
-        db.execute(
-            'UPDATE urls SET clicks = clicks + 1, last_accessed = ? WHERE short_code = ?',
-            (datetime.now(), url_data['short_code'])
-        )
-        db.commit()
+def shorten_urls_bulk(items, user_ip=None, chunk_size=1000):
+    """Shorten many URLs, yielding one result dict per item in input order
     
-    db.close()
+    Items are URL strings or {'url': ..., 'custom': ...} dicts and may come
+    from any iterable (e.g. a streamed request body). Each chunk of
+    `chunk_size` items is one create_many call on the store (on SQLite, one
+    transaction with a single executemany insert).
+    """
+    items = iter(items)
+    index = 0
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        for result in _shorten_chunk(chunk, user_ip):
+            result['index'] = index
+            index += 1
+            yield result
+
+def get_original_url(short_code):
+    """Retrieve original URL from short code (read-only; see record_click)"""
+    cache = get_url_cache()
+    cached = cache.get(short_code)
+    if cached is not MISS:
+        return dict(cached) if cached else None
+    return resolve_uncached(short_code)
+
+def resolve_uncached(short_code):
+    """Look up a code in the store and cache the answer (the caller already missed)"""
+    with STORE_SECONDS.time(operation='resolve'):
+        url_data = get_store().resolve(short_code)
+    get_url_cache().put(short_code, url_data)
     return dict(url_data) if url_data else None
 
+def deactivate_url(short_code):
+    """Deactivate a short URL so it no longer redirects"""
+    with STORE_SECONDS.time(operation='deactivate'):
+        deactivated = get_store().deactivate(short_code)
+    get_url_cache().invalidate(short_code)
+    return deactivated
+
 def record_click(short_code, user_ip, user_agent, referrer):
-    """Record click analytics"""
-    db = get_db()
-    db.execute(
-        '''INSERT INTO clicks (short_code, user_ip, user_agent, referrer)
-           VALUES (?, ?, ?, ?)''',
-        (short_code, user_ip, user_agent, referrer)
-    )
-    db.commit()
-    db.close()
+    """Queue click analytics and the click-counter increment
+    
+    The background writer hands clicks to the store in batches, which
+    records them and bumps urls.clicks / last_accessed in one transaction
+    per batch. Returns False if the click was dropped because the queue
+    was full.
+    """
+    return get_click_writer().submit(short_code, user_ip, user_agent, referrer)
 
 def get_url_stats(short_code):
     """Get statistics for a short URL"""
-    db = get_db()
-    
-    url_data = db.execute(
-        'SELECT * FROM urls WHERE short_code = ? OR custom_code = ?',
-        (short_code, short_code)
-    ).fetchone()
-    
+    store = get_store()
+    with STORE_SECONDS.time(operation='get'):
+        url_data = store.get(short_code)
     if not url_data:
-        db.close()
         return None
     
-    clicks = db.execute(
-        'SELECT * FROM clicks WHERE short_code = ? ORDER BY clicked_at DESC LIMIT 10',
-        (url_data['short_code'],)
-    ).fetchall()
-    
-    db.close()
-    
+    with STORE_SECONDS.time(operation='recent_clicks'):
+        recent_clicks = store.recent_clicks(url_data['short_code'], limit=10)
     return {
-        'url_data': dict(url_data),
-        'recent_clicks': [dict(click) for click in clicks]
+        'url_data': url_data,
+        'recent_clicks': recent_clicks
     }
 
-def get_all_urls():
-    """Get all URLs from database"""
-    db = get_db()
-    urls = db.execute(
-        'SELECT * FROM urls ORDER BY created_at DESC LIMIT 100'
-    ).fetchall()
-    db.close()
+def get_click_rollups(short_code, days=30):
+    """Get click series and top referrers/agents from the rollups"""
+    store = get_store()
+    with STORE_SECONDS.time(operation='get'):
+        url_data = store.get(short_code)
+    if not url_data:
+        return None
+    
+    with STORE_SECONDS.time(operation='click_stats'):
+        data = store.click_stats(url_data['short_code'], days=days)
+    data['total_clicks'] = url_data['clicks']
+    return data
+
+def get_unique_visitors(short_code, days=30, granularity='day'):
+    """Get approximate unique visitors per day or week (HyperLogLog sketches)"""
+    store = get_store()
+    with STORE_SECONDS.time(operation='get'):
+        url_data = store.get(short_code)
+    if not url_data:
+        return None
     
-    return [dict(url) for url in urls]
+    with STORE_SECONDS.time(operation='unique_visitors'):
+        return store.unique_visitors(url_data['short_code'], days=days,
+                                     granularity=granularity)
+
+def get_urls_page(limit=100, cursor=None):
+    """Get one page of URLs (newest first) and the cursor for the next page"""
+    with STORE_SECONDS.time(operation='list_page'):
+        return get_store().list_page(limit, cursor)
+
+def get_all_urls():
+    """Get the 100 newest URLs"""
+    return get_urls_page()[0]
+
+def iter_all_urls(batch_size=1000):
+    """Yield every URL as a dict, reading `batch_size` rows at a time"""
+    return get_store().iter_urls(batch_size)
 
 # ==================== WEB ROUTES ====================
 
+def render_page(name, **context):
+    """Render one of the templates compiled at startup (see COMPILED_TEMPLATES)"""
+    app.update_template_context(context)
+    return COMPILED_TEMPLATES[name].render(context)
+
 @app.route('/')
 def index():
-    """Home page with URL shortener form"""
-    return render_template_string(HOME_TEMPLATE)
+    """Home page with URL shortener form (prerendered, precompressed, ETagged)"""
+    return HOME_PAGE.response(request)
 
 @app.route('/shorten', methods=['POST'])
 def shorten():
     """Handle URL shortening request"""
     data = request.get_json() if request.is_json else request.form
     
-    original_url = data.get('url', '').strip()
+    original_url = normalize_url(data.get('url', ''))
     custom_code = data.get('custom', '').strip() or None
     
     # Validate URL
     if not original_url:
         return jsonify({'error': 'URL is required'}), 400
     
-    if not original_url.startswith(('http://', 'https://')):
-        original_url = 'https://' + original_url
-    
     # Shorten URL
     user_ip = request.remote_addr
     short_code, error = shorten_url(original_url, custom_code, user_ip)
@@ -253,22 +447,59 @@ def shorten():
         'original_url': original_url
     })
 
+def _read_ndjson(stream):
+    """Yield one parsed item per non-blank line (None for invalid JSON)"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+@app.route('/api/shorten/bulk', methods=['POST'])
+def shorten_bulk():
+    """Shorten many URLs at once, streaming one NDJSON result per item
+
+    Accepts a JSON array, or NDJSON (one item per line) with
+    Content-Type: application/x-ndjson, which is read as it streams in.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        items = _read_ndjson(request.stream)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({'error': 'Expected a JSON array or NDJSON body'}), 400
+    
+    user_ip = request.remote_addr
+    host_url = request.host_url
+    
+    def generate():
+        for result in shorten_urls_bulk(items, user_ip):
+            if result.get('success'):
+                result['short_url'] = host_url + result['short_code']
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/<short_code>')
 def redirect_to_url(short_code):
     """Redirect to original URL"""
-    url_data = get_original_url(short_code)
+    with REDIRECT_STAGE_SECONDS.time(stage='lookup'):
+        url_data = get_original_url(short_code)
     
     if not url_data:
-        return render_template_string(ERROR_TEMPLATE, 
-                                     error="URL not found or has been deactivated"), 404
+        return render_page('error', error="URL not found or has been deactivated"), 404
     
     # Record click analytics
-    record_click(
-        url_data['short_code'],
-        request.remote_addr,
-        request.headers.get('User-Agent', 'Unknown'),
-        request.referrer
-    )
+    with REDIRECT_STAGE_SECONDS.time(stage='record_click'):
+        record_click(
+            url_data['short_code'],
+            request.remote_addr,
+            request.headers.get('User-Agent', 'Unknown'),
+            request.referrer
+        )
     
     return redirect(url_data['original_url'])
 
@@ -278,27 +509,139 @@ def stats(short_code):
     stats_data = get_url_stats(short_code)
     
     if not stats_data:
-        return render_template_string(ERROR_TEMPLATE, 
-                                     error="URL not found"), 404
+        return render_page('error', error="URL not found"), 404
     
-    return render_template_string(STATS_TEMPLATE, 
-                                 stats=stats_data,
-                                 short_code=short_code,
-                                 base_url=request.host_url)
+    return render_page('stats',
+                       stats=stats_data,
+                       short_code=short_code,
+                       base_url=request.host_url)
+
+@app.route('/api/stats/<short_code>')
+def api_stats(short_code):
+    """API endpoint with rolled-up click analytics (?days=30)"""
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    data = get_click_rollups(short_code, days)
+    if not data:
+        return jsonify({'error': 'URL not found'}), 404
+    return jsonify(data)
+
+@app.route('/api/stats/<short_code>/uniques')
+def api_uniques(short_code):
+    """API endpoint with approximate unique visitors (?days=30&granularity=day|week)"""
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('day', 'week'):
+        return jsonify({'error': 'granularity must be day or week'}), 400
+    data = get_unique_visitors(short_code, days, granularity)
+    if not data:
+        return jsonify({'error': 'URL not found'}), 404
+    return jsonify(data)
+
+def _page_args():
+    """Read ?limit= and ?cursor= from the query string"""
+    limit = request.args.get('limit', 100, type=int)
+    return max(1, min(limit, 1000)), request.args.get('cursor') or None
 
 @app.route('/dashboard')
 def dashboard():
-    """Display all shortened URLs"""
-    urls = get_all_urls()
-    return render_template_string(DASHBOARD_TEMPLATE, 
-                                 urls=urls,
-                                 base_url=request.host_url)
+    """Display shortened URLs, one page at a time"""
+    limit, cursor = _page_args()
+    try:
+        urls, next_cursor = get_urls_page(limit, cursor)
+    except ValueError as e:
+        return render_page('error', error=str(e)), 400
+    return render_page('dashboard',
+                       urls=urls,
+                       next_cursor=next_cursor,
+                       limit=limit,
+                       base_url=request.host_url)
 
 @app.route('/api/urls')
 def api_urls():
-    """API endpoint to get all URLs"""
-    urls = get_all_urls()
-    return jsonify(urls)
+    """API endpoint to page through URLs (?limit=&cursor=)
+
+    The body is a JSON list; the next page is advertised in the Link and
+    X-Next-Cursor headers.
+    """
+    limit, cursor = _page_args()
+    try:
+        urls, next_cursor = get_urls_page(limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify(urls)
+    if next_cursor:
+        next_url = url_for('api_urls', limit=limit, cursor=next_cursor, _external=True)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+EXPORT_COLUMNS = ['id', 'original_url', 'short_code', 'custom_code', 'created_at',
+                  'clicks', 'last_accessed', 'user_ip', 'is_active']
+
+@app.route('/api/urls/export')
+def api_urls_export():
+    """Stream every URL as NDJSON (default) or CSV (?format=csv)"""
+    fmt = request.args.get('format', 'ndjson')
+    
+    if fmt == 'csv':
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for count, url in enumerate(iter_all_urls(), start=1):
+                writer.writerow(url)
+                if count % 1000 == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        mimetype = 'text/csv'
+    elif fmt == 'ndjson':
+        def generate():
+            for url in iter_all_urls():
+                yield json.dumps(url) + '\n'
+        mimetype = 'application/x-ndjson'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=urls.{fmt}'
+    return response
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """API endpoint with resolution cache hit/miss/eviction counters"""
+    return jsonify(get_url_cache().stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics in the text exposition format"""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def debug_profiler():
+    """Sampling profiler: POST ?action=start|stop|reset, GET collapsed stacks"""
+    if not app.config['PROFILER_REMOTE'] and request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Profiler is only available locally'}), 403
+    
+    if request.method == 'POST':
+        action = request.args.get('action', '')
+        if action == 'start':
+            profiler.start(request.args.get('interval', app.config['PROFILER_INTERVAL'], type=float))
+        elif action == 'stop':
+            profiler.stop()
+        elif action == 'reset':
+            profiler.reset()
+        else:
+            return jsonify({'error': 'action must be start, stop or reset'}), 400
+        return jsonify({'running': profiler.running, 'samples': profiler.samples,
+                        'interval': profiler.interval})
+    
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    response.headers['X-Profiler-Running'] = str(profiler.running).lower()
+    response.headers['X-Profiler-Samples'] = str(profiler.samples)
+    return response
 
 # ==================== HTML TEMPLATES ====================
 
@@ -480,7 +823,7 @@ HOME_TEMPLATE = '''
                 <li>🎯 Custom short codes</li>
                 <li>📊 Click analytics</li>
                 <li>🔒 SQLite database storage</li>
-                <li>🔐 MD5 hashing for code generation</li>
+                <li>🔐 Collision-free codes from a base62 sequence</li>
                 <li>📈 Real-time statistics</li>
                 <li>💾 Persistent data storage</li>
             </ul>
@@ -779,11 +1122,11 @@ DASHBOARD_TEMPLATE = '''
         <div class="summary">
             <div class="summary-card">
                 <h3>{{ urls|length }}</h3>
-                <p>Total URLs</p>
+                <p>URLs on This Page</p>
             </div>
             <div class="summary-card">
                 <h3>{{ urls|sum(attribute='clicks') }}</h3>
-                <p>Total Clicks</p>
+                <p>Clicks on This Page</p>
             </div>
         </div>
         
@@ -827,6 +1170,10 @@ DASHBOARD_TEMPLATE = '''
         {% endif %}
         
         <a href="/" class="back-btn">← Back to Home</a>
+        {% if next_cursor %}
+        <a href="/dashboard?cursor={{ next_cursor }}&limit={{ limit }}" class="back-btn">Next Page →</a>
+        {% endif %}
+        <a href="/api/urls/export?format=csv" class="back-btn">⬇ Export CSV</a>
     </div>
 </body>
 </html>
@@ -891,12 +1238,25 @@ ERROR_TEMPLATE = '''
 </html>
 '''
 
+# ==================== COMPILED TEMPLATES ====================
+
+# Compiled once here instead of on every render_template_string() call
+COMPILED_TEMPLATES = {
+    'home': app.jinja_env.from_string(HOME_TEMPLATE),
+    'stats': app.jinja_env.from_string(STATS_TEMPLATE),
+    'dashboard': app.jinja_env.from_string(DASHBOARD_TEMPLATE),
+    'error': app.jinja_env.from_string(ERROR_TEMPLATE),
+}
+
+# The home page has no per-request content, so it is rendered and
+# compressed exactly once
+HOME_PAGE = PrecompressedPage(COMPILED_TEMPLATES['home'].render())
+
 # ==================== MAIN ====================
 
 if __name__ == '__main__':
-    # Initialize database
-    if not os.path.exists(app.config['DATABASE']):
-        init_db()
+    # Initialize database (creates tables and runs pending migrations)
+    init_db()
     
     print("\n" + "="*50)
     print("🔗 URL Shortener Server Starting...")
@@ -907,6 +1267,7 @@ if __name__ == '__main__':
     print("   • Home page: http://127.0.0.1:5000")
     print("   • Dashboard: http://127.0.0.1:5000/dashboard")
     print("   • API: http://127.0.0.1:5000/api/urls")
+    print("\n🚀 For load, serve over ASGI instead: python asgi.py --workers 4")
     print("\n⚠️  Press CTRL+C to stop the server")
     print("="*50 + "\n")
     
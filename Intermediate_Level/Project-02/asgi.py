@@ -0,0 +1,247 @@
+"""
+ASGI serving mode for the URL shortener
+
+The two hot routes, GET /<short_code> and POST /shorten, are handled by async
+handlers here. Cached redirects are answered straight from the event loop;
+database work is offloaded to a bounded thread pool. Every other route is
+passed through to the Flask app unchanged.
+
+Setup:
+pip install uvicorn asgiref
+
+Run:
+python asgi.py --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.urls import iri_to_uri
+
+import Url
+from resolution_cache import MISS
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:   # only needed for the pass-through routes
+    WsgiToAsgi = None
+
+# Threads available for SQLite calls in each worker process
+DB_THREADS = int(os.environ.get('URL_SHORTENER_DB_THREADS', 16))
+
+# Single-segment paths that belong to Flask routes, not short codes
+RESERVED_PATHS = {'', 'dashboard', 'shorten', 'metrics', 'favicon.ico'}
+
+_executor = None
+_flask_app = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_THREADS,
+                                       thread_name_prefix='db')
+    return _executor
+
+
+async def run_in_db_thread(func, *args):
+    """Run a blocking database call on the offload pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+# ---------- responses ----------
+
+async def send_response(send, status, body=b'', headers=()):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-length', str(len(body)).encode())] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, data):
+    await send_response(send, status, json.dumps(data),
+                        [(b'content-type', b'application/json')])
+
+
+async def send_error_page(send, status, error):
+    body = Url.COMPILED_TEMPLATES['error'].render(error=error)
+    await send_response(send, status, body,
+                        [(b'content-type', b'text/html; charset=utf-8')])
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _client_ip(scope):
+    client = scope.get('client')
+    return client[0] if client else None
+
+
+def _host_url(scope):
+    host = _header(scope, b'host') or 'localhost'
+    return f"{scope.get('scheme', 'http')}://{host}/"
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+# ---------- hot-path handlers ----------
+
+async def redirect_to_url(scope, send, short_code):
+    """Async version of Url.redirect_to_url"""
+    start = time.perf_counter()
+    url_data = Url.get_url_cache().get(short_code)
+    if url_data is MISS:
+        # Past the cache: going through get_original_url would count a second miss
+        url_data = await run_in_db_thread(Url.resolve_uncached, short_code)
+    Url.REDIRECT_STAGE_SECONDS.observe(time.perf_counter() - start, stage='lookup')
+
+    if not url_data:
+        await send_error_page(send, 404, "URL not found or has been deactivated")
+        return
+
+    click = (url_data['short_code'], _client_ip(scope),
+             _header(scope, b'user-agent') or 'Unknown', _header(scope, b'referer'))
+    start = time.perf_counter()
+    if Url.app.config['CLICK_QUEUE_POLICY'] == 'block':
+        await run_in_db_thread(Url.record_click, *click)
+    else:
+        Url.record_click(*click)
+    Url.REDIRECT_STAGE_SECONDS.observe(time.perf_counter() - start, stage='record_click')
+
+    await send_response(send, 302, headers=[
+        (b'location', iri_to_uri(url_data['original_url']).encode('latin-1')),
+    ])
+
+
+async def shorten(scope, receive, send):
+    """Async version of Url.shorten"""
+    body = await read_body(receive)
+    content_type = (_header(scope, b'content-type') or '').split(';')[0].strip()
+    try:
+        if content_type == 'application/json':
+            data = json.loads(body or b'{}')
+        else:
+            data = dict(parse_qsl(body.decode('utf-8')))
+        if not isinstance(data, dict):
+            raise ValueError
+    except ValueError:
+        await send_json(send, 400, {'error': 'Invalid request body'})
+        return
+
+    original_url = Url.normalize_url(str(data.get('url') or ''))
+    custom_code = str(data.get('custom') or '').strip() or None
+    if not original_url:
+        await send_json(send, 400, {'error': 'URL is required'})
+        return
+
+    short_code, error = await run_in_db_thread(
+        Url.shorten_url, original_url, custom_code, _client_ip(scope))
+    if error:
+        await send_json(send, 400, {'error': error})
+        return
+
+    await send_json(send, 200, {
+        'success': True,
+        'short_code': short_code,
+        'short_url': _host_url(scope) + short_code,
+        'original_url': original_url,
+    })
+
+
+# ---------- application ----------
+
+async def pass_to_flask(scope, receive, send):
+    global _flask_app
+    if WsgiToAsgi is None:
+        await send_response(send, 501, b'Install asgiref to serve this route over ASGI')
+        return
+    if _flask_app is None:
+        _flask_app = WsgiToAsgi(Url.app)
+    await _flask_app(scope, receive, send)
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Each worker loads its own store state (e.g. the code filter)
+                await run_in_db_thread(Url.get_store().init)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                Url.get_click_writer().stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path'].strip('/')
+    method = scope['method']
+    start = time.perf_counter()
+    if method == 'GET' and path and '/' not in path and path not in RESERVED_PATHS:
+        await redirect_to_url(scope, send, path)
+        endpoint = 'redirect_to_url'
+    elif method == 'POST' and path == 'shorten':
+        await shorten(scope, receive, send)
+        endpoint = 'shorten'
+    else:
+        # Timed by Url.MetricsMiddleware
+        await pass_to_flask(scope, receive, send)
+        return
+    Url.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the URL shortener over ASGI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int,
+                        help='worker processes (default: one per core; '
+                             'the memory store allows only one)')
+    args = parser.parse_args()
+    if Url.app.config['STORE'] == 'memory':
+        # Each process would keep its own code sequence: duplicate codes
+        if (args.workers or 1) > 1:
+            parser.error("the memory store supports a single process: use --workers 1")
+        args.workers = 1
+    args.workers = args.workers or os.cpu_count() or 1
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("ASGI mode needs uvicorn: pip install uvicorn asgiref")
+
+    # Create tables / run migrations once, before the workers start
+    Url.init_db()
+    print(f"🔗 URL Shortener (ASGI) on http://{args.host}:{args.port} "
+          f"with {args.workers} worker(s)")
+    uvicorn.run('asgi:app', host=args.host, port=args.port, workers=args.workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)),
+                log_level='warning', access_log=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+Benchmarks for the URL shortener
+
+Usage:
+python benchmark.py redirects [--urls 1000] [--requests 5000]
+python benchmark.py redirect-latency [--urls 1000] [--requests 5000]
+python benchmark.py cache [--urls 1000] [--requests 5000]
+python benchmark.py lookups [--rows 10000,100000,1000000] [--requests 5000]
+python benchmark.py creates [--rows 1000000,10000000,100000000] [--requests 5000]
+python benchmark.py bulk [--urls 100000]
+python benchmark.py pages [--urls 100] [--requests 5000]
+python benchmark.py partitions [--months 24] [--clicks 200000]
+python benchmark.py stores [--urls 100000] [--requests 100000]
+python benchmark.py metrics [--urls 1000] [--requests 20000]
+python benchmark.py filter [--codes 10000000] [--urls 100000] [--requests 100000]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+from datetime import datetime
+
+import Url
+import click_partitions
+import metrics
+from db_pool import ConnectionPool, close_all_pools
+from code_filter import BloomFilter
+from memory_store import MemoryUrlStore
+from short_codes import base62_encode
+from sqlite_store import SqliteUrlStore
+
+# The pre-partitioning click insert, for the partitions baseline
+INSERT_CLICK_SQL = '''INSERT INTO clicks (short_code, clicked_at, user_ip, user_agent, referrer)
+                      VALUES (?, ?, ?, ?, ?)'''
+
+
+def legacy_get_db():
+    """The original connect-per-call get_db()"""
+    db = sqlite3.connect(Url.app.config['DATABASE'])
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def legacy_shorten_url(original_url):
+    """The original MD5 code + SELECT-until-unique create path"""
+    chars = string.ascii_letters + string.digits
+    db = Url.get_db()
+    for _ in range(10):
+        digest = hashlib.md5(f'{original_url}{datetime.now().isoformat()}{random.random()}'
+                             .encode()).hexdigest()
+        short_code = ''.join(chars[int(digest[i:i + 2], 16) % len(chars)] for i in range(6))
+        if not db.execute('SELECT * FROM urls WHERE short_code = ?', (short_code,)).fetchone():
+            break
+    db.execute('INSERT INTO urls (original_url, short_code) VALUES (?, ?)',
+               (original_url, short_code))
+    db.commit()
+    db.close()
+    return short_code
+
+
+def make_database(directory, name):
+    """Point the app at a fresh database file and create the schema"""
+    Url.get_click_writer().flush()
+    Url.get_url_cache().clear()
+    Url.reset_store()
+    close_all_pools()
+    Url.app.config['DATABASE'] = os.path.join(directory, name)
+    Url.init_db()
+
+
+def seed_urls(count):
+    """Create `count` short URLs and return their codes"""
+    codes = []
+    for i in range(count):
+        code, error = Url.shorten_url(f'https://example.com/page/{i}')
+        if error:
+            raise RuntimeError(error)
+        codes.append(code)
+    return codes
+
+
+def set_cache_size(size):
+    """Resize (0 disables) the resolution cache"""
+    cache = Url.get_url_cache()
+    cache.clear()
+    cache.max_size = size
+
+
+def skewed_picks(codes, requests):
+    """Zipf-like request mix: a few links get most of the traffic"""
+    weights = [1 / rank for rank in range(1, len(codes) + 1)]
+    return random.choices(codes, weights=weights, k=requests)
+
+
+def time_redirects(codes, requests, picks=None):
+    """Issue `requests` redirects through the Flask test client, return req/s"""
+    client = Url.app.test_client()
+    picks = picks or [random.choice(codes) for _ in range(requests)]
+    start = time.perf_counter()
+    for code in picks:
+        response = client.get(f'/{code}')
+        assert response.status_code == 302, response.status_code
+    elapsed = time.perf_counter() - start
+    return requests / elapsed
+
+
+def bench_redirects(args):
+    """Redirects per second: pooled get_db() vs connect-per-call"""
+    pooled_get_db = Url.get_db
+    cache_size = Url.get_url_cache().max_size
+    set_cache_size(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, factory in (('connect-per-call', legacy_get_db),
+                               ('pooled', pooled_get_db)):
+            Url.get_db = factory
+            make_database(tmp, f'{label}.db')
+            codes = seed_urls(args.urls)
+            rate = time_redirects(codes, args.requests)
+            print(f'{label:>18}: {rate:10.0f} redirects/s')
+            # Write the queued clicks while this database and get_db still apply
+            Url.get_click_writer().flush()
+        Url.get_db = pooled_get_db
+        close_all_pools()
+    set_cache_size(cache_size)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_redirect_latency(args):
+    """Redirect latency with synchronous click writes vs the background writer"""
+    queued_record_click = Url.record_click
+
+    def synchronous_record_click(*click):
+        queued_record_click(*click)
+        Url.get_click_writer().flush()
+
+    client = Url.app.test_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, record in (('synchronous', synchronous_record_click),
+                              ('queued', queued_record_click)):
+            Url.record_click = record
+            make_database(tmp, f'{label}.db')
+            codes = seed_urls(args.urls)
+            samples = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                client.get(f'/{random.choice(codes)}')
+                samples.append((time.perf_counter() - start) * 1000)
+            print(f'{label:>12}: p50 {percentile(samples, 50):.3f} ms   '
+                  f'p99 {percentile(samples, 99):.3f} ms')
+        Url.record_click = queued_record_click
+        Url.get_click_writer().flush()
+        close_all_pools()
+
+
+def bench_cache(args):
+    """Redirects per second with and without the resolution cache"""
+    cache_size = Url.get_url_cache().max_size
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'cache.db')
+        codes = seed_urls(args.urls)
+        picks = skewed_picks(codes, args.requests)
+        for label, size in (('no cache', 0), ('cache', cache_size)):
+            set_cache_size(size)
+            hits_before = Url.get_url_cache().hits
+            rate = time_redirects(codes, args.requests, picks)
+            hit_ratio = (Url.get_url_cache().hits - hits_before) / args.requests
+            print(f'{label:>10}: {rate:10.0f} redirects/s   hit ratio {hit_ratio:.1%}')
+        Url.get_click_writer().flush()
+        close_all_pools()
+
+
+def bulk_fill(rows, start=0):
+    """Insert `rows` synthetic URLs straight into the urls table"""
+    db = Url.get_db()
+    chunk = 100000
+    for offset in range(start, start + rows, chunk):
+        stop = min(offset + chunk, start + rows)
+        db.executemany(
+            'INSERT INTO urls (original_url, short_code, custom_code) VALUES (?, ?, ?)',
+            ((f'https://example.com/{i}', f'r{i}', f'c{i}' if i % 10 == 0 else None)
+             for i in range(offset, stop))
+        )
+        db.commit()
+    db.close()
+    # These rows bypassed the store, so its code filter hasn't seen them
+    Url.get_store().rebuild_code_filter()
+
+
+def bench_lookups(args):
+    """Uncached code lookups as the table grows (should stay flat)"""
+    cache_size = Url.get_url_cache().max_size
+    set_cache_size(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'lookups.db')
+        filled = 0
+        for rows in args.rows:
+            bulk_fill(rows - filled, start=filled)
+            filled = rows
+            picks = [random.randrange(rows) for _ in range(args.requests)]
+            start = time.perf_counter()
+            for i in picks:
+                code = f'c{i - i % 10}' if i % 2 else f'r{i}'
+                assert Url.get_original_url(code) is not None
+            per_lookup = (time.perf_counter() - start) / args.requests * 1e6
+            print(f'{rows:>12,} rows: {per_lookup:8.1f} µs/lookup')
+        close_all_pools()
+    set_cache_size(cache_size)
+
+
+def bench_creates(args):
+    """Creates per second: MD5 + collision check vs the sequence allocator"""
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'creates.db')
+        filled = 0
+        for rows in args.rows:
+            bulk_fill(rows - filled, start=filled)
+            filled = rows
+            for label, create in (('md5 + check', legacy_shorten_url),
+                                  ('allocator', Url.shorten_url)):
+                start = time.perf_counter()
+                for i in range(args.requests):
+                    create(f'https://example.com/new/{rows}/{i}')
+                rate = args.requests / (time.perf_counter() - start)
+                print(f'{rows:>12,} rows  {label:>12}: {rate:10.0f} creates/s')
+            filled += 2 * args.requests
+        close_all_pools()
+
+
+def bench_bulk(args):
+    """URLs per second: one shorten_url() per link vs shorten_urls_bulk()"""
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'bulk.db')
+        urls = [f'https://example.com/campaign/{i}' for i in range(args.urls)]
+        single = urls[:min(len(urls), 5000)]
+
+        start = time.perf_counter()
+        for url in single:
+            Url.shorten_url(url)
+        rate = len(single) / (time.perf_counter() - start)
+        print(f'{"one by one":>10}: {rate:10.0f} URLs/s')
+
+        start = time.perf_counter()
+        created = sum(1 for result in Url.shorten_urls_bulk(urls) if result.get('success'))
+        rate = created / (time.perf_counter() - start)
+        print(f'{"bulk":>10}: {rate:10.0f} URLs/s')
+        close_all_pools()
+
+
+def bench_pages(args):
+    """Page renders per second: render_template_string vs compiled templates"""
+    from flask import render_template_string
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'pages.db')
+        seed_urls(args.urls)
+        urls = Url.get_all_urls()
+        cases = (
+            ('home', lambda: render_template_string(Url.HOME_TEMPLATE),
+                     lambda: Url.HOME_PAGE.response(Url.request)),
+            ('dashboard', lambda: render_template_string(Url.DASHBOARD_TEMPLATE, urls=urls,
+                                                         next_cursor=None, base_url='/'),
+                          lambda: Url.render_page('dashboard', urls=urls,
+                                                  next_cursor=None, base_url='/')),
+        )
+        with Url.app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+            for name, *renders in cases:
+                for label, render in zip(('string', 'compiled'), renders):
+                    start = time.perf_counter()
+                    for _ in range(args.requests):
+                        render()
+                    rate = args.requests / (time.perf_counter() - start)
+                    print(f'{name:>10} {label:>9}: {rate:10.0f} renders/s')
+        close_all_pools()
+
+
+def single_table_insert(db, rows):
+    db.executemany(INSERT_CLICK_SQL, rows)
+
+
+def bench_partitions(args):
+    """Click inserts/s month by month: one growing table vs monthly partitions"""
+    keep = Url.app.config['CLICK_RETENTION_MONTHS']
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'partitions.db')
+        db = Url.get_db()
+        for month in range(args.months):
+            year, mon = 2024 + month // 12, month % 12 + 1
+            rows = [(f'r{random.randrange(100000)}',
+                     f'{year}-{mon:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00',
+                     '127.0.0.1', 'bench', None)
+                     for i in range(args.clicks)]
+            rates = []
+            for insert in (single_table_insert, click_partitions.insert_clicks):
+                start = time.perf_counter()
+                for offset in range(0, len(rows), 500):
+                    insert(db, rows[offset:offset + 500])
+                    db.commit()
+                rates.append(args.clicks / (time.perf_counter() - start))
+            click_partitions.drop_expired(db, keep, datetime(year, mon, 28))
+            db.commit()
+            print(f'{year}-{mon:02d}  single table: {rates[0]:9.0f}/s   '
+                  f'partitioned: {rates[1]:9.0f}/s')
+        db.close()
+        close_all_pools()
+
+
+def bench_stores(args):
+    """The same workload against each storage engine, called directly"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = (
+            ('sqlite', lambda: SqliteUrlStore(ConnectionPool(os.path.join(tmp, 'stores.db')).get)),
+            ('memory', lambda: MemoryUrlStore()),
+            ('memory+log', lambda: MemoryUrlStore(log_path=os.path.join(tmp, 'stores.log'))),
+        )
+        for label, factory in engines:
+            store = factory()
+            store.init()
+            rows = [(f'https://example.com/store/{i}', None) for i in range(args.urls)]
+            start = time.perf_counter()
+            codes = []
+            for offset in range(0, len(rows), 1000):
+                codes.extend(code for code, _ in store.create_many(rows[offset:offset + 1000]))
+            creates = args.urls / (time.perf_counter() - start)
+
+            picks = [random.choice(codes) for _ in range(args.requests)]
+            start = time.perf_counter()
+            for code in picks:
+                store.resolve(code)
+            resolves = args.requests / (time.perf_counter() - start)
+
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            events = [(code, now, '127.0.0.1', 'bench', None, now) for code in picks]
+            start = time.perf_counter()
+            for offset in range(0, len(events), 500):
+                store.record_clicks(events[offset:offset + 500])
+            clicks = args.requests / (time.perf_counter() - start)
+            store.close()
+            print(f'{label:>10}: {creates:9.0f} creates/s  {resolves:9.0f} resolves/s  '
+                  f'{clicks:9.0f} clicks/s')
+
+
+def bench_metrics(args):
+    """Redirects per second with instrumentation switched off and on"""
+    with tempfile.TemporaryDirectory() as tmp:
+        make_database(tmp, 'metrics.db')
+        codes = seed_urls(args.urls)
+        time_redirects(codes, min(args.requests, 1000))   # warm up the cache
+        for label, enabled in (('off', False), ('on', True), ('off', False), ('on', True)):
+            metrics.REGISTRY.enabled = enabled
+            rate = time_redirects(codes, args.requests)
+            print(f'metrics {label:>3}: {rate:10.0f} redirects/s')
+        Url.get_click_writer().flush()
+        close_all_pools()
+
+
+def bench_filter(args):
+    """Bloom filter memory / false-positive rate, and 404 lookups with and without it"""
+    bloom = BloomFilter(args.codes, error_rate=Url.app.config['CODE_FILTER_ERROR_RATE'])
+    start = time.perf_counter()
+    for i in range(args.codes):
+        bloom.add(base62_encode(i, 6))
+    build = time.perf_counter() - start
+    probes = args.requests
+    false_positives = sum(base62_encode(i, 6) + 'x' in bloom for i in range(probes))
+    print(f'{args.codes:,} codes: {bloom.nbytes / 2**20:.1f} MiB '
+          f'({bloom.size / args.codes:.1f} bits/code, {bloom.hashes} hashes), '
+          f'built in {build:.1f}s')
+    print(f'false positives: {false_positives / probes:.3%} measured, '
+          f'{bloom.expected_error_rate():.3%} expected')
+
+    cache_size = Url.get_url_cache().max_size
+    capacity = Url.app.config['CODE_FILTER_CAPACITY']
+    set_cache_size(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, size in (('no filter', None), ('filter', capacity)):
+            Url.app.config['CODE_FILTER_CAPACITY'] = size
+            make_database(tmp, f'filter-{label}.db')
+            bulk_fill(args.urls)
+            unknown = [f'scan{random.randrange(10**9)}' for _ in range(args.requests)]
+            start = time.perf_counter()
+            for code in unknown:
+                assert Url.get_original_url(code) is None
+            rate = args.requests / (time.perf_counter() - start)
+            print(f'{label:>10}: {rate:10.0f} unknown-code lookups/s')
+        close_all_pools()
+    Url.app.config['CODE_FILTER_CAPACITY'] = capacity
+    set_cache_size(cache_size)
+
+
+BENCHMARKS = {
+    'redirects': bench_redirects,
+    'redirect-latency': bench_redirect_latency,
+    'cache': bench_cache,
+    'lookups': bench_lookups,
+    'creates': bench_creates,
+    'bulk': bench_bulk,
+    'pages': bench_pages,
+    'partitions': bench_partitions,
+    'stores': bench_stores,
+    'metrics': bench_metrics,
+    'filter': bench_filter,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--urls', type=int, default=1000,
+                        help='number of short URLs to create')
+    parser.add_argument('--requests', type=int, default=5000,
+                        help='number of requests to time')
+    parser.add_argument('--months', type=int, default=24,
+                        help='months of click traffic to simulate')
+    parser.add_argument('--clicks', type=int, default=200000,
+                        help='clicks per simulated month')
+    parser.add_argument('--codes', type=int, default=10000000,
+                        help='codes to add to the Bloom filter')
+    parser.add_argument('--rows', default='10000,100000,1000000',
+                        type=lambda value: [int(n) for n in value.split(',')],
+                        help='comma-separated table sizes')
+    args = parser.parse_args()
+
+    random.seed(0)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
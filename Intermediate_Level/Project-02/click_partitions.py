@@ -0,0 +1,107 @@
+"""
+Time-partitioned click storage for the URL shortener
+
+Raw clicks go into one table per calendar month (clicks_YYYYMM, by UTC click
+time). Inserts only ever touch the current month's small table and index,
+and retention drops whole months with DROP TABLE instead of running a large
+DELETE followed by VACUUM. Reads walk the partitions from newest to oldest.
+"""
+
+import re
+import sqlite3
+from itertools import groupby
+
+PREFIX = 'clicks_'
+_NAME = re.compile(r'^clicks_(\d{4})(\d{2})$')
+
+CREATE_PARTITION_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        short_code TEXT NOT NULL,
+        clicked_at TIMESTAMP NOT NULL,
+        user_ip TEXT,
+        user_agent TEXT,
+        referrer TEXT
+    )
+'''
+CREATE_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_{table}_short_code ON {table} (short_code, clicked_at)
+'''
+INSERT_SQL = '''INSERT INTO {table} (short_code, clicked_at, user_ip, user_agent, referrer)
+                VALUES (?, ?, ?, ?, ?)'''
+RECENT_CLICKS_SQL = 'SELECT * FROM {table} WHERE short_code = ? ORDER BY clicked_at DESC LIMIT ?'
+LIST_SQL = "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'clicks_[0-9]*'"
+
+
+def partition_for(clicked_at):
+    """Partition table name for a 'YYYY-MM-DD HH:MM:SS' timestamp"""
+    return f'{PREFIX}{clicked_at[0:4]}{clicked_at[5:7]}'
+
+
+def ensure_partition(db, table):
+    db.execute(CREATE_PARTITION_SQL.format(table=table))
+    db.execute(CREATE_INDEX_SQL.format(table=table))
+
+
+def list_partitions(db):
+    """Existing partition tables, newest first"""
+    names = [row[0] for row in db.execute(LIST_SQL) if _NAME.match(row[0])]
+    return sorted(names, reverse=True)
+
+
+def insert_clicks(db, rows):
+    """Insert (short_code, clicked_at, user_ip, user_agent, referrer) rows
+
+    Runs inside the caller's transaction. Returns the partitions written to.
+    """
+    tables = []
+    for table, group in groupby(sorted(rows, key=lambda row: row[1]),
+                                key=lambda row: partition_for(row[1])):
+        ensure_partition(db, table)
+        db.executemany(INSERT_SQL.format(table=table), list(group))
+        tables.append(table)
+    return tables
+
+
+def recent_clicks(db, short_code, limit=10):
+    """Newest clicks for a code, spanning as many partitions as needed"""
+    clicks = []
+    for table in list_partitions(db):
+        try:
+            rows = db.execute(RECENT_CLICKS_SQL.format(table=table),
+                              (short_code, limit - len(clicks))).fetchall()
+        except sqlite3.OperationalError:
+            continue   # dropped by retention since we listed it
+        clicks.extend(rows)
+        if len(clicks) >= limit:
+            break
+    return clicks
+
+
+def drop_expired(db, keep_months, now):
+    """Drop partitions older than the newest `keep_months` months (counting now's)
+
+    Runs inside the caller's transaction.
+    """
+    cutoff = now.year * 12 + (now.month - 1) - (keep_months - 1)
+    dropped = []
+    for table in list_partitions(db):
+        year, month = map(int, _NAME.match(table).groups())
+        if year * 12 + (month - 1) < cutoff:
+            db.execute(f'DROP TABLE IF EXISTS {table}')
+            dropped.append(table)
+    return dropped
+
+
+def migrate_legacy(db, batch_size=10000):
+    """Move rows from the old single clicks table into monthly partitions"""
+    while True:
+        rows = db.execute(
+            '''SELECT id, short_code, clicked_at, user_ip, user_agent, referrer
+               FROM clicks ORDER BY id LIMIT ?''',
+            (batch_size,)
+        ).fetchall()
+        if not rows:
+            return
+        insert_clicks(db, [tuple(row)[1:] for row in rows if row['clicked_at']])
+        db.execute('DELETE FROM clicks WHERE id <= ?', (rows[-1]['id'],))
@@ -0,0 +1,185 @@
+"""
+Background click-analytics writer for the URL shortener
+
+The redirect route only enqueues a click event; a background thread drains the
+queue and hands the events to the URL store in batches, which writes clicks
+and click-counter increments in one transaction per batch. The redirect
+therefore never waits on a commit (or its fsync).
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+# What to do when the queue is full
+DROP = 'drop'     # discard the click and count it as dropped
+BLOCK = 'block'   # make the request wait (up to block_timeout) for space
+POLICIES = (DROP, BLOCK)
+
+# Queue marker asking the writer to commit its current batch immediately
+_FLUSH = object()
+
+
+class ClickWriter:
+    """Bounded click queue flushed in batches by a background thread"""
+
+    def __init__(self, write_batch, flush_size=500, flush_interval=1.0,
+                 max_queue=10000, policy=DROP, block_timeout=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, not {policy!r}")
+        # Called as write_batch(events), e.g. UrlStore.record_clicks
+        self.write_batch = write_batch
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        self._write_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()   # many request threads drop at once
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    # ---------- producer side ----------
+
+    def submit(self, short_code, user_ip, user_agent, referrer):
+        """Queue one click; returns False if it was dropped"""
+        now = datetime.now()
+        event = (
+            short_code,
+            datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            user_ip,
+            user_agent,
+            referrer,
+            str(now),
+        )
+        self._ensure_started()
+        try:
+            if self.policy == BLOCK:
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return False
+
+    def depth(self):
+        """Number of clicks waiting to be written"""
+        return self.queue.qsize()
+
+    # ---------- consumer side ----------
+
+    def flush(self):
+        """Block until every click queued so far has been written"""
+        if self._running():
+            # Wake the writer so a partial batch doesn't wait out the interval
+            self.queue.put(_FLUSH)
+            self.queue.join()
+            return
+        while True:
+            batch = self._drain(self.flush_size)
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                self._done(len(batch))
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is _FLUSH:
+                self.queue.task_done()
+            else:
+                batch.append(event)
+        return batch
+
+    def _done(self, count):
+        for _ in range(count):
+            self.queue.task_done()
+
+    def _write(self, batch):
+        with self._write_lock:
+            self.write_batch(batch)
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            event = self.queue.get()
+            if event is _FLUSH:
+                self.queue.task_done()
+                continue
+
+            # Collect up to flush_size events, until flush_interval elapses
+            # or until someone asks for a flush
+            batch = [event]
+            markers = 0
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is _FLUSH:
+                    markers += 1
+                    break
+                batch.append(event)
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"✗ Failed to write {len(batch)} clicks: {e}")
+            finally:
+                self._done(len(batch) + markers)
+
+    # ---------- lifecycle ----------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # First use, or first use in a forked worker process
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='click-writer',
+                                            daemon=True)
+            self._thread.start()
+
+    def _running(self):
+        return (self._thread is not None and self._pid == os.getpid()
+                and self._thread.is_alive())
+
+    def stop(self, timeout=5.0):
+        """Stop the background thread and write whatever is left"""
+        if self._running():
+            self._stop.set()
+            try:
+                # Wakes an idle writer; a full queue means it isn't idle
+                self.queue.put_nowait(_FLUSH)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+        self._thread = None
+        self.flush()
@@ -0,0 +1,66 @@
+"""
+Bloom filter of known short codes
+
+Answers "might this code exist?" from memory. A negative answer is definite,
+so lookups for codes that were never created (scanners probing random paths,
+fresh custom codes) can skip the database. A positive answer may be a false
+positive, at roughly `error_rate` while no more than `capacity` codes are added.
+
+Codes are never deleted (deactivated links keep their code), so a plain Bloom
+filter is enough; a cuckoo filter would only add deletion support.
+"""
+
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, code):
+        digest = hashlib.blake2b(code.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, code):
+        positions = self._positions(code)
+        # `bits[i] |= mask` is a read-modify-write: without the lock two
+        # concurrent adds could lose a bit and turn into a false negative
+        with self._lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def update(self, codes):
+        for code in codes:
+            self.add(code)
+
+    def __contains__(self, code):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(code))
+
+    @property
+    def saturated(self):
+        """True once more than `capacity` codes were added (error rate climbing)"""
+        return self.count > self.capacity
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def expected_error_rate(self):
+        """False-positive probability for the codes added so far"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
@@ -0,0 +1,168 @@
+"""
+SQLite connection pool for the URL shortener
+
+Connections are opened once, configured with WAL journaling and tuned
+pragmas, and reused: get() checks one out and close() hands it back. Each
+keeps its own prepared-statement cache, so repeated queries skip both the
+connect and the SQL compile step.
+
+A returned connection is rolled back if the caller left a transaction open.
+At most `max_idle` connections are kept between requests, and the rest are
+closed. The threaded server's new thread per request therefore reuses
+connections instead of leaving one open per thread.
+"""
+
+import os
+import sqlite3
+import threading
+
+# Applied once to every new connection
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),       # readers don't block the writer
+    ('synchronous', 'NORMAL'),     # fsync on checkpoint, not on every commit
+    ('temp_store', 'MEMORY'),
+    ('cache_size', -16000),        # ~16 MB page cache per connection
+    ('mmap_size', 268435456),      # 256 MB memory-mapped I/O
+    ('busy_timeout', 5000),        # wait for locks instead of failing fast
+)
+
+# Number of compiled statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Idle connections kept open per pool
+MAX_IDLE = 16
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection whose close() hands it back to the pool instead of closing it"""
+
+    pool = None
+    generation = 0
+    checked_out = False
+
+    def close(self):
+        # Callers keep their `db.close()` calls; the connection is reused by
+        # the next get(). Closing it twice is harmless.
+        if self.pool is None:
+            self.release()
+        elif self.checked_out:
+            self.checked_out = False
+            self.pool.put(self)
+
+    def release(self):
+        """Really close the underlying connection"""
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """Pool of configured SQLite connections for one database file"""
+
+    def __init__(self, database, pragmas=DEFAULT_PRAGMAS,
+                 cached_statements=STATEMENT_CACHE_SIZE, max_idle=MAX_IDLE):
+        self.database = database
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []                # most recently returned last
+        self._connections = set()      # every open connection, idle or not
+        self._generation = 0
+        self._pid = os.getpid()
+
+    def _connect(self):
+        db = sqlite3.connect(
+            self.database,
+            factory=PooledConnection,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        db.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            db.execute(f'PRAGMA {name} = {value}')
+        db.pool = self
+        return db
+
+    def get(self):
+        """Check out a connection; the caller returns it with close()"""
+        if os.getpid() != self._pid:
+            # Forked worker: connections inherited from the parent are unsafe
+            self._reset_after_fork()
+
+        with self._lock:
+            db = self._idle.pop() if self._idle else None
+            generation = self._generation
+        if db is None:
+            db = self._connect()
+            db.generation = generation
+            with self._lock:
+                self._connections.add(db)
+        db.checked_out = True
+        return db
+
+    def put(self, db):
+        """Take back a connection from close(), or close it if not needed"""
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            current = db.generation == self._generation
+        try:
+            if current and db.in_transaction:
+                db.rollback()    # don't hand a half-done transaction to the next caller
+        except sqlite3.Error:
+            current = False
+        with self._lock:
+            if current and len(self._idle) < self.max_idle:
+                self._idle.append(db)
+                return
+            self._connections.discard(db)
+        try:
+            db.release()
+        except sqlite3.ProgrammingError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'open': len(self._connections), 'idle': len(self._idle)}
+
+    def close_all(self):
+        """Close every connection opened by this pool, including checked-out ones"""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+            self._idle = []
+            self._generation += 1      # connections returned later are closed
+        for db in connections:
+            try:
+                db.release()
+            except sqlite3.ProgrammingError:
+                pass
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._idle = []
+        self._connections = set()
+        self._generation += 1
+        self._pid = os.getpid()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database):
+    """Return the shared pool for a database path"""
+    pool = _pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(database)
+            if pool is None:
+                pool = _pools[database] = ConnectionPool(database)
+    return pool
+
+
+def close_all_pools():
+    """Close every pooled connection (used at shutdown and in tests)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,105 @@
+"""
+HTTP load test for the URL shortener's redirect path
+
+Creates a set of short links on a running server, then hammers
+GET /<short_code> from many keep-alive connections and reports redirects per
+second (and per server core).
+
+Usage:
+python Url.py                       # sync dev server on :5000
+python loadtest.py http://127.0.0.1:5000 --cores 1
+
+python asgi.py --workers 4          # ASGI on :8000
+python loadtest.py http://127.0.0.1:8000 --cores 4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+
+def create_links(base_url, count):
+    """Create `count` links through the bulk API and return their codes"""
+    body = '\n'.join(json.dumps({'url': f'https://example.com/load/{i}'})
+                     for i in range(count)).encode()
+    request = Request(base_url.rstrip('/') + '/api/shorten/bulk', data=body,
+                      headers={'Content-Type': 'application/x-ndjson'})
+    with urlopen(request) as response:
+        results = [json.loads(line) for line in response if line.strip()]
+    return [result['short_code'] for result in results if result.get('success')]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.x response; returns (status, keep_alive)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    version, status = lines[0].split(' ', 2)[:2]
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length:
+        await reader.readexactly(length)
+    keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+    return int(status), keep_alive
+
+
+async def client(host, port, codes, deadline, counts):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        code = random.choice(codes)
+        writer.write(f'GET /{code} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+                     f'User-Agent: loadtest\r\n\r\n'.encode())
+        try:
+            status, keep_alive = await read_response(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            status, keep_alive = None, False
+        counts[status] = counts.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(base_url, codes, connections, duration):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + duration
+    counts = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, codes, deadline, counts)
+                           for _ in range(connections)))
+    return counts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redirect load test')
+    parser.add_argument('base_url', help='e.g. http://127.0.0.1:5000')
+    parser.add_argument('--links', type=int, default=1000, help='links to create first')
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--cores', type=int, default=1,
+                        help='server processes/cores, for the per-core figure')
+    args = parser.parse_args()
+
+    codes = create_links(args.base_url, args.links)
+    print(f"Created {len(codes)} links, running for {args.duration:.0f}s "
+          f"with {args.connections} connections...")
+    counts, elapsed = asyncio.run(run(args.base_url, codes, args.connections, args.duration))
+
+    redirects = counts.get(302, 0)
+    print(f"Responses: {dict(sorted(counts.items(), key=str))}")
+    print(f"Redirects/s:          {redirects / elapsed:10.0f}")
+    print(f"Redirects/s per core: {redirects / elapsed / args.cores:10.0f}")
+
+
+if __name__ == '__main__':
+    main()
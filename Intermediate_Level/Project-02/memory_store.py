@@ -0,0 +1,290 @@
+"""
+In-memory storage engine for the URL shortener
+
+Every URL lives in a dict keyed by code, so a redirect is one dict lookup
+with no SQL, no connection and no lock contention with writers. Optionally,
+every change is appended to a JSON-lines log that is replayed on startup,
+which makes the store durable without a database:
+
+    {"op": "create", "seq": 1000, "urls": [[id, url, code, custom, created_at, ip], ...]}
+    {"op": "deactivate", "code": "abc123"}
+    {"op": "clicks", "events": [[code, clicked_at, ip, agent, referrer, accessed], ...]}
+
+Raw click history is kept only for the newest RECENT_CLICKS clicks per code;
+click series and top referrers/agents come from in-memory rollup counters,
+unique visitors from per-day HyperLogLog sketches. With keep_ips=False, IP
+addresses are replaced by a one-way pseudonym before they are logged.
+
+A crash can leave a torn final line. Replay stops there and the file is
+truncated back to the last complete entry before new entries are appended.
+
+The log is never compacted: it grows with every link and every click batch,
+and startup time grows with it. Rotate it offline (stop the server, replay
+into a fresh store) or use the SQLite engine for long-lived deployments.
+
+Only one process may use a log at a time. The code sequence lives in each
+process's memory, so two writers would hand out the same codes. init() takes
+an exclusive lock on the log (fcntl, where available) and raises RuntimeError
+if another store already holds it.
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:   # Windows: no log locking
+    fcntl = None
+
+import rollups
+import uniques
+from short_codes import CodeAllocator
+from url_store import (UrlStore, CUSTOM_CODE_TAKEN, CODE_GENERATION_FAILED,
+                       encode_cursor, decode_cursor)
+
+# Raw clicks kept per code for the stats page
+RECENT_CLICKS = 100
+
+
+class _CounterAllocator(CodeAllocator):
+    """CodeAllocator whose ID sequence is a counter on the store"""
+
+    def __init__(self, store, **kwargs):
+        super().__init__(None, **kwargs)
+        self.store = store
+
+    def _reserve(self, count):
+        start = self.store.next_id
+        self.store.next_id += count
+        return start
+
+
+class MemoryUrlStore(UrlStore):
+    """UrlStore held in memory, optionally persisted to an append-only log"""
+
+    def __init__(self, log_path=None, fsync=False, code_length=6, code_block=1000,
+                 code_key=None, keep_ips=True, rollup_hours=None):
+        self.log_path = log_path
+        self.fsync = fsync
+        self.keep_ips = keep_ips
+        self.rollup_hours = rollup_hours   # hourly rollup buckets kept (None = all)
+        self.next_id = 0               # next ID for the code sequence
+        self.allocator = _CounterAllocator(self, block_size=code_block,
+                                           min_length=code_length, key=code_key)
+        self._by_code = {}
+        self._by_id = {}
+        self._order = []               # (created_at, id), ascending
+        self._recent = defaultdict(lambda: deque(maxlen=RECENT_CLICKS))
+        self._rollups = defaultdict(Counter)
+        self._sketches = defaultdict(dict)     # short_code -> {day: HyperLogLog}
+        self._last_id = 0
+        self._click_id = 0
+        self._lock = threading.RLock()
+        self._log = None
+
+    def init(self):
+        with self._lock:
+            if self._log is not None or not self.log_path:
+                return
+            log = open(self.log_path, 'a', encoding='utf-8')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(log.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    log.close()
+                    raise RuntimeError(f"{self.log_path} is in use by another memory "
+                                       "store; it supports a single process") from None
+            self._replay()
+            self._log = log
+
+    def _replay(self):
+        good = 0    # byte offset just past the last complete entry
+        with open(self.log_path, 'rb') as log:
+            for line in log:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('unterminated line')
+                    entry = json.loads(line)
+                except ValueError:
+                    break   # torn write from a crash; everything before it is intact
+                good += len(line)
+                if entry['op'] == 'create':
+                    self.next_id = max(self.next_id, entry['seq'])
+                    for row in entry['urls']:
+                        self._add(*row)
+                elif entry['op'] == 'deactivate':
+                    self._deactivate(entry['code'])
+                elif entry['op'] == 'clicks':
+                    self._apply_clicks([tuple(event) for event in entry['events']])
+        # Drop the torn tail, or entries appended after it would never be replayed
+        if good < os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as log:
+                log.truncate(good)
+
+    def _append(self, entry):
+        if self._log is None:
+            return
+        self._log.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    # ---------- URLs ----------
+
+    def _add(self, url_id, original_url, short_code, custom_code, created_at, user_ip):
+        record = {
+            'id': url_id,
+            'original_url': original_url,
+            'short_code': short_code,
+            'custom_code': custom_code,
+            'created_at': created_at,
+            'clicks': 0,
+            'last_accessed': None,
+            'user_ip': user_ip,
+            'is_active': 1,
+        }
+        self._by_code[short_code] = record
+        self._by_id[url_id] = record
+        insort(self._order, (created_at, url_id))
+        self._last_id = max(self._last_id, url_id)
+
+    def create_many(self, rows, user_ip=None):
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        results = []
+        added = []
+        with self._lock:
+            claimed = set()
+            for original_url, custom_code in rows:
+                if custom_code:
+                    if custom_code in self._by_code or custom_code in claimed:
+                        results.append((None, CUSTOM_CODE_TAKEN))
+                        continue
+                    short_code = custom_code
+                else:
+                    # A custom code may already hold the next generated value
+                    for _ in range(10):
+                        short_code = self.allocator.allocate()
+                        if short_code not in self._by_code and short_code not in claimed:
+                            break
+                    else:
+                        results.append((None, CODE_GENERATION_FAILED))
+                        continue
+                claimed.add(short_code)
+                self._last_id += 1
+                added.append([self._last_id, original_url, short_code, custom_code,
+                              created_at, user_ip])
+                results.append((short_code, None))
+
+            if added:
+                self._append({'op': 'create', 'seq': self.next_id, 'urls': added})
+                for row in added:
+                    self._add(*row)
+        return results
+
+    def resolve(self, code):
+        with self._lock:
+            record = self._by_code.get(code)
+            return dict(record) if record and record['is_active'] else None
+
+    def get(self, code):
+        with self._lock:
+            record = self._by_code.get(code)
+            return dict(record) if record else None
+
+    def _deactivate(self, code):
+        record = self._by_code.get(code)
+        if record is None:
+            return False
+        record['is_active'] = 0
+        return True
+
+    def deactivate(self, code):
+        with self._lock:
+            if code not in self._by_code:
+                return False
+            self._append({'op': 'deactivate', 'code': code})
+            return self._deactivate(code)
+
+    def list_page(self, limit=100, cursor=None):
+        with self._lock:
+            end = len(self._order)
+            if cursor:
+                end = bisect_left(self._order, decode_cursor(cursor))
+            keys = self._order[max(0, end - limit):end]
+            urls = [dict(self._by_id[url_id]) for _, url_id in reversed(keys)]
+        next_cursor = encode_cursor(urls[-1]) if len(urls) == limit else None
+        return urls, next_cursor
+
+    def iter_urls(self, batch_size=1000):
+        with self._lock:
+            ids = sorted(self._by_id)
+        for start in range(0, len(ids), batch_size):
+            with self._lock:
+                batch = [dict(self._by_id[url_id]) for url_id in ids[start:start + batch_size]]
+            yield from batch
+
+    # ---------- clicks ----------
+
+    def _apply_clicks(self, events):
+        for short_code, clicked_at, user_ip, user_agent, referrer, accessed in events:
+            record = self._by_code.get(short_code)
+            if record is not None:
+                record['clicks'] += 1
+                record['last_accessed'] = accessed
+            self._click_id += 1
+            self._recent[short_code].append({
+                'id': self._click_id,
+                'short_code': short_code,
+                'clicked_at': clicked_at,
+                'user_ip': user_ip if self.keep_ips else None,
+                'user_agent': user_agent,
+                'referrer': referrer,
+            })
+        for key, n in rollups.aggregate(
+                (code, clicked_at, agent, referrer)
+                for code, clicked_at, _, agent, referrer, _ in events).items():
+            self._rollups[key[0]][key] += n
+        if self.rollup_hours:
+            for short_code in {event[0] for event in events}:
+                rollups.prune_hourly_counts(self._rollups[short_code], self.rollup_hours)
+        for (short_code, day), sketch in uniques.aggregate(
+                event[:3] for event in events).items():
+            stored = self._sketches[short_code].get(day)
+            if stored is None:
+                self._sketches[short_code][day] = sketch
+            else:
+                stored.merge(sketch)
+
+    def record_clicks(self, events):
+        if not self.keep_ips:
+            events = [(code, clicked_at, ip and uniques.pseudonym(ip), agent, referrer, accessed)
+                      for code, clicked_at, ip, agent, referrer, accessed in events]
+        with self._lock:
+            self._append({'op': 'clicks', 'events': [list(event) for event in events]})
+            self._apply_clicks(events)
+
+    def recent_clicks(self, short_code, limit=10):
+        with self._lock:
+            clicks = self._recent.get(short_code, ())
+            return [dict(click) for click in reversed(list(clicks)[-limit:])]
+
+    def click_stats(self, short_code, days=30):
+        with self._lock:
+            counts = Counter(self._rollups.get(short_code, ()))
+        return rollups.stats_from_counts(counts, short_code, days=days)
+
+    def unique_visitors(self, short_code, days=30, granularity='day'):
+        with self._lock:
+            sketches = [(day, uniques.HyperLogLog(sketch.precision, sketch.registers))
+                        for day, sketch in self._sketches.get(short_code, {}).items()]
+        return uniques.series(sketches, short_code, days=days, granularity=granularity)
@@ -0,0 +1,62 @@
+"""
+Precomputed HTML responses for the URL shortener
+
+Pages that are the same for every visitor are rendered once, hashed for an
+ETag and compressed ahead of time (gzip always, brotli when the `brotli`
+package is installed). Each request then only picks an encoding and sends
+bytes that are already prepared.
+"""
+
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:   # optional: pip install brotli
+    brotli = None
+
+
+class PrecompressedPage:
+    """One static body, stored as identity, gzip and (optionally) brotli bytes"""
+
+    def __init__(self, body, mimetype='text/html', max_age=300):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.max_age = max_age
+        self.etag = hashlib.sha256(body).hexdigest()[:20]
+
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+
+    def _etag_for(self, encoding):
+        # Each encoding is a different byte stream, so it gets its own tag
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+    def choose_encoding(self, accept_encodings):
+        """Best stored encoding the client accepts"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    def response(self, request):
+        """Build the response (304 if the client's copy is current)"""
+        encoding = self.choose_encoding(request.accept_encodings)
+        etag = self._etag_for(encoding)
+
+        if any(request.if_none_match.contains(self._etag_for(e)) for e in self.variants):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response
@@ -0,0 +1,92 @@
+"""
+In-memory cache of short_code -> URL resolutions
+
+A bounded LRU map with a time-to-live on every entry. Unknown codes are cached
+too (negative caching, with their own shorter TTL) so scanners probing random
+codes don't hit the database on every request. Hit/miss/eviction counters are
+kept so the cache can be sized from real traffic.
+
+The cache is per process: after a URL is deactivated, other worker processes
+keep serving it until their entry's TTL runs out.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by get() when the key isn't cached (None means "cached as unknown")
+MISS = object()
+
+
+class ResolutionCache:
+    """Thread-safe LRU + TTL cache with negative entries"""
+
+    def __init__(self, max_size=10000, ttl=300.0, negative_ttl=30.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value (None for a cached miss) or MISS"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache a resolution; value None records that the code is unknown"""
+        if self.max_size <= 0:
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Forget a key (after the URL is created, changed or deactivated)"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
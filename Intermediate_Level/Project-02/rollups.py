@@ -0,0 +1,201 @@
+"""
+Pre-aggregated click rollups for the URL shortener
+
+Clicks are counted per short_code into hourly and daily buckets, for the
+total and per referrer host / user-agent family. The counters are updated in
+the same transaction that stores each batch of raw clicks, so stats queries
+read a handful of rollup rows instead of scanning the clicks table.
+
+Hourly buckets are only read for the last 48 hours, so each batch also deletes
+the clicked codes' hourly buckets older than `keep_hours` (the daily buckets
+still hold those clicks). A code's old hours go the next time it is clicked,
+so each code keeps at most `keep_hours` hourly buckets.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+CREATE_ROLLUPS_SQL = '''
+    CREATE TABLE IF NOT EXISTS click_rollups (
+        short_code TEXT NOT NULL,
+        granularity TEXT NOT NULL,      -- 'hour' or 'day'
+        dimension TEXT NOT NULL,        -- 'total', 'referrer' or 'agent'
+        bucket TEXT NOT NULL,           -- 'YYYY-MM-DD HH:00' or 'YYYY-MM-DD' (UTC)
+        value TEXT NOT NULL,            -- referrer host / agent family ('' for total)
+        clicks INTEGER NOT NULL,
+        PRIMARY KEY (short_code, granularity, dimension, bucket, value)
+    ) WITHOUT ROWID
+'''
+
+UPSERT_SQL = '''
+    INSERT INTO click_rollups (short_code, granularity, dimension, bucket, value, clicks)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (short_code, granularity, dimension, bucket, value)
+    DO UPDATE SET clicks = clicks + excluded.clicks
+'''
+
+SERIES_SQL = '''
+    SELECT bucket, clicks FROM click_rollups
+    WHERE short_code = ? AND granularity = ? AND dimension = 'total' AND bucket >= ?
+    ORDER BY bucket
+'''
+
+PRUNE_HOURLY_SQL = '''
+    DELETE FROM click_rollups
+    WHERE short_code = ? AND granularity = 'hour' AND bucket < ?
+'''
+
+TOP_VALUES_SQL = '''
+    SELECT value, SUM(clicks) AS clicks FROM click_rollups
+    WHERE short_code = ? AND granularity = 'day' AND dimension = ? AND bucket >= ?
+    GROUP BY value
+    ORDER BY clicks DESC
+    LIMIT ?
+'''
+
+# Checked in order; the first match wins
+AGENT_FAMILIES = [
+    ('Bot', re.compile(r'bot|crawl|spider|slurp|preview', re.I)),
+    ('curl', re.compile(r'^curl/', re.I)),
+    ('Edge', re.compile(r'Edg(e|A|iOS)?/')),
+    ('Opera', re.compile(r'OPR/|Opera')),
+    ('Chrome', re.compile(r'Chrome/|CriOS/')),
+    ('Firefox', re.compile(r'Firefox/|FxiOS/')),
+    ('Safari', re.compile(r'Safari/')),
+]
+
+
+def referrer_host(referrer):
+    """Host part of a referrer URL, or 'direct' when there is none"""
+    if not referrer:
+        return 'direct'
+    try:
+        host = urlsplit(referrer).hostname
+    except ValueError:
+        return 'invalid'
+    return host[4:] if host and host.startswith('www.') else host or 'direct'
+
+
+def agent_family(user_agent):
+    """Coarse browser family for a User-Agent header"""
+    if not user_agent or user_agent == 'Unknown':
+        return 'Unknown'
+    for family, pattern in AGENT_FAMILIES:
+        if pattern.search(user_agent):
+            return family
+    return 'Other'
+
+
+def aggregate(clicks):
+    """Count (short_code, clicked_at, user_agent, referrer) tuples into rollup keys
+
+    clicked_at is the UTC 'YYYY-MM-DD HH:MM:SS' string stored with the click.
+    """
+    counts = Counter()
+    for short_code, clicked_at, user_agent, referrer in clicks:
+        if not clicked_at:
+            continue
+        hour, day = clicked_at[:13] + ':00', clicked_at[:10]
+        dimensions = (
+            ('total', ''),
+            ('referrer', referrer_host(referrer)),
+            ('agent', agent_family(user_agent)),
+        )
+        for dimension, value in dimensions:
+            counts[(short_code, 'hour', dimension, hour, value)] += 1
+            counts[(short_code, 'day', dimension, day, value)] += 1
+    return counts
+
+
+def apply(db, clicks):
+    """Add a batch of clicks to the rollups (inside the caller's transaction)"""
+    counts = aggregate(clicks)
+    db.executemany(UPSERT_SQL, [key + (n,) for key, n in counts.items()])
+
+
+def hourly_cutoff(keep_hours, now=None):
+    """Oldest hourly bucket kept when keeping `keep_hours` hours"""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(hours=keep_hours - 1)).strftime('%Y-%m-%d %H:00')
+
+
+def prune_hourly(db, short_codes, keep_hours, now=None):
+    """Delete these codes' hourly buckets older than `keep_hours` (inside the caller's transaction)"""
+    cutoff = hourly_cutoff(keep_hours, now)
+    db.executemany(PRUNE_HOURLY_SQL, [(code, cutoff) for code in short_codes])
+
+
+def prune_hourly_counts(counts, keep_hours, now=None):
+    """Same as prune_hourly() for one code's aggregate() Counter in memory"""
+    cutoff = hourly_cutoff(keep_hours, now)
+    for key in [key for key in counts if key[1] == 'hour' and key[3] < cutoff]:
+        del counts[key]
+
+
+def backfill(db, batch_size=10000):
+    """Build rollups from every click already in the clicks table"""
+    cursor = db.execute('SELECT short_code, clicked_at, user_agent, referrer FROM clicks')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        apply(db, [tuple(row) for row in rows])
+    cursor.close()
+
+
+def _windows(now, days, hours):
+    """First daily and hourly bucket inside the stats window"""
+    now = now or datetime.now(timezone.utc)
+    return ((now - timedelta(days=days - 1)).strftime('%Y-%m-%d'),
+            (now - timedelta(hours=hours - 1)).strftime('%Y-%m-%d %H:00'))
+
+
+def stats(db, short_code, days=30, hours=48, top=10, now=None):
+    """Click series and top referrers/agents, read from the rollups only"""
+    since_day, since_hour = _windows(now, days, hours)
+
+    def top_values(dimension):
+        rows = db.execute(TOP_VALUES_SQL, (short_code, dimension, since_day, top))
+        return [{'value': value, 'clicks': clicks} for value, clicks in rows]
+
+    return {
+        'short_code': short_code,
+        'daily': [{'day': bucket, 'clicks': clicks}
+                  for bucket, clicks in db.execute(SERIES_SQL, (short_code, 'day', since_day))],
+        'hourly': [{'hour': bucket, 'clicks': clicks}
+                   for bucket, clicks in db.execute(SERIES_SQL, (short_code, 'hour', since_hour))],
+        'top_referrers': top_values('referrer'),
+        'top_agents': top_values('agent'),
+    }
+
+
+def stats_from_counts(counts, short_code, days=30, hours=48, top=10, now=None):
+    """Same result as stats(), computed from an aggregate() Counter in memory"""
+    since_day, since_hour = _windows(now, days, hours)
+    series = {'day': Counter(), 'hour': Counter()}
+    values = {'referrer': Counter(), 'agent': Counter()}
+    for (code, granularity, dimension, bucket, value), n in counts.items():
+        if code != short_code:
+            continue
+        if bucket < (since_day if granularity == 'day' else since_hour):
+            continue
+        if dimension == 'total':
+            series[granularity][bucket] += n
+        elif granularity == 'day':
+            values[dimension][value] += n
+
+    def top_values(dimension):
+        return [{'value': value, 'clicks': clicks}
+                for value, clicks in values[dimension].most_common(top)]
+
+    return {
+        'short_code': short_code,
+        'daily': [{'day': bucket, 'clicks': clicks}
+                  for bucket, clicks in sorted(series['day'].items())],
+        'hourly': [{'hour': bucket, 'clicks': clicks}
+                   for bucket, clicks in sorted(series['hour'].items())],
+        'top_referrers': top_values('referrer'),
+        'top_agents': top_values('agent'),
+    }
@@ -0,0 +1,182 @@
+"""
+Collision-free short-code allocation
+
+Every new short URL gets the next integer from a sequence stored in the
+database, and the integer is written in base62. Distinct integers always give
+distinct codes, so no "does this code exist?" query is needed.
+
+Each process reserves a block of IDs at a time (one small transaction per
+block), then hands them out from memory. Codes can optionally be passed
+through a keyed Feistel permutation, which keeps them unique but makes
+consecutive links look unrelated.
+"""
+
+import hashlib
+import os
+import string
+import threading
+
+ALPHABET = string.ascii_letters + string.digits
+BASE = len(ALPHABET)
+_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+
+SEQUENCE_NAME = 'urls'
+RESERVE_SQL = 'UPDATE code_sequence SET next_id = next_id + ? WHERE name = ?'
+CURRENT_SQL = 'SELECT next_id FROM code_sequence WHERE name = ?'
+
+
+def base62_encode(number, length=1):
+    """Encode a non-negative integer, left-padded to at least `length` chars"""
+    if number < 0:
+        raise ValueError("number must be non-negative")
+    chars = []
+    while number:
+        number, digit = divmod(number, BASE)
+        chars.append(ALPHABET[digit])
+    code = ''.join(reversed(chars))
+    return ALPHABET[0] * (length - len(code)) + code
+
+
+def base62_decode(code):
+    """Inverse of base62_encode"""
+    number = 0
+    for char in code:
+        number = number * BASE + _INDEX[char]
+    return number
+
+
+class FeistelPermutation:
+    """Keyed bijection on range(BASE ** length)
+
+    A balanced Feistel network over the smallest even number of bits that
+    covers the range, with cycle-walking to stay inside it.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, key, length):
+        self.domain = BASE ** length
+        bits = self.domain.bit_length()
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.round_keys = [
+            hashlib.blake2b(key + bytes([r]), digest_size=16).digest()
+            for r in range(self.ROUNDS)
+        ]
+        # Keyed hashers set up once; copying one is cheaper than re-keying
+        self._hashers = [hashlib.blake2b(digest_size=8, key=round_key)
+                         for round_key in self.round_keys]
+
+    def _round(self, r, value):
+        hasher = self._hashers[r].copy()
+        hasher.update(value.to_bytes(8, 'big'))
+        return int.from_bytes(hasher.digest(), 'big') & self.mask
+
+    def _encrypt_once(self, number):
+        left, right = number >> self.half_bits, number & self.mask
+        for r in range(self.ROUNDS):
+            left, right = right, left ^ self._round(r, right)
+        return (left << self.half_bits) | right
+
+    def _decrypt_once(self, number):
+        left, right = number >> self.half_bits, number & self.mask
+        for r in reversed(range(self.ROUNDS)):
+            left, right = right ^ self._round(r, left), left
+        return (left << self.half_bits) | right
+
+    def permute(self, number):
+        number = self._encrypt_once(number)
+        while number >= self.domain:   # cycle-walk back into range
+            number = self._encrypt_once(number)
+        return number
+
+    def invert(self, number):
+        number = self._decrypt_once(number)
+        while number >= self.domain:
+            number = self._decrypt_once(number)
+        return number
+
+
+class CodeAllocator:
+    """Hands out unique short codes from block-reserved database IDs"""
+
+    def __init__(self, connect, block_size=1000, min_length=6, key=None):
+        self.connect = connect
+        self.block_size = block_size
+        self.min_length = min_length
+        self.key = key.encode() if isinstance(key, str) else key
+        self._permutations = {}
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._pid = os.getpid()
+
+    # ---------- ID reservation ----------
+
+    def _reserve(self, count):
+        """Claim `count` IDs from the shared sequence; returns the first one
+
+        `connect` must return a connection nobody else is using (a pooled
+        get() checks out its own), so this commit never ends a caller's
+        transaction halfway.
+        """
+        db = self.connect()
+        if db.in_transaction:
+            db.close()
+            raise RuntimeError("ID reservation needs its own connection, "
+                               "not one inside a transaction")
+        try:
+            # The UPDATE takes the write lock, so the SELECT after it sees
+            # our own increment and no other process can interleave.
+            db.execute(RESERVE_SQL, (count, SEQUENCE_NAME))
+            end = db.execute(CURRENT_SQL, (SEQUENCE_NAME,)).fetchone()[0]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return end - count
+
+    def _take(self, count):
+        """Take `count` IDs from the local block, reserving more as needed"""
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: the parent's block belongs to the parent
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            ids = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    size = max(self.block_size, count - len(ids))
+                    self._next = self._reserve(size)
+                    self._end = self._next + size
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+            return ids
+
+    # ---------- encoding ----------
+
+    def _length_for(self, number):
+        length = self.min_length
+        while number >= BASE ** length:
+            length += 1
+        return length
+
+    def encode(self, number):
+        """Turn a sequence ID into its short code"""
+        length = self._length_for(number)
+        if self.key:
+            permutation = self._permutations.get(length)
+            if permutation is None:
+                permutation = self._permutations[length] = FeistelPermutation(self.key, length)
+            number = permutation.permute(number)
+        return base62_encode(number, length)
+
+    def allocate(self):
+        """Return one new unique short code"""
+        return self.encode(self._take(1)[0])
+
+    def allocate_many(self, count):
+        """Return `count` new unique short codes"""
+        return [self.encode(number) for number in self._take(count)]
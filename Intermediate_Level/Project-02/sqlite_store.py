@@ -0,0 +1,542 @@
+"""
+SQLite storage engine for the URL shortener
+
+All of the shortener's SQL lives here: schema and migrations, indexed code
+lookups, sequence-allocated codes, batched click writes into monthly
+partitions, click rollups and keyset pagination.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import click_partitions
+import metrics
+import rollups
+import uniques
+from code_filter import BloomFilter
+from short_codes import CodeAllocator
+from url_store import (UrlStore, CUSTOM_CODE_TAKEN, CODE_GENERATION_FAILED,
+                       encode_cursor, decode_cursor)
+
+# ==================== SCHEMA ====================
+
+CREATE_URLS_SQL = '''
+    CREATE TABLE IF NOT EXISTS urls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        original_url TEXT NOT NULL,
+        short_code TEXT UNIQUE NOT NULL,
+        custom_code TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        clicks INTEGER DEFAULT 0,
+        last_accessed TIMESTAMP,
+        user_ip TEXT,
+        is_active INTEGER DEFAULT 1
+    )
+'''
+
+# Kept for migration 4; raw clicks now live in monthly partitions
+CREATE_CLICKS_SQL = '''
+    CREATE TABLE IF NOT EXISTS clicks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        short_code TEXT NOT NULL,
+        clicked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user_ip TEXT,
+        user_agent TEXT,
+        referrer TEXT,
+        FOREIGN KEY (short_code) REFERENCES urls (short_code)
+    )
+'''
+
+# Schema migrations, applied in order. PRAGMA user_version stores how many
+# have been applied, so existing databases are upgraded in place. A step is
+# either SQL or a function that gets the connection.
+MIGRATIONS = [
+    # 1: index custom_code lookups, per-link click history and dashboard order
+    [
+        'CREATE INDEX IF NOT EXISTS idx_urls_custom_code ON urls (custom_code)',
+        'CREATE INDEX IF NOT EXISTS idx_urls_created_at ON urls (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_clicks_short_code ON clicks (short_code, clicked_at)',
+    ],
+    # 2: ID sequence behind generated short codes
+    [
+        '''CREATE TABLE IF NOT EXISTS code_sequence (
+               name TEXT PRIMARY KEY,
+               next_id INTEGER NOT NULL
+           )''',
+        "INSERT OR IGNORE INTO code_sequence (name, next_id) VALUES ('urls', 0)",
+    ],
+    # 3: hourly/daily click rollups, backfilled from existing clicks
+    [
+        rollups.CREATE_ROLLUPS_SQL,
+        rollups.backfill,
+    ],
+    # 4: move raw clicks into monthly partitions (the clicks table stays, empty)
+    [
+        click_partitions.migrate_legacy,
+    ],
+    # 5: per-day unique-visitor sketches, backfilled from the partitions
+    [
+        uniques.CREATE_UNIQUES_SQL,
+        uniques.backfill,
+    ],
+]
+
+# ==================== LOCK RETRIES ====================
+
+# busy_timeout already makes SQLite wait for a lock; a write that still fails
+# with "database is locked" is retried a few times with backoff.
+SQLITE_BUSY = metrics.Counter(
+    'urlshortener_sqlite_busy_total',
+    'Writes that failed with SQLITE_BUSY / database is locked', ['operation'])
+SQLITE_LOCK_RETRIES = metrics.Counter(
+    'urlshortener_sqlite_lock_retries_total',
+    'Writes retried after SQLITE_BUSY / database is locked', ['operation'])
+
+
+CODE_FILTER_CHECKS = metrics.Counter(
+    'urlshortener_code_filter_checks_total',
+    'Code existence checks answered by the Bloom filter', ['result'])
+
+
+def _is_lock_error(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+# ==================== QUERIES ====================
+
+# A code can match either column. Each branch of the UNION ALL is a single
+# index probe (UNIQUE short_code / idx_urls_custom_code), where the
+# `short_code = ? OR custom_code = ?` form could fall back to a table scan.
+URL_BY_CODE_SQL = '''
+    SELECT * FROM urls WHERE short_code = ?
+    UNION ALL
+    SELECT * FROM urls WHERE custom_code = ?
+    LIMIT 1
+'''
+
+ACTIVE_URL_BY_CODE_SQL = '''
+    SELECT * FROM urls WHERE short_code = ? AND is_active = 1
+    UNION ALL
+    SELECT * FROM urls WHERE custom_code = ? AND is_active = 1
+    LIMIT 1
+'''
+
+DEACTIVATE_URL_SQL = '''
+    UPDATE urls SET is_active = 0
+    WHERE id IN (SELECT id FROM urls WHERE short_code = ?
+                 UNION ALL
+                 SELECT id FROM urls WHERE custom_code = ?)
+'''
+
+INSERT_URL_SQL = '''INSERT INTO urls (original_url, short_code, custom_code, user_ip)
+                    VALUES (?, ?, ?, ?)'''
+
+UPDATE_COUNTER_SQL = '''UPDATE urls SET clicks = clicks + ?, last_accessed = ?
+                        WHERE short_code = ?'''
+
+# Keyset pagination, newest first. idx_urls_created_at also holds the rowid
+# (id), so both queries walk the index backwards with no sort and no OFFSET.
+URLS_PAGE_SQL = 'SELECT * FROM urls ORDER BY created_at DESC, id DESC LIMIT ?'
+
+URLS_PAGE_AFTER_SQL = '''
+    SELECT * FROM urls
+    WHERE (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+# Full export in rowid order
+EXPORT_URLS_SQL = 'SELECT * FROM urls ORDER BY id'
+
+# Codes for the Bloom filter: all of them, or those added after a known id.
+# SQLite commits one writer at a time, so ids become visible in order.
+CODES_SQL = 'SELECT id, short_code, custom_code FROM urls WHERE id > ? ORDER BY id'
+
+
+def migrate_db(db):
+    """Apply any schema migrations the database hasn't seen yet"""
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            if callable(statement):
+                statement(db)
+            else:
+                db.execute(statement)
+        db.execute(f'PRAGMA user_version = {number}')
+        db.commit()
+        print(f"✓ Applied database migration {number}")
+
+
+def _taken_codes(db, codes):
+    """Return which of `codes` already exist as a short or custom code"""
+    taken = set()
+    codes = list(codes)
+    for start in range(0, len(codes), 400):   # stay under SQLite's variable limit
+        part = codes[start:start + 400]
+        marks = ','.join('?' * len(part))
+        rows = db.execute(
+            f'''SELECT short_code FROM urls WHERE short_code IN ({marks})
+                UNION
+                SELECT custom_code FROM urls WHERE custom_code IN ({marks})''',
+            part + part
+        ).fetchall()
+        taken.update(row[0] for row in rows)
+    return taken
+
+
+class SqliteUrlStore(UrlStore):
+    """UrlStore backed by SQLite; `connect` returns a (pooled) connection"""
+
+    def __init__(self, connect, code_length=6, code_block=1000, code_key=None,
+                 retention_months=None, lock_retries=3, lock_retry_delay=0.05,
+                 code_filter_capacity=None, code_filter_error_rate=0.01,
+                 code_filter_catch_up=0.1, keep_ips=True, rollup_hours=None):
+        self.connect = connect
+        self.retention_months = retention_months
+        # Hourly rollup buckets kept per code (None = keep all); see rollups.py
+        self.rollup_hours = rollup_hours
+        # False stores clicks without user_ip (uniques only need the sketches)
+        self.keep_ips = keep_ips
+        self.lock_retries = lock_retries
+        self.lock_retry_delay = lock_retry_delay
+        # Bloom filter of known codes (None = disabled); see code_filter.py
+        self.code_filter = None
+        self.code_filter_capacity = code_filter_capacity
+        self.code_filter_error_rate = code_filter_error_rate
+        # Seconds between loads of codes other processes inserted
+        self.code_filter_catch_up = code_filter_catch_up
+        self._filter_lock = threading.Lock()
+        self._filter_max_id = 0
+        self._filter_pending = None     # codes added while a rebuild runs
+        self._catch_up_lock = threading.Lock()
+        self._caught_up_at = 0.0
+        self.allocator = CodeAllocator(connect, block_size=code_block,
+                                       min_length=code_length, key=code_key)
+        self._seen_partitions = set()
+
+    def init(self):
+        db = self.connect()
+        db.execute(CREATE_URLS_SQL)
+        db.execute(CREATE_CLICKS_SQL)
+        migrate_db(db)
+        db.commit()
+        db.close()
+        if self.code_filter_capacity:
+            self.rebuild_code_filter()
+
+    # ---------- code filter ----------
+
+    def _load_codes(self, code_filter, after_id):
+        """Add codes with id > after_id to `code_filter`; returns the last id"""
+        db = self.connect()
+        cursor = db.execute(CODES_SQL, (after_id,))
+        try:
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    return after_id
+                for url_id, short_code, custom_code in rows:
+                    # Skip codes this process already added after its insert
+                    if short_code not in code_filter:
+                        code_filter.add(short_code)
+                    if custom_code and custom_code not in code_filter:
+                        code_filter.add(custom_code)
+                after_id = rows[-1][0]
+        finally:
+            cursor.close()
+            db.close()
+
+    def rebuild_code_filter(self):
+        """Build a fresh filter from every code in the database
+
+        Sized for twice the current codes (at least code_filter_capacity),
+        so a growing table triggers a rebuild only each time it doubles.
+        """
+        if not self.code_filter_capacity:
+            return
+        with self._filter_lock:
+            if self._filter_pending is None:
+                self._filter_pending = []
+        db = self.connect()
+        count = db.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+        db.close()
+        code_filter = BloomFilter(max(self.code_filter_capacity, 2 * count),
+                                  self.code_filter_error_rate)
+        max_id = self._load_codes(code_filter, 0)
+        with self._filter_lock:
+            code_filter.update(self._filter_pending)
+            self._filter_pending = None
+            self.code_filter = code_filter
+            self._filter_max_id = max_id
+            self._caught_up_at = time.monotonic()
+
+    def _remember_codes(self, codes):
+        code_filter = self.code_filter
+        if code_filter is None:
+            return
+        with self._filter_lock:
+            code_filter.update(codes)
+            if self._filter_pending is not None:
+                self._filter_pending.extend(codes)
+                return
+            if not code_filter.saturated:
+                return
+            self._filter_pending = []
+        threading.Thread(target=self.rebuild_code_filter, name='code-filter-rebuild',
+                         daemon=True).start()
+
+    def _catch_up(self, code_filter):
+        """Load codes other processes inserted since the last known id
+
+        Runs at most every code_filter_catch_up seconds, on one thread; other
+        threads keep using the filter as it is. Returns True if it ran.
+        """
+        if time.monotonic() - self._caught_up_at < self.code_filter_catch_up:
+            return False
+        if not self._catch_up_lock.acquire(blocking=False):
+            return False
+        try:
+            if time.monotonic() - self._caught_up_at < self.code_filter_catch_up:
+                return False
+            self._caught_up_at = time.monotonic()
+            # Usually nothing new: one probe at the end of the rowid index.
+            # BloomFilter.add is thread-safe, so this needs no _filter_lock.
+            max_id = self._load_codes(code_filter, self._filter_max_id)
+            with self._filter_lock:
+                if self.code_filter is code_filter:    # not replaced by a rebuild
+                    self._filter_max_id = max(self._filter_max_id, max_id)
+            return True
+        finally:
+            self._catch_up_lock.release()
+
+    def might_exist(self, code):
+        """False only if `code` is definitely not in the database"""
+        code_filter = self.code_filter
+        if (code_filter is None or code in code_filter
+                or (self._catch_up(code_filter) and code in code_filter)):
+            CODE_FILTER_CHECKS.inc(result='maybe')
+            return True
+        CODE_FILTER_CHECKS.inc(result='definite_miss')
+        return False
+
+    def _retry_locked(self, operation, func, *args):
+        """Run a write transaction, retrying it while the database is locked"""
+        for attempt in range(self.lock_retries + 1):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e):
+                    raise
+                SQLITE_BUSY.inc(operation=operation)
+                if attempt == self.lock_retries:
+                    raise
+                SQLITE_LOCK_RETRIES.inc(operation=operation)
+                time.sleep(self.lock_retry_delay * 2 ** attempt)
+
+    # ---------- URLs ----------
+
+    def create_many(self, rows, user_ip=None):
+        return self._retry_locked('create', self._create_many, rows, user_ip)
+
+    def _create_many(self, rows, user_ip):
+        results = [None] * len(rows)
+        pending = []       # [position, original_url, short_code, custom_code]
+        seen = set()
+        for position, (original_url, custom_code) in enumerate(rows):
+            if custom_code and custom_code in seen:
+                results[position] = (None, CUSTOM_CODE_TAKEN)
+                continue
+            seen.add(custom_code)
+            pending.append([position, original_url, custom_code, custom_code])
+
+        db = self.connect()
+        try:
+            # One query for every custom code, one allocator call for every
+            # generated code
+            taken = _taken_codes(db, [row[3] for row in pending
+                                      if row[3] and self.might_exist(row[3])])
+            for row in pending:
+                if row[3] in taken:
+                    results[row[0]] = (None, CUSTOM_CODE_TAKEN)
+            pending = [row for row in pending if results[row[0]] is None]
+            generated = [row for row in pending if row[3] is None]
+            for row, code in zip(generated, self.allocator.allocate_many(len(generated))):
+                row[2] = code
+
+            for _ in range(10):
+                try:
+                    db.executemany(INSERT_URL_SQL, [(url, code, custom, user_ip)
+                                                    for _, url, code, custom in pending])
+                    break
+                except sqlite3.IntegrityError:
+                    # Someone else took one of the codes meanwhile. Find which,
+                    # with no write transaction open, so the allocator (on its
+                    # own connection) can reserve replacements without waiting
+                    # on our lock; then insert the whole chunk again.
+                    db.rollback()
+                    pending = self._replace_taken(db, pending, results)
+            else:
+                db.rollback()
+                for row in pending:
+                    results[row[0]] = (None, CODE_GENERATION_FAILED)
+                pending = []
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for position, _, code, _ in pending:
+            if results[position] is None:
+                results[position] = (code, None)
+        self._remember_codes([code for code, error in results if code])
+        return results
+
+    def _replace_taken(self, db, pending, results):
+        """Fail taken custom codes and give taken generated codes new ones"""
+        taken = _taken_codes(db, [row[2] for row in pending])
+        for row in pending:
+            if row[3] and row[2] in taken:
+                results[row[0]] = (None, CUSTOM_CODE_TAKEN)
+        pending = [row for row in pending if results[row[0]] is None]
+        # A generated code may also clash with a custom code in this chunk
+        claimed = {row[3] for row in pending if row[3]}
+        for row in pending:
+            if row[3] is None:
+                if row[2] in taken or row[2] in claimed:
+                    row[2] = self.allocator.allocate()
+                claimed.add(row[2])
+        return pending
+
+    def _fetch_one(self, sql, code):
+        db = self.connect()
+        row = db.execute(sql, (code, code)).fetchone()
+        db.close()
+        return dict(row) if row else None
+
+    def resolve(self, code):
+        if not self.might_exist(code):
+            return None
+        return self._fetch_one(ACTIVE_URL_BY_CODE_SQL, code)
+
+    def get(self, code):
+        if not self.might_exist(code):
+            return None
+        return self._fetch_one(URL_BY_CODE_SQL, code)
+
+    def deactivate(self, code):
+        return self._retry_locked('deactivate', self._deactivate, code)
+
+    def _deactivate(self, code):
+        db = self.connect()
+        try:
+            cursor = db.execute(DEACTIVATE_URL_SQL, (code, code))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return cursor.rowcount > 0
+
+    def list_page(self, limit=100, cursor=None):
+        db = self.connect()
+        if cursor:
+            created_at, url_id = decode_cursor(cursor)
+            urls = db.execute(URLS_PAGE_AFTER_SQL, (created_at, url_id, limit)).fetchall()
+        else:
+            urls = db.execute(URLS_PAGE_SQL, (limit,)).fetchall()
+        db.close()
+
+        urls = [dict(url) for url in urls]
+        next_cursor = encode_cursor(urls[-1]) if len(urls) == limit else None
+        return urls, next_cursor
+
+    def iter_urls(self, batch_size=1000):
+        db = self.connect()
+        cursor = db.execute(EXPORT_URLS_SQL)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+        finally:
+            cursor.close()
+            db.close()
+
+    # ---------- clicks ----------
+
+    def record_clicks(self, events):
+        self._retry_locked('record_clicks', self._record_clicks, events)
+
+    def _record_clicks(self, events):
+        counts = Counter()
+        last_accessed = {}
+        for short_code, _, _, _, _, accessed in events:
+            counts[short_code] += 1
+            last_accessed[short_code] = accessed
+
+        db = self.connect()
+        try:
+            if self.keep_ips:
+                rows = [event[:5] for event in events]
+            else:
+                rows = [(code, clicked_at, None, agent, referrer)
+                        for code, clicked_at, _, agent, referrer, _ in events]
+            tables = click_partitions.insert_clicks(db, rows)
+            db.executemany(UPDATE_COUNTER_SQL, [(n, last_accessed[code], code)
+                                                for code, n in counts.items()])
+            rollups.apply(db, [(code, clicked_at, agent, referrer)
+                               for code, clicked_at, _, agent, referrer, _ in events])
+            if self.rollup_hours:
+                rollups.prune_hourly(db, counts, self.rollup_hours)
+            uniques.apply(db, [event[:3] for event in events])
+            # The first write to a partition this process hasn't seen
+            # (normally a new month) also applies the retention policy
+            if not self._seen_partitions.issuperset(tables):
+                self._seen_partitions.update(tables)
+                if self.retention_months:
+                    click_partitions.drop_expired(db, self.retention_months,
+                                                  datetime.now(timezone.utc))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def recent_clicks(self, short_code, limit=10):
+        db = self.connect()
+        clicks = click_partitions.recent_clicks(db, short_code, limit=limit)
+        db.close()
+        return [dict(click) for click in clicks]
+
+    def click_stats(self, short_code, days=30):
+        db = self.connect()
+        data = rollups.stats(db, short_code, days=days)
+        db.close()
+        return data
+
+    def unique_visitors(self, short_code, days=30, granularity='day'):
+        db = self.connect()
+        data = uniques.stats(db, short_code, days=days, granularity=granularity)
+        db.close()
+        return data
+
+    def prune(self, keep_months):
+        db = self.connect()
+        try:
+            dropped = click_partitions.drop_expired(db, keep_months, datetime.now(timezone.utc))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return dropped
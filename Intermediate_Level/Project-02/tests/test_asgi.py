@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+import asgi
+from db_pool import close_all_pools
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    Url.get_url_cache().clear()
+    yield
+    Url.get_click_writer().flush()
+    Url.reset_store()
+    close_all_pools()
+
+
+def call(method, path, body=b'', headers=()):
+    """Run one HTTP request through asgi.app; returns (status, headers, body)"""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+             'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+             'server': ('testserver', 80), 'client': ('10.0.0.1', 1234),
+             'headers': [(b'host', b'testserver')] + list(headers)}
+    chunks = [body[:5], body[5:]]     # exercise more_body
+    sent = []
+
+    async def receive():
+        if chunks:
+            chunk = chunks.pop(0)
+            return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    body = b''.join(m.get('body', b'') for m in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def test_shorten_json_and_form():
+    status, headers, body = call('POST', '/shorten', json.dumps({'url': 'example.com/a'}).encode(),
+                                 [(b'content-type', b'application/json')])
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert int(headers[b'content-length']) == len(body)
+    data = json.loads(body)
+    assert data['original_url'] == 'https://example.com/a'
+    assert data['short_url'] == 'http://testserver/' + data['short_code']
+
+    status, _, body = call('POST', '/shorten', b'url=https%3A%2F%2Fexample.com%2Fb&custom=mine',
+                           [(b'content-type', b'application/x-www-form-urlencoded')])
+    assert status == 200 and json.loads(body)['short_code'] == 'mine'
+
+
+@pytest.mark.parametrize('body, content_type, error', [
+    (b'[1, 2]', b'application/json', 'Invalid request body'),
+    (b'{not json', b'application/json', 'Invalid request body'),
+    (b'{"url": ""}', b'application/json', 'URL is required'),
+    (b'url=https%3A%2F%2Fexample.com&custom=no+way%21', b'application/x-www-form-urlencoded',
+     Url.INVALID_CUSTOM_CODE),
+])
+def test_shorten_rejects_bad_input(body, content_type, error):
+    status, _, response = call('POST', '/shorten', body, [(b'content-type', content_type)])
+    assert status == 400
+    assert json.loads(response) == {'error': error}
+
+
+def test_redirect_records_click_and_unknown_code_is_404():
+    code, _ = Url.shorten_url('https://example.com/ünicode')
+    status, headers, _ = call('GET', f'/{code}', headers=[(b'user-agent', b'pytest')])
+    assert status == 302
+    assert headers[b'location'] == b'https://example.com/%C3%BCnicode'
+
+    # Second hit is answered from the cache
+    assert call('GET', f'/{code}')[0] == 302
+    Url.get_click_writer().flush()
+    stats = Url.get_url_stats(code)
+    assert stats['url_data']['clicks'] == 2
+    assert {c['user_agent'] for c in stats['recent_clicks']} == {'pytest', 'Unknown'}
+
+    status, headers, body = call('GET', '/nosuchcode')
+    assert status == 404
+    assert headers[b'content-type'].startswith(b'text/html')
+    assert b'URL not found' in body
+
+
+def test_each_redirect_is_one_cache_lookup():
+    code, _ = Url.shorten_url('https://example.com/a')
+    cache = Url.get_url_cache()
+    cache.invalidate(code)
+    before = cache.stats()
+    for path in (f'/{code}', f'/{code}', '/nosuchcode', '/nosuchcode'):
+        call('GET', path)
+    after = cache.stats()
+    assert after['misses'] - before['misses'] == 2
+    assert after['hits'] - before['hits'] == 1
+    assert after['negative_hits'] - before['negative_hits'] == 1
+
+
+def test_other_routes_pass_through_to_flask():
+    if asgi.WsgiToAsgi is None:
+        pytest.skip('asgiref not installed')
+    status, _, body = call('GET', '/api/cache/stats')
+    assert status == 200
+    assert 'hits' in json.loads(body)
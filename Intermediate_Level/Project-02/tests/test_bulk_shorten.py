@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+from db_pool import close_all_pools
+
+
+@pytest.fixture
+def client(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    Url.get_url_cache().clear()
+    yield Url.app.test_client()
+    Url.get_click_writer().flush()
+    Url.reset_store()
+    close_all_pools()
+
+
+def read_results(response):
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_json_array_with_partial_failures(client):
+    items = [
+        'https://example.com/a',
+        {'url': 'example.com/b', 'custom': 'mine'},
+        {'url': ''},
+        {'url': 'https://example.com/c', 'custom': 'mine'},    # duplicate in batch
+        {'url': 'https://example.com/d', 'custom': 'no way!'},
+        42,
+    ]
+    results = read_results(client.post('/api/shorten/bulk', json=items))
+
+    assert [r['index'] for r in results] == list(range(len(items)))
+    assert [r.get('success', False) for r in results] == [True, True, False, False, False, False]
+    assert results[1]['short_code'] == 'mine'
+    assert results[1]['original_url'] == 'https://example.com/b'
+    assert results[1]['short_url'].endswith('/mine')
+    assert results[2]['error'] == 'URL is required'
+    assert results[3]['error'] == Url.CUSTOM_CODE_TAKEN
+    assert results[4]['error'] == Url.INVALID_CUSTOM_CODE
+    assert results[5]['error'] == 'Invalid item'
+
+    # Failures don't roll back the rest of the batch
+    assert Url.get_original_url(results[0]['short_code'])['original_url'] == 'https://example.com/a'
+    assert Url.get_original_url('mine')['original_url'] == 'https://example.com/b'
+
+
+def test_ndjson_with_partial_failures(client):
+    Url.shorten_url('https://example.com/taken', 'taken')
+    body = '\n'.join([
+        '"https://example.com/a"',
+        '{"url": "https://example.com/b", "custom": "taken"}',
+        '{not json',
+        '',
+        '{"url": "https://example.com/c"}',
+    ]) + '\n'
+    results = read_results(client.post('/api/shorten/bulk', data=body,
+                                       content_type='application/x-ndjson'))
+
+    assert [r['index'] for r in results] == [0, 1, 2, 3]    # blank line skipped
+    assert [r.get('success', False) for r in results] == [True, False, False, True]
+    assert results[1]['error'] == Url.CUSTOM_CODE_TAKEN
+    assert results[2]['error'] == 'Invalid item'
+    assert Url.get_original_url(results[3]['short_code'])['original_url'] == 'https://example.com/c'
+    assert Url.get_original_url('taken')['original_url'] == 'https://example.com/taken'
+
+
+def test_rejects_non_array_json(client):
+    response = client.post('/api/shorten/bulk', json={'url': 'https://example.com'})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from click_writer import BLOCK, DROP, ClickWriter
+
+
+class Sink:
+    """write_batch that records batches and can be held shut"""
+
+    def __init__(self):
+        self.batches = []
+        self.writing = threading.Event()
+        self.open = threading.Event()
+        self.open.set()
+
+    def __call__(self, events):
+        self.writing.set()
+        self.open.wait(5)
+        self.batches.append([event[0] for event in events])
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def stalled_writer(policy, max_queue=2, **kwargs):
+    """Writer whose sink is stuck on the first click, with a full queue behind it"""
+    sink = Sink()
+    sink.open.clear()
+    writer = ClickWriter(sink, flush_size=1, max_queue=max_queue, policy=policy, **kwargs)
+    assert writer.submit('first', None, None, None)
+    assert sink.writing.wait(2)
+    for i in range(max_queue):
+        assert writer.submit(f'queued{i}', None, None, None)
+    return writer, sink
+
+
+def test_drop_policy_counts_dropped_clicks_across_threads():
+    writer, sink = stalled_writer(DROP, max_queue=1)
+
+    def hammer():
+        for _ in range(500):
+            assert not writer.submit('extra', None, None, None)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert writer.dropped == 4000
+
+    sink.open.set()
+    writer.stop()
+    assert sink.batches == [['first'], ['queued0']] and writer.written == 2
+
+
+def test_block_policy_waits_for_space():
+    writer, sink = stalled_writer(BLOCK, block_timeout=0.05)
+    start = time.perf_counter()
+    assert not writer.submit('late', None, None, None)
+    assert time.perf_counter() - start >= 0.05 and writer.dropped == 1
+
+    writer.block_timeout = 2
+    threading.Timer(0.05, sink.open.set).start()
+    assert writer.submit('waited', None, None, None)
+    writer.stop()
+    assert [code for batch in sink.batches for code in batch] == \
+        ['first', 'queued0', 'queued1', 'waited']
+
+
+def test_flushes_on_size_and_on_interval():
+    sink = Sink()
+    writer = ClickWriter(sink, flush_size=3, flush_interval=10)
+    for code in 'abc':
+        writer.submit(code, None, None, None)
+    wait_for(lambda: sink.batches == [['a', 'b', 'c']])   # full batch, long before 10 s
+    writer.stop()
+
+    sink = Sink()
+    writer = ClickWriter(sink, flush_size=100, flush_interval=0.05)
+    writer.submit('x', None, None, None)
+    writer.submit('y', None, None, None)
+    wait_for(lambda: sink.batches == [['x', 'y']])        # partial batch after the interval
+    assert writer.depth() == 0
+    writer.stop()
+
+
+def test_stop_writes_everything_queued():
+    sink = Sink()
+    writer = ClickWriter(sink, flush_size=2, flush_interval=10)
+    for i in range(5):
+        writer.submit(f'c{i}', None, None, None)
+    writer.stop()
+    assert [code for batch in sink.batches for code in batch] == [f'c{i}' for i in range(5)]
+    assert writer.written == 5 and writer.depth() == 0
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite_store
+from code_filter import BloomFilter
+from db_pool import ConnectionPool
+
+
+def test_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    bloom.update(f'code{i}' for i in range(10000))
+    assert all(f'code{i}' in bloom for i in range(10000))
+    false_positives = sum(f'other{i}' in bloom for i in range(10000))
+    assert false_positives < 200   # ~1% expected
+
+
+def count_connections(store):
+    """Wrap store.connect; returns a list that grows by one per connection"""
+    calls, connect = [], store.connect
+
+    def counting_connect():
+        calls.append(1)
+        return connect()
+
+    store.connect = counting_connect
+    return calls
+
+
+def test_store_skips_database_for_definite_misses(tmp_path):
+    path = str(tmp_path / 'urls.db')
+    store = sqlite_store.SqliteUrlStore(ConnectionPool(path).get, code_filter_capacity=1000,
+                                        code_filter_catch_up=60)
+    store.init()
+    code, _ = store.create('https://example.com', 'promo')
+    assert store.resolve('promo')['original_url'] == 'https://example.com'
+
+    connections = count_connections(store)
+    misses = sqlite_store.CODE_FILTER_CHECKS.value(result='definite_miss')
+    for i in range(1000):
+        assert store.resolve(f'nope{i}') is None
+    assert sqlite_store.CODE_FILTER_CHECKS.value(result='definite_miss') == misses + 1000
+    assert connections == []     # the filter just caught up (built at init)
+
+    # A code inserted by another process is picked up by the next catch-up
+    other = sqlite3.connect(path)
+    other.execute("INSERT INTO urls (original_url, short_code) VALUES ('https://b.com', 'elsewhere')")
+    other.commit()
+    other.close()
+    store.code_filter_catch_up = 0
+    with store._catch_up_lock:      # another thread is catching up: don't wait
+        assert store.resolve('elsewhere') is None
+    assert connections == []
+    assert store.resolve('elsewhere')['original_url'] == 'https://b.com'
+
+
+def test_code_created_on_another_worker_resolves_after_catch_up(tmp_path):
+    path = str(tmp_path / 'urls.db')
+    worker_a, worker_b = (sqlite_store.SqliteUrlStore(ConnectionPool(path).get,
+                                                      code_filter_capacity=1000,
+                                                      code_filter_catch_up=0)
+                          for _ in range(2))
+    worker_a.init()
+    worker_b.init()
+    assert worker_b.resolve('launch') is None
+    code, _ = worker_a.create('https://example.com/launch', 'launch')
+    generated, _ = worker_a.create('https://example.com/other')
+    assert worker_b.resolve(code)['original_url'] == 'https://example.com/launch'
+    assert worker_b.resolve(generated)['original_url'] == 'https://example.com/other'
+
+
+def test_definite_misses_are_negative_cached_without_a_query(tmp_path):
+    import Url
+    from db_pool import close_all_pools
+
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    Url.get_url_cache().clear()
+    Url.get_store().code_filter_catch_up = 60
+    connections = count_connections(Url.get_store())
+    misses = sqlite_store.CODE_FILTER_CHECKS.value(result='definite_miss')
+    for _ in range(3):
+        assert Url.get_original_url('unknown') is None
+    assert Url.get_url_cache().get('unknown') is None     # cached "no such code"
+    assert sqlite_store.CODE_FILTER_CHECKS.value(result='definite_miss') == misses + 1
+    assert connections == []
+
+    Url.reset_store()
+    close_all_pools()
@@ -0,0 +1,59 @@
+import base64
+import json
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+from db_pool import close_all_pools
+
+
+def test_next_page_link_keeps_the_page_size(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    for i in range(5):
+        Url.shorten_url(f'https://example.com/{i}')
+    client = Url.app.test_client()
+
+    seen = []
+    path = '/dashboard?limit=2'
+    while path:
+        html = client.get(path).get_data(as_text=True)
+        seen += re.findall(r'href="/stats/([^"]+)"', html)
+        link = re.search(r'href="(/dashboard\?[^"]+)"', html)
+        path = link and link.group(1).replace('&amp;', '&')
+        if path:
+            assert path.endswith('&limit=2')
+    assert len(seen) == len(set(seen)) == 5
+
+    Url.reset_store()
+    close_all_pools()
+
+
+def cursor_for(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-base64!', cursor_for([[1], 5]), cursor_for([{}, 5]), cursor_for(['2024-01-01', '5']),
+    cursor_for(['2024-01-01', True]), cursor_for([1, 2, 3]),
+])
+def test_malformed_cursors_are_rejected(tmp_path, cursor):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    Url.shorten_url('https://example.com/a')
+    client = Url.app.test_client()
+
+    response = client.get(f'/api/urls?cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+    assert client.get(f'/dashboard?cursor={cursor}').status_code == 400
+
+    Url.reset_store()
+    close_all_pools()
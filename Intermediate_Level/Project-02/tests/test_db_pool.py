@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import ConnectionPool
+
+
+def make_pool(tmp_path, **kwargs):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), **kwargs)
+    db = pool.get()
+    db.execute('CREATE TABLE t (x INTEGER)')
+    db.commit()
+    db.close()
+    return pool
+
+
+def test_short_lived_threads_reuse_connections(tmp_path):
+    pool = make_pool(tmp_path)
+
+    def request():
+        db = pool.get()
+        db.execute('SELECT COUNT(*) FROM t').fetchone()
+        db.close()
+
+    for _ in range(200):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    assert pool.stats() == {'open': 1, 'idle': 1}
+    pool.close_all()
+
+
+def test_idle_connections_are_bounded(tmp_path):
+    pool = make_pool(tmp_path, max_idle=4)
+    connections = [pool.get() for _ in range(10)]
+    assert len(set(map(id, connections))) == 10
+    for db in connections:
+        db.close()
+        db.close()      # a second close is ignored
+    assert pool.stats() == {'open': 4, 'idle': 4}
+    pool.close_all()
+    assert pool.stats() == {'open': 0, 'idle': 0}
+
+
+def test_returned_connection_is_rolled_back(tmp_path):
+    pool = make_pool(tmp_path)
+    db = pool.get()
+    db.execute('INSERT INTO t VALUES (1)')
+    db.close()          # caller forgot to commit or roll back
+
+    db = pool.get()
+    assert not db.in_transaction
+    assert db.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    db.close()
+    pool.close_all()
+
+
+def test_connections_returned_after_close_all_are_closed(tmp_path):
+    pool = make_pool(tmp_path)
+    db = pool.get()
+    pool.close_all()
+    db.close()
+    assert pool.stats() == {'open': 0, 'idle': 0}
+    fresh = pool.get()
+    assert fresh is not db
+    fresh.execute('SELECT 1')
+    fresh.close()
+    pool.close_all()
@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+import metrics
+import sqlite_store
+from db_pool import ConnectionPool, DEFAULT_PRAGMAS, close_all_pools
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = metrics.Histogram('demo_seconds', 'Demo', ['op'], buckets=(0.1, 1.0),
+                                  registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, op='read')
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{op="read",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{op="read",le="1.0"} 3' in text
+    assert 'demo_seconds_bucket{op="read",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{op="read"} 4' in text
+
+
+def test_metrics_endpoint_after_redirect(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.init_db()
+    client = Url.app.test_client()
+    code = client.post('/shorten', json={'url': 'https://example.com'}).get_json()['short_code']
+    assert client.get(f'/{code}').status_code == 302
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'urlshortener_redirect_stage_seconds_count{stage="lookup"}' in text
+    assert 'urlshortener_request_seconds_count{endpoint="redirect_to_url"}' in text
+    assert 'urlshortener_store_seconds_count{operation="create"}' in text
+    assert 'urlshortener_click_queue_depth' in text
+    assert 'urlshortener_cache_hit_ratio' in text
+
+    Url.get_click_writer().flush()
+    Url.reset_store()
+    close_all_pools()
+
+
+def test_locked_writes_are_retried_and_counted(tmp_path):
+    path = str(tmp_path / 'locked.db')
+    pragmas = [(name, 0 if name == 'busy_timeout' else value) for name, value in DEFAULT_PRAGMAS]
+    store = sqlite_store.SqliteUrlStore(ConnectionPool(path, pragmas=pragmas).get,
+                                        lock_retries=2, lock_retry_delay=0.001)
+    store.init()
+    code, _ = store.create('https://example.com')
+
+    blocker = sqlite3.connect(path)
+    blocker.execute('BEGIN IMMEDIATE')
+    busy = sqlite_store.SQLITE_BUSY.value(operation='deactivate')
+    retries = sqlite_store.SQLITE_LOCK_RETRIES.value(operation='deactivate')
+    with pytest.raises(sqlite3.OperationalError):
+        store.deactivate(code)
+    assert sqlite_store.SQLITE_BUSY.value(operation='deactivate') == busy + 3
+    assert sqlite_store.SQLITE_LOCK_RETRIES.value(operation='deactivate') == retries + 2
+
+    blocker.rollback()
+    assert store.deactivate(code)
+    blocker.close()
@@ -0,0 +1,71 @@
+import gzip
+import os
+import sys
+
+import pytest
+from flask import Flask, request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pages
+from pages import PrecompressedPage
+
+BODY = '<html><body>' + 'hello ' * 200 + '</body></html>'
+
+
+def make_client(monkeypatch, with_brotli=False):
+    if not with_brotli:
+        monkeypatch.setattr(pages, 'brotli', None)
+    page = PrecompressedPage(BODY)
+    app = Flask(__name__)
+    app.add_url_rule('/', 'page', lambda: page.response(request))
+    return page, app.test_client()
+
+
+def test_gzip_is_sent_only_when_accepted(monkeypatch):
+    page, client = make_client(monkeypatch)
+
+    plain = client.get('/')
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.get_data(as_text=True) == BODY
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    assert plain.headers['Content-Type'].startswith('text/html')
+
+    compressed = client.get('/', headers={'Accept-Encoding': 'br;q=1, gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()).decode() == BODY
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+
+    refused = client.get('/', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in refused.headers
+
+
+def test_matching_etag_gets_304(monkeypatch):
+    page, client = make_client(monkeypatch)
+    first = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    etag = first.headers['ETag']
+    assert 'max-age=300' in first.headers['Cache-Control']
+
+    again = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == etag
+    assert again.headers['Vary'] == 'Accept-Encoding'
+
+    # A copy cached under another encoding is still the same page
+    other = client.get('/', headers={'If-None-Match': etag})
+    assert other.status_code == 304
+
+    stale = client.get('/', headers={'If-None-Match': '"something-else"'})
+    assert stale.status_code == 200
+
+
+def test_brotli_preferred_when_available(monkeypatch):
+    if pages.brotli is None:
+        pytest.skip('brotli not installed')
+    page, client = make_client(monkeypatch, with_brotli=True)
+    response = client.get('/', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert pages.brotli.decompress(response.get_data()).decode() == BODY
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+import rollups
+import click_partitions
+import sqlite_store
+from db_pool import close_all_pools
+
+
+@pytest.fixture
+def db(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.init_db()
+    yield Url.get_db()
+    Url.reset_store()
+    close_all_pools()
+
+
+def plan(db, sql, params):
+    return [row['detail'] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def assert_indexed(details):
+    for detail in details:
+        assert 'TEMP B-TREE' not in detail, details
+        if detail.startswith('SCAN'):
+            assert 'USING' in detail and 'INDEX' in detail, details
+
+
+@pytest.mark.parametrize('sql', ['URL_BY_CODE_SQL', 'ACTIVE_URL_BY_CODE_SQL',
+                                 'DEACTIVATE_URL_SQL'])
+def test_code_lookups_use_indexes(db, sql):
+    details = plan(db, getattr(sqlite_store, sql), ('abc123', 'abc123'))
+    assert_indexed(details)
+    assert any('sqlite_autoindex_urls' in d for d in details), details
+    assert any('idx_urls_custom_code' in d for d in details), details
+
+
+def test_recent_clicks_use_partition_index(db):
+    click_partitions.ensure_partition(db, 'clicks_202401')
+    sql = click_partitions.RECENT_CLICKS_SQL.format(table='clicks_202401')
+    details = plan(db, sql, ('abc123', 10))
+    assert_indexed(details)
+    assert any('idx_clicks_202401_short_code' in d for d in details), details
+
+
+def test_dashboard_pages_use_index(db):
+    details = plan(db, sqlite_store.URLS_PAGE_SQL, (100,))
+    assert_indexed(details)
+    assert any('idx_urls_created_at' in d for d in details), details
+
+    details = plan(db, sqlite_store.URLS_PAGE_AFTER_SQL, ('2024-01-01 00:00:00', 42, 100))
+    assert_indexed(details)
+    assert any('idx_urls_created_at (created_at<' in d for d in details), details
+
+
+def test_migrations_recorded(db):
+    assert db.execute('PRAGMA user_version').fetchone()[0] == len(sqlite_store.MIGRATIONS)
+
+
+@pytest.mark.parametrize('sql, params', [
+    (rollups.SERIES_SQL, ('abc123', 'day', '2024-01-01')),
+    (rollups.TOP_VALUES_SQL, ('abc123', 'referrer', '2024-01-01', 10)),
+    (rollups.PRUNE_HOURLY_SQL, ('abc123', '2024-01-01 00:00')),
+])
+def test_rollup_reads_use_primary_key(db, sql, params):
+    details = plan(db, sql, params)
+    assert all(d.startswith('SEARCH click_rollups USING PRIMARY KEY') or 'TEMP B-TREE' in d
+               for d in details), details
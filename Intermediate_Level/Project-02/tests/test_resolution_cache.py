@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Url
+from db_pool import close_all_pools
+from resolution_cache import MISS, ResolutionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResolutionCache(max_size=2)
+    cache.put('a', {'id': 1})
+    cache.put('b', {'id': 2})
+    assert cache.get('a') == {'id': 1}     # 'b' is now the oldest
+    cache.put('c', {'id': 3})
+    assert cache.get('b') is MISS
+    assert cache.get('a') == {'id': 1} and cache.get('c') == {'id': 3}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_and_negative_entries_expire_sooner():
+    clock = Clock()
+    cache = ResolutionCache(ttl=300, negative_ttl=30, clock=clock)
+    cache.put('known', {'id': 1})
+    cache.put('unknown', None)
+    assert cache.get('unknown') is None     # a cached "no such code"
+
+    clock.now = 31
+    assert cache.get('unknown') is MISS
+    assert cache.get('known') == {'id': 1}
+    clock.now = 301
+    assert cache.get('known') is MISS
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['negative_hits'], stats['misses'], stats['expirations']) == \
+        (1, 1, 2, 2)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResolutionCache(max_size=0)
+    cache.put('a', {'id': 1})
+    assert cache.get('a') is MISS
+
+
+def test_deactivate_invalidates_the_cached_resolution(tmp_path):
+    Url.app.config['DATABASE'] = str(tmp_path / 'urls.db')
+    Url.reset_store()
+    Url.init_db()
+    Url.get_url_cache().clear()
+    code, _ = Url.shorten_url('https://example.com/a')
+    assert Url.get_original_url(code)['original_url'] == 'https://example.com/a'
+    assert Url.get_url_cache().get(code) is not MISS
+
+    assert Url.deactivate_url(code)
+    assert Url.get_url_cache().get(code) is MISS
+    assert Url.get_original_url(code) is None
+
+    Url.reset_store()
+    close_all_pools()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from short_codes import CodeAllocator, FeistelPermutation, base62_decode, base62_encode
+
+
+def test_base62_round_trip():
+    for number in (0, 1, 61, 62, 3843, 10 ** 12):
+        assert base62_decode(base62_encode(number)) == number
+    assert len(base62_encode(5, 6)) == 6
+
+
+def test_permutation_is_bijective():
+    permutation = FeistelPermutation(b'key', 2)
+    outputs = {permutation.permute(n) for n in range(62 ** 2)}
+    assert outputs == set(range(62 ** 2))
+    assert permutation.invert(permutation.permute(1234)) == 1234
+
+
+def test_codes_are_unique_across_lengths():
+    allocator = CodeAllocator(connect=None, min_length=2, key='key')
+    codes = [allocator.encode(n) for n in range(62 ** 3)]
+    assert len(set(codes)) == len(codes)
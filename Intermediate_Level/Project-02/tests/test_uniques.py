@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uniques import HyperLogLog
+
+
+def test_estimate_within_error_and_merge_is_union():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(20000):
+        first.add(f'10.0.{i // 256}.{i % 256}')
+    for i in range(10000, 30000):
+        second.add(f'10.0.{i // 256}.{i % 256}')
+
+    assert abs(first.count() - 20000) < 20000 * 0.05
+    union = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+    assert abs(union.count() - 30000) < 30000 * 0.05
+
+
+def test_small_sketches_are_compact():
+    sketch = HyperLogLog()
+    for i in range(10):
+        sketch.add(f'192.168.0.{i}')
+    assert sketch.count() == 10
+    assert len(sketch.to_bytes()) < 100
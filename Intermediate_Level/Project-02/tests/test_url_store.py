@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory_store
+from db_pool import ConnectionPool
+from memory_store import MemoryUrlStore
+from sqlite_store import SqliteUrlStore
+from url_store import CUSTOM_CODE_TAKEN
+
+
+def make_sqlite(tmp_path):
+    return SqliteUrlStore(ConnectionPool(str(tmp_path / 'urls.db')).get)
+
+
+def make_memory(tmp_path):
+    return MemoryUrlStore(log_path=str(tmp_path / 'urls.log'))
+
+
+@pytest.fixture(params=[make_sqlite, make_memory], ids=['sqlite', 'memory'])
+def store(request, tmp_path):
+    store = request.param(tmp_path)
+    store.init()
+    yield store
+    store.close()
+
+
+def click(code, referrer=None, agent='Mozilla/5.0 Firefox/120.0'):
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return (code, now, '127.0.0.1', agent, referrer, now)
+
+
+def test_create_and_resolve(store):
+    code, error = store.create('https://example.com/a')
+    assert error is None and len(code) == 6
+    assert store.resolve(code)['original_url'] == 'https://example.com/a'
+    assert store.resolve('nope') is None
+
+
+def test_custom_codes_conflict(store):
+    assert store.create('https://example.com/a', 'promo') == ('promo', None)
+    assert store.create('https://example.com/b', 'promo') == (None, CUSTOM_CODE_TAKEN)
+    results = store.create_many([('https://example.com/c', 'dup'),
+                                 ('https://example.com/d', 'dup'),
+                                 ('https://example.com/e', None)])
+    assert results[0] == ('dup', None)
+    assert results[1] == (None, CUSTOM_CODE_TAKEN)
+    assert results[2][0] not in ('dup', 'promo', None)
+
+
+def test_deactivate(store):
+    code, _ = store.create('https://example.com/a')
+    assert store.deactivate(code)
+    assert store.resolve(code) is None
+    assert store.get(code)['is_active'] == 0
+    assert not store.deactivate('nope')
+
+
+def test_clicks_update_counters_and_stats(store):
+    code, _ = store.create('https://example.com/a')
+    store.record_clicks([click(code, 'https://www.google.com/x'),
+                         click(code, 'https://www.google.com/y'),
+                         click(code)])
+    assert store.get(code)['clicks'] == 3
+    recent = store.recent_clicks(code, limit=2)
+    assert len(recent) == 2 and recent[0]['short_code'] == code
+
+    stats = store.click_stats(code)
+    assert sum(day['clicks'] for day in stats['daily']) == 3
+    assert stats['top_referrers'][0] == {'value': 'google.com', 'clicks': 2}
+    assert stats['top_agents'] == [{'value': 'Firefox', 'clicks': 3}]
+
+
+def test_old_hourly_rollups_are_pruned(store):
+    code, _ = store.create('https://example.com/a')
+    earlier = (datetime.now(timezone.utc) - timedelta(hours=10)).strftime('%Y-%m-%d %H:%M:%S')
+    store.record_clicks([(code, earlier, '127.0.0.1', 'curl/8.0', None, earlier)])
+    assert sum(hour['clicks'] for hour in store.click_stats(code)['hourly']) == 1
+
+    store.rollup_hours = 2
+    store.record_clicks([click(code)])     # the next batch for this code prunes
+    stats = store.click_stats(code)
+    assert sum(hour['clicks'] for hour in stats['hourly']) == 1
+    assert stats['hourly'][0]['hour'] == click(code)[1][:13] + ':00'
+    assert sum(day['clicks'] for day in stats['daily']) == 2   # days keep every click
+
+
+def test_pages_and_export(store):
+    codes = [code for code, _ in store.create_many(
+        [(f'https://example.com/{i}', None) for i in range(25)])]
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.list_page(limit=10, cursor=cursor)
+        seen.extend(url['short_code'] for url in page)
+        if not cursor:
+            break
+    assert seen == codes[::-1]
+    assert [url['short_code'] for url in store.iter_urls(batch_size=7)] == codes
+
+
+def test_memory_log_replay(tmp_path):
+    store = make_memory(tmp_path)
+    store.init()
+    code, _ = store.create('https://example.com/a')
+    store.create('https://example.com/b', 'gone')
+    store.deactivate('gone')
+    store.record_clicks([click(code)])
+    store.close()
+
+    reopened = make_memory(tmp_path)
+    reopened.init()
+    assert reopened.resolve(code)['clicks'] == 1
+    assert reopened.resolve('gone') is None
+    new_code, _ = reopened.create('https://example.com/c')
+    assert new_code != code
+    reopened.close()
+
+
+def test_memory_log_torn_line_is_truncated(tmp_path):
+    store = make_memory(tmp_path)
+    store.init()
+    first, _ = store.create('https://example.com/a')
+    store.close()
+    with open(tmp_path / 'urls.log', 'a', encoding='utf-8') as log:
+        log.write('{"op": "create", "seq": 99')   # crash mid-write
+
+    store = make_memory(tmp_path)
+    store.init()
+    second, _ = store.create('https://example.com/b')
+    third, _ = store.create('https://example.com/c')
+    store.close()
+
+    reopened = make_memory(tmp_path)
+    reopened.init()
+    assert [reopened.resolve(code)['original_url'] for code in (first, second, third)] == \
+        ['https://example.com/a', 'https://example.com/b', 'https://example.com/c']
+    fourth, _ = reopened.create('https://example.com/d')
+    assert fourth not in (first, second, third)
+    reopened.close()
+
+
+@pytest.mark.skipif(memory_store.fcntl is None, reason='log locking needs fcntl')
+def test_memory_log_allows_one_writer(tmp_path):
+    store = make_memory(tmp_path)
+    store.init()
+    code, _ = store.create('https://example.com/a')
+
+    second = make_memory(tmp_path)
+    with pytest.raises(RuntimeError, match='single process'):
+        second.init()
+    store.close()
+
+    second.init()
+    assert second.resolve(code)['original_url'] == 'https://example.com/a'
+    assert second.create('https://example.com/b')[0] != code
+    second.close()
+
+
+def test_unique_visitors(store):
+    code, _ = store.create('https://example.com/a')
+    events = [click(code) for _ in range(3)]
+    events = [(c, at, f'10.0.0.{i % 50}', agent, ref, acc)
+              for i, (c, at, _, agent, ref, acc) in enumerate(events * 100)]
+    store.record_clicks(events)
+
+    daily = store.unique_visitors(code, days=7)
+    assert daily['series'][-1]['uniques'] == daily['uniques']
+    assert abs(daily['uniques'] - 50) <= 2
+    weekly = store.unique_visitors(code, days=7, granularity='week')
+    assert weekly['uniques'] == daily['uniques']
+
+
+def test_sqlite_bulk_conflict_reallocates_outside_transaction(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'urls.db'))
+    store = SqliteUrlStore(pool.get, code_block=4, code_key=None)
+    store.init()
+    # Custom codes already hold two of the next generated values, and the
+    # replacements need a fresh ID block from the sequence
+    upcoming = [store.allocator.encode(n) for n in range(8)]
+    store.create_many([('https://example.com/x', upcoming[1]),
+                       ('https://example.com/y', upcoming[3])])
+
+    start = time.perf_counter()
+    results = store.create_many([(f'https://example.com/{i}', None) for i in range(4)])
+    assert time.perf_counter() - start < 1      # no wait on our own write lock
+    codes = [code for code, error in results]
+    assert None not in codes and len(set(codes)) == 4
+    assert not {upcoming[1], upcoming[3]} & set(codes)
+    assert all(store.resolve(code) for code in codes)
+    store.close()
+    pool.close_all()
@@ -0,0 +1,104 @@
+"""
+Storage interface for the URL shortener
+
+Url.py talks to a UrlStore instead of issuing SQL itself. Two engines
+implement it:
+
+- SqliteUrlStore (sqlite_store.py): the SQLite database, as before
+- MemoryUrlStore (memory_store.py): plain dicts, with an optional
+  append-only log for persistence, for replicas that serve redirects from
+  memory
+
+URL records are dicts with the columns of the urls table: id, original_url,
+short_code, custom_code, created_at, clicks, last_accessed, user_ip and
+is_active. Click events are the tuples produced by ClickWriter:
+(short_code, clicked_at, user_ip, user_agent, referrer, accessed_at).
+"""
+
+import base64
+import json
+
+CUSTOM_CODE_TAKEN = "Custom code already in use"
+CODE_GENERATION_FAILED = "Failed to generate unique code"
+
+
+class UrlStore:
+    """Interface every storage engine implements"""
+
+    def init(self):
+        """Create or upgrade whatever the engine needs before first use"""
+
+    def create(self, original_url, custom_code=None, user_ip=None):
+        """Store one URL; returns (short_code, None) or (None, error)"""
+        return self.create_many([(original_url, custom_code)], user_ip)[0]
+
+    def create_many(self, rows, user_ip=None):
+        """Store (original_url, custom_code) rows as one unit of work
+
+        custom_code may be None to get a generated code. Returns one
+        (short_code, error) pair per row, in order.
+        """
+        raise NotImplementedError
+
+    def resolve(self, code):
+        """Active URL record for a short or custom code, or None"""
+        raise NotImplementedError
+
+    def get(self, code):
+        """URL record for a short or custom code, active or not, or None"""
+        raise NotImplementedError
+
+    def deactivate(self, code):
+        """Stop a code from resolving; returns False if it doesn't exist"""
+        raise NotImplementedError
+
+    def record_clicks(self, events):
+        """Store a batch of click events and bump the URLs' click counters"""
+        raise NotImplementedError
+
+    def recent_clicks(self, short_code, limit=10):
+        """Newest clicks for a short code as dicts (clicked_at, user_ip, ...)"""
+        raise NotImplementedError
+
+    def click_stats(self, short_code, days=30):
+        """Daily/hourly click series and top referrers/agents (see rollups.py)"""
+        raise NotImplementedError
+
+    def unique_visitors(self, short_code, days=30, granularity='day'):
+        """Approximate unique visitors per day or week (see uniques.py)"""
+        raise NotImplementedError
+
+    def list_page(self, limit=100, cursor=None):
+        """One page of URLs, newest first, and the cursor for the next page"""
+        raise NotImplementedError
+
+    def iter_urls(self, batch_size=1000):
+        """Every URL record, oldest first, without loading them all at once"""
+        raise NotImplementedError
+
+    def prune(self, keep_months):
+        """Apply click retention; returns the names of what was dropped"""
+        return []
+
+    def close(self):
+        """Release resources (files, connections)"""
+
+
+# ==================== PAGE CURSORS ====================
+
+def encode_cursor(url):
+    """Opaque page cursor for the position just after `url`"""
+    raw = json.dumps([url['created_at'], url['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, url_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(url_id, int) or isinstance(url_id, bool):
+        raise ValueError("Invalid cursor")
+    return created_at, url_id
@@ -0,0 +1,226 @@
+"""
+Convert a whole directory (or glob) of Markdown files to HTML in parallel
+
+Files are spread over a process pool, so a full rebuild uses every core.
+A manifest records each source's mtime, size and SHA-256. On the next run,
+files whose mtime and size are unchanged are skipped without being read.
+Files that were only touched are hashed and skipped if their content is
+unchanged. Outputs whose source has been deleted are removed. A file that
+fails to convert is reported and retried next run; the rest still build.
+Every output (and the manifest) is written to a temporary file and renamed
+into place, so readers never see a half-written page.
+
+Usage:
+python batch_convert.py docs/ [--out site/] [--pattern '**/*.md'] [--workers 8] [--force]
+python batch_convert.py docs/ --extensions tables,fenced_code
+python batch_convert.py 'notes/*.md'
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import markdown_rules
+import markdown_to_html
+from markdown_to_html import MarkdownToHTML
+
+MANIFEST_NAME = ".md_manifest.json"
+
+
+def renderer_version(extensions=()):
+    """Hash of the converter source and extensions: a change invalidates every output"""
+    digest = hashlib.sha256(",".join(extensions).encode())
+    for module in (markdown_to_html, markdown_rules):
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def write_atomic(path, data):
+    """Write bytes to `path` via a temporary file in the same directory"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".html")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def convert_file(job):
+    """Worker: (source, relative, output, known hash, extensions)
+    -> (relative, sha256, bytes, converted, error)"""
+    source, relative, output, known_hash, extensions = job
+    try:
+        with open(source, "rb") as file:
+            data = file.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == known_hash and os.path.exists(output):
+            return relative, digest, len(data), False, None
+
+        # Universal newlines, like the text-mode read in MarkdownToHTML.read_markdown
+        markdown = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        html = MarkdownToHTML(extensions=extensions).render(markdown)
+        write_atomic(output, html.encode("utf-8"))
+    except Exception as e:
+        # One bad file must not abort the whole build
+        return relative, None, 0, False, f"{type(e).__name__}: {e}"
+    return relative, digest, len(data), True, None
+
+
+def find_sources(target, pattern):
+    """(base directory, sorted [(source path, path relative to base)])"""
+    if os.path.isdir(target):
+        base = target
+        sources = glob.glob(os.path.join(target, pattern), recursive=True)
+    else:
+        base = os.path.dirname(target.split("*", 1)[0]) or "."
+        sources = glob.glob(target, recursive=True)
+
+    # glob results start with the base as written; slicing is much cheaper
+    # than os.path.relpath over tens of thousands of files
+    prefix = os.path.join(base, "")
+    return base, sorted(
+        (source, source[len(prefix):] if source.startswith(prefix)
+         else os.path.relpath(source, base))
+        for source in sources
+    )
+
+
+def output_path(relative, base, out_dir):
+    return os.path.join(out_dir or base, os.path.splitext(relative)[0] + ".html")
+
+
+def load_manifest(path):
+    """(renderer version, files) from the last run, or (None, {})"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None, {}
+    return manifest.get("renderer"), manifest.get("files", {})
+
+
+def remove_stale_outputs(stale, base, out_dir):
+    """Delete the pages of sources that no longer exist; returns how many"""
+    removed = 0
+    for relative in stale:
+        try:
+            os.unlink(output_path(relative, base, out_dir))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def build(target, out_dir=None, pattern="**/*.md", workers=None, force=False, extensions=()):
+    """Convert changed sources; returns a dict of counts and timings"""
+    start = time.perf_counter()
+    extensions = tuple(extensions)
+    version = renderer_version(extensions)
+    base, sources = find_sources(target, pattern)
+    manifest_path = os.path.join(out_dir or base, MANIFEST_NAME)
+    built_with, built = load_manifest(manifest_path)
+    previous = built if built_with == version and not force else {}
+
+    files, jobs, failed = {}, [], []
+    for source, relative in sources:
+        try:
+            info = os.stat(source)
+        except OSError as e:
+            failed.append((relative, f"{type(e).__name__}: {e}"))
+            continue
+        if not stat.S_ISREG(info.st_mode):
+            continue
+        entry = previous.get(relative)
+        output = output_path(relative, base, out_dir)
+        if (entry and entry["mtime_ns"] == info.st_mtime_ns and entry["size"] == info.st_size
+                and os.path.exists(output)):
+            files[relative] = entry
+            continue
+        files[relative] = {"mtime_ns": info.st_mtime_ns, "size": info.st_size,
+                           "sha256": entry["sha256"] if entry else None}
+        jobs.append((source, relative, output, files[relative]["sha256"], extensions))
+
+    stat_failures = len(failed)
+    converted = bytes_in = 0
+    if jobs:
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+        if workers == 1:
+            results = list(map(convert_file, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(convert_file, jobs, chunksize=chunksize))
+        for relative, digest, size, changed, error in results:
+            if error:
+                # An entry that never matches, so the next run tries it again
+                files[relative] = {"mtime_ns": None, "size": None, "sha256": None}
+                failed.append((relative, error))
+                continue
+            files[relative]["sha256"] = digest
+            if changed:
+                bytes_in += size
+                converted += 1
+
+    # Pages listed in any earlier manifest (even an outdated one) but whose
+    # source is gone; a source that merely failed keeps its last good page
+    current = {relative for _, relative in sources}
+    removed = remove_stale_outputs(sorted(set(built) - current), base, out_dir)
+
+    if jobs or removed or set(files) != set(previous):
+        manifest = {"renderer": version, "files": files}
+        write_atomic(manifest_path, json.dumps(manifest, separators=(",", ":")).encode())
+
+    return {
+        "sources": len(files) + stat_failures,
+        "converted": converted,
+        "unchanged": len(files) + stat_failures - converted - len(failed),
+        "failed": sorted(failed),
+        "removed": removed,
+        "hashed": len(jobs),
+        "bytes": bytes_in,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch Markdown to HTML converter")
+    parser.add_argument("target", help="directory of Markdown files, or a glob")
+    parser.add_argument("--out", help="output directory (default: next to the sources)")
+    parser.add_argument("--pattern", default="**/*.md", help="glob used inside a directory")
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest")
+    parser.add_argument("--extensions", default="",
+                        help=f"comma-separated: {', '.join(markdown_rules.EXTENSIONS)}")
+    args = parser.parse_args()
+
+    extensions = [name for name in args.extensions.split(",") if name]
+    unknown = [name for name in extensions if name not in markdown_rules.EXTENSIONS]
+    if unknown:
+        parser.error(f"unknown extension: {', '.join(unknown)}")
+    report = build(args.target, args.out, args.pattern, args.workers, args.force, extensions)
+    seconds = report["seconds"]
+    print(f"{report['sources']} files: {report['converted']} converted, "
+          f"{report['unchanged']} unchanged, {len(report['failed'])} failed, "
+          f"{report['removed']} removed in {seconds:.2f}s")
+    if report["converted"]:
+        print(f"Throughput: {report['converted'] / seconds:.0f} files/s, "
+              f"{report['bytes'] / seconds / 1024 / 1024:.1f} MB/s")
+    for relative, error in report["failed"]:
+        print(f"✗ {relative}: {error}")
+    if report["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
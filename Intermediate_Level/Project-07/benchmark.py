@@ -0,0 +1,260 @@
+"""
+Benchmarks for the Markdown converter on generated documents
+
+Usage:
+python benchmark.py engine [--sizes 1,10,100] [--repeat 1]
+python benchmark.py stream [--sizes 1,10,100]
+python benchmark.py site [--files 40000] [--workers N]
+python benchmark.py preview [--sizes 1] [--edits 2000]
+python benchmark.py rules [--sizes 1]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import batch_convert
+from markdown_rules import EXTENSIONS
+from markdown_to_html import MarkdownToHTML
+from render_cache import IncrementalRenderer
+
+WORDS = ("markdown html python parser block inline token stream render cache "
+         "heading list link code bold italic document output buffer line").split()
+
+
+def words(n):
+    return " ".join(random.choice(WORDS) for _ in range(n))
+
+
+def sentence():
+    """A line of text with a mix of inline markup"""
+    parts = [words(random.randint(3, 8))]
+    for _ in range(random.randint(0, 3)):
+        kind = random.randrange(4)
+        if kind == 0:
+            parts.append(f"**{words(2)}**")
+        elif kind == 1:
+            parts.append(f"*{words(2)}*")
+        elif kind == 2:
+            parts.append(f"`{random.choice(WORDS)}()`")
+        else:
+            parts.append(f"[{words(2)}](https://example.com/{random.choice(WORDS)})")
+        parts.append(words(random.randint(2, 6)))
+    return " ".join(parts) + "."
+
+
+def make_document(size):
+    """About `size` bytes of Markdown made of headings, paragraphs and lists"""
+    lines, total = [], 0
+    while total < size:
+        kind = random.randrange(10)
+        if kind == 0:
+            block = [f"{'#' * random.randint(1, 6)} {words(random.randint(2, 5))}"]
+        elif kind < 3:
+            block = [f"- {sentence()}" for _ in range(random.randint(2, 6))]
+        else:
+            block = [sentence() for _ in range(random.randint(1, 4))]
+        block.append("")
+        lines.extend(block)
+        total += sum(len(line) + 1 for line in block)
+    return "\n".join(lines)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_engine(args):
+    """Seven-pass regex pipeline vs the single-pass engine"""
+    converter = MarkdownToHTML()
+    for size_mb in args.sizes:
+        document = make_document(size_mb * 1024 * 1024)
+        best = {}
+        for label, render in (('multipass', converter.render_multipass),
+                              ('single-pass', converter.render)):
+            runs = [timed(render, document) for _ in range(args.repeat)]
+            best[label] = min(elapsed for elapsed, _ in runs)
+            best[label + ' html'] = runs[0][1]
+        assert best['multipass html'] == best['single-pass html']
+        print(f"{size_mb:>4} MB: multipass {best['multipass']:.2f}s "
+              f"({size_mb / best['multipass']:.1f} MB/s), "
+              f"single-pass {best['single-pass']:.2f}s "
+              f"({size_mb / best['single-pass']:.1f} MB/s), "
+              f"{best['multipass'] / best['single-pass']:.1f}x")
+
+
+def traced(func):
+    """(seconds, peak traced bytes) for one call"""
+    tracemalloc.start()
+    elapsed, _ = timed(func)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_stream(args):
+    """Peak memory of file conversion: batch convert() vs convert_stream()"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'input.md')
+        for size_mb in args.sizes:
+            with open(source, 'w', encoding='utf-8') as file:
+                file.write(make_document(size_mb * 1024 * 1024))
+            batch = MarkdownToHTML(source, os.path.join(tmp, 'batch.html'))
+            stream = MarkdownToHTML(source, os.path.join(tmp, 'stream.html'))
+
+            def convert_batch():
+                batch.write_html(batch.render(batch.read_markdown()))
+
+            results = {'batch': traced(convert_batch), 'stream': traced(stream.convert_stream)}
+            with open(batch.output_file, encoding='utf-8') as a, \
+                    open(stream.output_file, encoding='utf-8') as b:
+                assert a.read() == b.read()
+            print(f"{size_mb:>4} MB: " + ", ".join(
+                f"{label} {elapsed:.2f}s peak {peak / 1024 / 1024:.2f} MB"
+                for label, (elapsed, peak) in results.items()))
+
+
+def bench_site(args):
+    """Full, no-op and touched-file rebuilds of a generated docs tree"""
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, 'docs')
+        for i in range(args.files):
+            path = os.path.join(docs, f'section{i % 100}', f'page{i}.md')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(make_document(random.randint(500, 4000)))
+        site = os.path.join(tmp, 'site')
+
+        def run(label, **options):
+            report = batch_convert.build(docs, site, workers=args.workers, **options)
+            print(f"{label:>8}: {report['converted']:>6} converted, "
+                  f"{report['hashed']:>6} hashed in {report['seconds']:.2f}s "
+                  f"({report['sources'] / report['seconds']:.0f} files/s)")
+
+        run('full')
+        run('no-op')
+        for i in range(0, args.files, 10):
+            os.utime(os.path.join(docs, f'section{i % 100}', f'page{i}.md'))
+        run('touched')
+        run('forced', force=True)
+
+
+def bench_preview(args):
+    """Keystroke latency: full re-render vs IncrementalRenderer.edit()"""
+    converter = MarkdownToHTML()
+    for size_mb in args.sizes:
+        document = make_document(size_mb * 1024 * 1024)
+        full, _ = timed(converter.render, document)
+        setup, renderer = timed(IncrementalRenderer, document)
+
+        latencies = []
+        cursor = len(document) // 2
+        for i in range(args.edits):
+            typed = ' ' if i % 7 == 0 else random.choice('abcdefghij')
+            elapsed, _ = timed(renderer.edit, cursor, cursor, typed)
+            latencies.append(elapsed)
+            cursor += 1
+        latencies.sort()
+        page, _ = timed(lambda: renderer.html)
+        print(f"{size_mb:>4} MB ({len(renderer.blocks)} blocks): full render {full * 1000:.0f} ms, "
+              f"first incremental render {setup * 1000:.0f} ms")
+        print(f"      edit p50 {latencies[len(latencies) // 2] * 1e6:.0f} us  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us, "
+              f"joining the whole page {page * 1000:.1f} ms")
+
+
+RULE_SAMPLES = {
+    'strong': lambda: f"**{words(2)}**",
+    'em': lambda: f"*{words(2)}*",
+    'code': lambda: f"`{random.choice(WORDS)}(x < y)`",
+    'link': lambda: f"[{words(2)}](https://example.com/{random.choice(WORDS)})",
+    'del': lambda: f"~~{words(2)}~~",
+    'image': lambda: f"![{words(2)}](img/{random.choice(WORDS)}.png)",
+}
+
+
+def table_block():
+    rows = ["| name | size | note |", "|:-----|-----:|:----:|"]
+    rows += [f"| {random.choice(WORDS)} | {random.randint(1, 999)} | {words(3)} |"
+             for _ in range(random.randint(3, 12))]
+    return rows
+
+
+def fenced_block():
+    body = [f"    {words(4)} = {random.choice(WORDS)}(x < y)" for _ in range(random.randint(3, 12))]
+    return ["```python"] + body + ["```"]
+
+
+def block_document(size, make_block):
+    lines, total = [], 0
+    while total < size:
+        block = make_block() + [""]
+        lines.extend(block)
+        total += sum(len(line) + 1 for line in block)
+    return "\n".join(lines)
+
+
+def best_of(repeat, func, *args):
+    return min(timed(func, *args)[0] for _ in range(repeat))
+
+
+def bench_rules(args):
+    """Per-rule inline cost, the combined scan over plain text, and block rules"""
+    core = MarkdownToHTML()
+    full = MarkdownToHTML(extensions=list(EXTENSIONS))
+    count = 20000
+
+    print("inline rules (one match per line, all extensions enabled):")
+    for name, sample in RULE_SAMPLES.items():
+        lines = [f"{words(4)} {sample()} {words(4)}" for _ in range(count)]
+        size_mb = sum(map(len, lines)) / 1024 / 1024
+        elapsed = best_of(3, lambda: [full.render_inline(line) for line in lines])
+        print(f"  {name:>7}: {elapsed / count * 1e6:.1f} us/line ({size_mb / elapsed:.1f} MB/s)")
+
+    # Adding rules must not add passes: text with no markup costs the same
+    for size_mb in args.sizes:
+        plain = block_document(size_mb * 1024 * 1024, lambda: [words(12) for _ in range(4)])
+        print(f"{size_mb:>4} MB plain text: " + ", ".join(
+            f"{label} {best_of(3, converter.render, plain):.2f}s"
+            for label, converter in (('core rules', core), ('all extensions', full))))
+        mixed = make_document(size_mb * 1024 * 1024)
+        print(f"{size_mb:>4} MB mixed markup: " + ", ".join(
+            f"{label} {best_of(3, converter.render, mixed):.2f}s"
+            for label, converter in (('core rules', core), ('all extensions', full))))
+        for label, make_block in (('tables', table_block), ('fenced code', fenced_block)):
+            document = block_document(size_mb * 1024 * 1024, make_block)
+            elapsed = best_of(3, full.render, document)
+            print(f"{size_mb:>4} MB {label}: {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s)")
+
+
+BENCHMARKS = {
+    'engine': bench_engine,
+    'preview': bench_preview,
+    'rules': bench_rules,
+    'site': bench_site,
+    'stream': bench_stream,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--sizes', type=lambda value: [int(v) for v in value.split(',')],
+                        default=[1, 10, 100], help='document sizes in MB')
+    parser.add_argument('--edits', type=int, default=2000, help='keystrokes to simulate')
+    parser.add_argument('--files', type=int, default=40000, help='pages in the docs tree')
+    parser.add_argument('--workers', type=int, help='processes (default: all cores)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size (best is kept)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
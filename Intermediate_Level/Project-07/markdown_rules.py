@@ -0,0 +1,192 @@
+"""
+Rule registry for the Markdown converter
+
+Inline rules are joined into one precompiled regex alternation, so adding a
+rule adds an alternative to the single scan rather than another pass over the
+document. Group names must be unique across rules, so prefix them with the
+rule name (`strong_text`, `link_href`, ...).
+
+Block rules are offered lines that start with one of their `starts` prefixes.
+A rule may open a block, which then consumes lines until it ends.
+
+Built-in extensions (enable with MarkdownToHTML(extensions=[...])):
+strikethrough, images, tables, fenced_code
+"""
+
+import html
+import re
+
+
+class InlineRule:
+    """`pattern` matched by the combined regex; `render(match, inline)` -> HTML
+
+    `inline(text)` renders nested markup; `starts` lists the characters a
+    match can begin with, used to skip text that cannot contain the rule.
+    """
+
+    def __init__(self, name, pattern, render, starts):
+        self.name = name
+        self.pattern = pattern
+        self.render = render
+        self.starts = starts
+
+
+class BlockRule:
+    """Opens a block on lines starting with one of `starts`
+
+    `open(line, converter)` returns an object with `feed(line)` (True while the
+    line belongs to the block) and `close()` (yields HTML lines), or None.
+    `fence` is set for rules whose blocks may contain blank lines.
+    """
+
+    name = None
+    starts = ()
+    fence = None
+
+    def open(self, line, converter):
+        raise NotImplementedError
+
+
+def escape(text):
+    return html.escape(text, quote=False)
+
+
+# ==================== Core inline rules ====================
+
+STRONG = InlineRule(
+    "strong", r'\*\*(?P<strong_text>.*?)\*\*',
+    lambda match, inline: f"<strong>{inline(match['strong_text'])}</strong>", "*")
+
+# Italic may contain whole bold spans: *a **b** c*
+EMPHASIS = InlineRule(
+    "em", r'\*(?P<em_text>[^*\n]*(?:\*\*[^*\n]*\*\*[^*\n]*)*)\*',
+    lambda match, inline: f"<em>{inline(match['em_text'])}</em>", "*")
+
+CODE = InlineRule(
+    "code", r'`(?P<code_text>.*?)`',
+    lambda match, inline: f"<code>{escape(match['code_text'])}</code>", "`")
+
+LINK = InlineRule(
+    "link", r'\[(?P<link_text>.*?)\]\((?P<link_href>.*?)\)',
+    lambda match, inline: f'<a href="{match["link_href"]}">{inline(match["link_text"])}</a>',
+    "[")
+
+CORE_INLINE_RULES = [STRONG, EMPHASIS, CODE, LINK]
+
+
+# ==================== Extensions ====================
+
+STRIKETHROUGH = InlineRule(
+    "del", r'~~(?P<del_text>.+?)~~',
+    lambda match, inline: f"<del>{inline(match['del_text'])}</del>", "~")
+
+IMAGE = InlineRule(
+    "image", r'!\[(?P<image_alt>.*?)\]\((?P<image_src>.*?)\)',
+    lambda match, inline: (f'<img src="{match["image_src"]}" '
+                           f'alt="{html.escape(match["image_alt"])}" />'),
+    "!")
+
+
+class _CodeBlock:
+    def __init__(self, info):
+        self.language = info.split()[0] if info.split() else ""
+        self.lines = []
+        self.closed = False
+
+    def feed(self, line):
+        if self.closed:
+            return False
+        if line.startswith("```"):
+            self.closed = True
+        else:
+            self.lines.append(line)
+        return True
+
+    def close(self):
+        attrs = f' class="language-{escape(self.language)}"' if self.language else ""
+        code = "".join(escape(line) + "\n" for line in self.lines)
+        yield f"<pre><code{attrs}>{code}</code></pre>"
+
+
+class FencedCode(BlockRule):
+    """``` fences, optional language; runs to the end if never closed"""
+
+    name = "fenced_code"
+    starts = ("```",)
+    fence = "```"
+
+    def open(self, line, converter):
+        return _CodeBlock(line[3:])
+
+
+TABLE_DELIMITER_RE = re.compile(r'\s*:?-+:?\s*')
+
+
+def split_cells(row):
+    row = row.strip()
+    if row.startswith("|"):
+        row = row[1:]
+    if row.endswith("|"):
+        row = row[:-1]
+    return [cell.strip() for cell in row.split("|")]
+
+
+class _TableBlock:
+    def __init__(self, line, converter):
+        self.rows = [line]
+        self.converter = converter
+
+    def feed(self, line):
+        if line.startswith("|"):
+            self.rows.append(line)
+            return True
+        return False
+
+    def close(self):
+        header, delimiter = (self.rows + [None])[:2]
+        head = split_cells(header)
+        aligns = split_cells(delimiter) if delimiter else []
+        if len(aligns) != len(head) or not all(TABLE_DELIMITER_RE.fullmatch(a) for a in aligns):
+            # Not a table after all: plain paragraphs, as without the extension
+            for row in self.rows:
+                yield self.converter.render_paragraph(row)
+            return
+
+        aligns = [' align="center"' if a.startswith(":") and a.endswith(":")
+                  else ' align="right"' if a.endswith(":")
+                  else ' align="left"' if a.startswith(":") else ""
+                  for a in aligns]
+        inline = self.converter.render_inline
+        html = ["<table>", "<thead>", "<tr>"]
+        html += [f"<th{align}>{inline(cell)}</th>" for cell, align in zip(head, aligns)]
+        html += ["</tr>", "</thead>"]
+        if len(self.rows) > 2:
+            html.append("<tbody>")
+            for row in self.rows[2:]:
+                cells = split_cells(row)
+                cells = (cells + [""] * len(aligns))[:len(aligns)]
+                html.append("<tr>")
+                html += [f"<td{align}>{inline(cell)}</td>" for cell, align in zip(cells, aligns)]
+                html.append("</tr>")
+            html.append("</tbody>")
+        html.append("</table>")
+        # One item for the whole table: the caller joins items with newlines
+        yield "\n".join(html)
+
+
+class Table(BlockRule):
+    """GitHub-style pipe tables: header row, delimiter row, body rows"""
+
+    name = "tables"
+    starts = ("|",)
+
+    def open(self, line, converter):
+        return _TableBlock(line, converter)
+
+
+EXTENSIONS = {
+    "strikethrough": STRIKETHROUGH,
+    "images": IMAGE,
+    "tables": Table(),
+    "fenced_code": FencedCode(),
+}
@@ -1,11 +1,65 @@
 import re
 import os
 
+from markdown_rules import CORE_INLINE_RULES, EXTENSIONS, BlockRule, InlineRule
+
+# Original pipeline patterns, compiled once
+HEADING_PATTERNS = [
+    (level, re.compile(f'^{"#" * level} (.*)$', flags=re.MULTILINE))
+    for level in range(6, 0, -1)
+]
+BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+ITALIC_RE = re.compile(r'\*(.*?)\*')
+INLINE_CODE_RE = re.compile(r'`(.*?)`')
+LINK_RE = re.compile(r'\[(.*?)\]\((.*?)\)')
+
 
 class MarkdownToHTML:
-    def __init__(self, input_file, output_file):
+    def __init__(self, input_file=None, output_file=None, extensions=()):
         self.input_file = input_file
         self.output_file = output_file
+        self.inline_rules = list(CORE_INLINE_RULES)
+        self.block_rules = []
+        for extension in extensions:
+            self.use(extension, compile=False)
+        self._compile()
+
+    def use(self, extension, compile=True):
+        # An extension name from markdown_rules.EXTENSIONS, or a rule object
+        rule = EXTENSIONS[extension] if isinstance(extension, str) else extension
+        if isinstance(rule, InlineRule):
+            self.inline_rules.append(rule)
+        elif isinstance(rule, BlockRule):
+            self.block_rules.append(rule)
+        else:
+            raise TypeError(f"Not a Markdown rule: {extension!r}")
+        if compile:
+            self._compile()
+        return self
+
+    def add_inline_rule(self, rule, before=None):
+        names = [existing.name for existing in self.inline_rules]
+        self.inline_rules.insert(names.index(before) if before else len(names), rule)
+        self._compile()
+
+    def _compile(self):
+        # All inline rules become alternatives of one regex: one scan per line.
+        # Groups are numbered in order, so each group index belongs to exactly
+        # one rule and a match is routed by the last group it closed.
+        # (Wrapping each rule in its own group would stop the regex engine
+        # from skipping ahead to a possible first character.)
+        patterns, self._group_rules, self._rule_patterns = [], [None], []
+        for rule in self.inline_rules:
+            compiled = re.compile(rule.pattern)
+            pattern = rule.pattern if compiled.groups else f"(?P<{rule.name}>{rule.pattern})"
+            patterns.append(pattern)
+            self._group_rules.extend([rule] * max(compiled.groups, 1))
+            self._rule_patterns.append((compiled, rule))
+        self._inline_re = re.compile("|".join(patterns))
+        starts = "".join(sorted({char for rule in self.inline_rules for char in rule.starts}))
+        self._inline_start_re = re.compile(f"[{re.escape(starts)}]")
+        self._block_starts = tuple(prefix for rule in self.block_rules for prefix in rule.starts)
+        self.fences = tuple(rule.fence for rule in self.block_rules if rule.fence)
 
     def read_markdown(self):
         with open(self.input_file, "r", encoding="utf-8") as file:
@@ -16,29 +70,20 @@ class MarkdownToHTML:
             file.write(content)
 
     def parse_headings(self, text):
-        for level in range(6, 0, -1):
-            text = re.sub(
-                f'^{"#" * level} (.*)$',
-                f'<h{level}>\\1</h{level}>',
-                text,
-                flags=re.MULTILINE
-            )
+        for level, pattern in HEADING_PATTERNS:
+            text = pattern.sub(f'<h{level}>\\1</h{level}>', text)
         return text
 
     def parse_bold_italic(self, text):
-        text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
-        text = re.sub(r'\*(.*?)\*', r'<em>\1</em>', text)
+        text = BOLD_RE.sub(r'<strong>\1</strong>', text)
+        text = ITALIC_RE.sub(r'<em>\1</em>', text)
         return text
 
     def parse_inline_code(self, text):
-        return re.sub(r'`(.*?)`', r'<code>\1</code>', text)
+        return INLINE_CODE_RE.sub(r'<code>\1</code>', text)
 
     def parse_links(self, text):
-        return re.sub(
-            r'\[(.*?)\]\((.*?)\)',
-            r'<a href="\2">\1</a>',
-            text
-        )
+        return LINK_RE.sub(r'<a href="\2">\1</a>', text)
 
     def parse_lists(self, text):
         lines = text.split("\n")
@@ -76,9 +121,8 @@ class MarkdownToHTML:
 
         return "\n".join(result)
 
-    def convert(self):
-        markdown = self.read_markdown()
-
+    def render_multipass(self, markdown):
+        # Original pipeline: one full pass over the document per rule
         html = markdown
         html = self.parse_headings(html)
         html = self.parse_bold_italic(html)
@@ -86,7 +130,110 @@ class MarkdownToHTML:
         html = self.parse_links(html)
         html = self.parse_lists(html)
         html = self.parse_paragraphs(html)
+        return html
+
+    def _render_match(self, match):
+        if match.lastindex:
+            rule = self._group_rules[match.lastindex]
+        else:
+            # Only optional groups, none of which took part: the alternation
+            # picked the first rule that matches here
+            rule = next(rule for compiled, rule in self._rule_patterns
+                        if compiled.match(match.string, match.start()))
+        return rule.render(match, self.render_inline)
+
+    def render_inline(self, text):
+        # Text with none of the rules' start characters can't match: skip the scan
+        if self._inline_start_re.search(text):
+            return self._inline_re.sub(self._render_match, text)
+        return text
+
+    def render_paragraph(self, line):
+        # Lines that start as raw HTML pass through unwrapped
+        html = self.render_inline(line)
+        return html if line[0] == "<" else f"<p>{html}</p>"
+
+    def render_lines(self, lines):
+        # One pass over the lines, yielding HTML lines as blocks close
+        render_inline = self.render_inline
+        block_starts = self._block_starts
+        in_list = False
+        block = None
+
+        for line in lines:
+            if block is not None:
+                if block.feed(line):
+                    continue
+                yield from block.close()
+                block = None
+
+            if block_starts and line.startswith(block_starts):
+                for rule in self.block_rules:
+                    if line.startswith(rule.starts):
+                        block = rule.open(line, self)
+                        if block is not None:
+                            break
+                if block is not None:
+                    if in_list:
+                        yield "</ul>"
+                        in_list = False
+                    continue
+
+            if line[:2] == "- ":
+                if not in_list:
+                    yield "<ul>"
+                    in_list = True
+                yield f"<li>{render_inline(line[2:])}</li>"
+                continue
+
+            if in_list:
+                yield "</ul>"
+                in_list = False
 
+            if line[:1] == "#":
+                level = len(line) - len(line.lstrip("#"))
+                if level <= 6 and line[level:level + 1] == " ":
+                    yield f"<h{level}>{render_inline(line[level + 1:])}</h{level}>"
+                    continue
+            if line and not line.isspace():
+                yield self.render_paragraph(line)
+
+        if block is not None:
+            yield from block.close()
+        if in_list:
+            yield "</ul>"
+
+    def render(self, markdown):
+        lines = markdown.split("\n")
+        if len(lines) > 1 and not lines[-1]:
+            lines.pop()   # a final newline ends the last line, as when reading a file
+        return "\n".join(self.render_lines(lines))
+
+    def _write_lines(self, html_lines, out_file):
+        first = True
+        for html in html_lines:
+            out_file.write(html if first else "\n" + html)
+            first = False
+
+    def convert_stream(self, in_file=None, out_file=None):
+        # Same output as render(), holding only the current line in memory.
+        # Files may be paths or open text files; default to the converter's own
+        in_file = self.input_file if in_file is None else in_file
+        out_file = self.output_file if out_file is None else out_file
+
+        if isinstance(in_file, (str, os.PathLike)):
+            with open(in_file, "r", encoding="utf-8") as file:
+                return self.convert_stream(file, out_file)
+        if isinstance(out_file, (str, os.PathLike)):
+            with open(out_file, "w", encoding="utf-8") as file:
+                return self.convert_stream(in_file, file)
+
+        lines = (line[:-1] if line.endswith("\n") else line for line in in_file)
+        self._write_lines(self.render_lines(lines), out_file)
+
+    def convert(self):
+        markdown = self.read_markdown()
+        html = self.render(markdown)
         self.write_html(html)
         print("Markdown successfully converted to HTML.")
 
@@ -0,0 +1,142 @@
+"""
+Incremental Markdown rendering for live preview
+
+The document is split into blocks at blank lines. A block's HTML depends only
+on its own text: blank lines end a list, and every other rule works on a single
+line. Rendered HTML is therefore cached per block text, and an edit only
+re-renders the blocks it touches. Blank lines inside fenced code (block rules
+with a `fence`) do not split blocks.
+
+    renderer = IncrementalRenderer(open("notes.md").read())
+    patch = renderer.edit(120, 120, "x")   # user typed "x" at offset 120
+    # patch.index / patch.removed / patch.html: replace that many block
+    # elements in the preview; renderer.html is the whole page
+
+Each block keeps its trailing blank lines, so the blocks concatenate back to
+the exact document and character offsets map directly onto blocks.
+"""
+
+import re
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+from markdown_to_html import MarkdownToHTML
+
+# One or more blank (whitespace-only) lines, with the newline before them
+SEPARATOR_RE = re.compile(r'\n(?:[^\S\n]*\n)+')
+
+# Replace `removed` block elements starting at `index` with `html` (one per block)
+Patch = namedtuple("Patch", "index removed html")
+
+
+def fence_pattern(fences):
+    """Regex for lines that open or close a fence, or None"""
+    if not fences:
+        return None
+    return re.compile("^(?:" + "|".join(map(re.escape, fences)) + ")", re.MULTILINE)
+
+
+def split_blocks(text, fence_re=None):
+    """Blocks that end after their trailing blank lines; ''.join() gives `text`"""
+    blocks = []
+    pos = scanned = 0
+    in_fence = False
+    for match in SEPARATOR_RE.finditer(text):
+        if fence_re is not None:
+            if len(fence_re.findall(text, scanned, match.end())) % 2:
+                in_fence = not in_fence
+            scanned = match.end()
+            if in_fence:
+                continue
+        blocks.append(text[pos:match.end()])
+        pos = match.end()
+    if pos < len(text) or not blocks:
+        blocks.append(text[pos:])
+    return blocks
+
+
+class IncrementalRenderer:
+    """Document state plus an LRU cache of block text -> HTML"""
+
+    def __init__(self, markdown="", converter=None, cache_size=10000):
+        self.converter = converter or MarkdownToHTML()
+        self.fence_re = fence_pattern(self.converter.fences)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.set_text(markdown)
+
+    def render_block(self, block):
+        html = self._cache.get(block)
+        if html is not None:
+            self._cache.move_to_end(block)
+            self.hits += 1
+            return html
+        self.misses += 1
+        html = self.converter.render(block)
+        self._cache[block] = html
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return html
+
+    def set_text(self, markdown):
+        """Replace the whole document, reusing cached blocks; returns the HTML"""
+        self.blocks = split_blocks(markdown, self.fence_re)
+        self.block_html = [self.render_block(block) for block in self.blocks]
+        self.starts = []
+        offset = 0
+        for block in self.blocks:
+            self.starts.append(offset)
+            offset += len(block)
+        self.length = offset
+        return self.html
+
+    def edit(self, start, end, text):
+        """Replace document[start:end] with `text`; returns the Patch to apply"""
+        if not 0 <= start <= end <= self.length:
+            raise ValueError(f"edit range {start}:{end} outside document of {self.length}")
+
+        # Blocks overlapping the edit, plus one neighbour each side: the edit
+        # may add or remove the blank lines that separate them
+        first = max(bisect_right(self.starts, start) - 2, 0)
+        last = min(bisect_right(self.starts, end), len(self.blocks) - 1)
+        region_start = self.starts[first]
+
+        old = "".join(self.blocks[first:last + 1])
+        region = old[:start - region_start] + text + old[end - region_start:]
+        if self.fence_re is not None and (len(self.fence_re.findall(old)) % 2
+                                          != len(self.fence_re.findall(region)) % 2):
+            # A fence opened or closed: every later block boundary may move
+            region += "".join(self.blocks[last + 1:])
+            last = len(self.blocks) - 1
+        new_blocks = split_blocks(region, self.fence_re)
+        if region == "" and len(self.blocks) > last - first + 1:
+            new_blocks = []   # the whole region was deleted; don't keep an empty block
+        new_html = [self.render_block(block) for block in new_blocks]
+
+        new_starts = []
+        offset = region_start
+        for block in new_blocks:
+            new_starts.append(offset)
+            offset += len(block)
+        delta = len(text) - (end - start)
+        tail = [position + delta for position in self.starts[last + 1:]]
+
+        self.blocks[first:last + 1] = new_blocks
+        self.block_html[first:last + 1] = new_html
+        self.starts[first:] = new_starts + tail
+        self.length += delta
+        return Patch(first, last - first + 1, new_html)
+
+    @property
+    def text(self):
+        return "".join(self.blocks)
+
+    @property
+    def html(self):
+        return "\n".join(html for html in self.block_html if html)
+
+    def stats(self):
+        return {"blocks": len(self.blocks), "cached": len(self._cache),
+                "hits": self.hits, "misses": self.misses}
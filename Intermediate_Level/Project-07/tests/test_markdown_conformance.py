@@ -0,0 +1,99 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_rules import EXTENSIONS
+from markdown_to_html import MarkdownToHTML
+
+# (markdown, expected HTML) for the CommonMark subset the converter supports.
+# Expected output follows the CommonMark reference renderer, minus the
+# trailing newline, with one HTML element per line.
+CORE_CASES = [
+    # ATX headings
+    ("# foo", "<h1>foo</h1>"),
+    ("###### foo", "<h6>foo</h6>"),
+    ("####### foo", "<p>####### foo</p>"),
+    ("#5 bolt", "<p>#5 bolt</p>"),
+    ("# foo *bar*", "<h1>foo <em>bar</em></h1>"),
+    # Bullet lists
+    ("- one\n- two", "<ul>\n<li>one</li>\n<li>two</li>\n</ul>"),
+    ("- a\n\npara", "<ul>\n<li>a</li>\n</ul>\n<p>para</p>"),
+    ("- **b** and `c`", "<ul>\n<li><strong>b</strong> and <code>c</code></li>\n</ul>"),
+    # Emphasis
+    ("*foo bar*", "<p><em>foo bar</em></p>"),
+    ("**foo bar**", "<p><strong>foo bar</strong></p>"),
+    ("*foo **bar** baz*", "<p><em>foo <strong>bar</strong> baz</em></p>"),
+    ("**foo *bar* baz**", "<p><strong>foo <em>bar</em> baz</strong></p>"),
+    # Code spans: contents are literal and escaped
+    ("`foo`", "<p><code>foo</code></p>"),
+    ("`<a>`", "<p><code>&lt;a&gt;</code></p>"),
+    ("`*not emphasis*`", "<p><code>*not emphasis*</code></p>"),
+    # Links
+    ("[link](/uri)", '<p><a href="/uri">link</a></p>'),
+    ("[*em* link](/uri)", '<p><a href="/uri"><em>em</em> link</a></p>'),
+    ("**[bold link](/uri)**", '<p><strong><a href="/uri">bold link</a></strong></p>'),
+    # Paragraphs and raw HTML
+    ("aaa\n\nbbb", "<p>aaa</p>\n<p>bbb</p>"),
+    ("<div>raw</div>", "<div>raw</div>"),
+    ("\n\n", ""),
+]
+
+EXTENSION_CASES = [
+    # Strikethrough (GFM)
+    ("~~Hi~~ Hello", "<p><del>Hi</del> Hello</p>"),
+    ("~~**strong**~~", "<p><del><strong>strong</strong></del></p>"),
+    # Images
+    ("![foo](/url)", '<p><img src="/url" alt="foo" /></p>'),
+    ("see ![a](b.png) and [c](d)", '<p>see <img src="b.png" alt="a" /> and <a href="d">c</a></p>'),
+    # Fenced code
+    ("```\n<\n >\n```", "<pre><code>&lt;\n &gt;\n</code></pre>"),
+    ("```ruby\ndef foo(x)\n  return 3\nend\n```",
+     '<pre><code class="language-ruby">def foo(x)\n  return 3\nend\n</code></pre>'),
+    ("```\naaa\n\n*bbb*\n```", "<pre><code>aaa\n\n*bbb*\n</code></pre>"),
+    ("```\n```", "<pre><code></code></pre>"),
+    ("```\nunclosed", "<pre><code>unclosed\n</code></pre>"),
+    ("- a\n```\nb\n```", "<ul>\n<li>a</li>\n</ul>\n<pre><code>b\n</code></pre>"),
+    # Tables (GFM)
+    ("| foo | bar |\n| --- | --- |\n| baz | bim |",
+     "<table>\n<thead>\n<tr>\n<th>foo</th>\n<th>bar</th>\n</tr>\n</thead>\n"
+     "<tbody>\n<tr>\n<td>baz</td>\n<td>bim</td>\n</tr>\n</tbody>\n</table>"),
+    ("| abc | defghi |\n|:-:|-----------:|\n| bar | baz |",
+     '<table>\n<thead>\n<tr>\n<th align="center">abc</th>\n<th align="right">defghi</th>\n'
+     '</tr>\n</thead>\n<tbody>\n<tr>\n<td align="center">bar</td>\n<td align="right">baz</td>\n'
+     '</tr>\n</tbody>\n</table>'),
+    ("| a | b |\n|---|---|\n| `x` | **y** |\n| only |",
+     "<table>\n<thead>\n<tr>\n<th>a</th>\n<th>b</th>\n</tr>\n</thead>\n<tbody>\n"
+     "<tr>\n<td><code>x</code></td>\n<td><strong>y</strong></td>\n</tr>\n"
+     "<tr>\n<td>only</td>\n<td></td>\n</tr>\n</tbody>\n</table>"),
+    ("| abc |\n| def |", "<p>| abc |</p>\n<p>| def |</p>"),
+]
+
+# Known gaps: strict, so fixing one shows up as a failure to move it
+KNOWN_GAPS = [
+    pytest.param("aaa\nbbb", "<p>aaa\nbbb</p>", id="paragraph-continuation"),
+    pytest.param("a & b", "<p>a &amp; b</p>", id="escape-text"),
+    pytest.param("\\*not\\*", "<p>*not*</p>", id="backslash-escape"),
+    pytest.param("***both***", "<p><em><strong>both</strong></em></p>", id="triple-emphasis"),
+    pytest.param("1. one", "<ol>\n<li>one</li>\n</ol>", id="ordered-list"),
+    pytest.param("# foo #", "<h1>foo</h1>", id="closing-hashes"),
+]
+
+
+@pytest.mark.parametrize("markdown, expected", CORE_CASES)
+def test_core(markdown, expected):
+    assert MarkdownToHTML().render(markdown) == expected
+
+
+@pytest.mark.parametrize("markdown, expected", CORE_CASES + EXTENSION_CASES)
+def test_with_extensions(markdown, expected):
+    converter = MarkdownToHTML(extensions=list(EXTENSIONS))
+    assert converter.render(markdown) == expected
+
+
+@pytest.mark.xfail(strict=True)
+@pytest.mark.parametrize("markdown, expected", KNOWN_GAPS)
+def test_known_gaps(markdown, expected):
+    assert MarkdownToHTML().render(markdown) == expected
@@ -0,0 +1,164 @@
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_convert
+import benchmark
+from markdown_rules import InlineRule
+from markdown_to_html import MarkdownToHTML
+from render_cache import IncrementalRenderer, split_blocks
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read(name):
+    with open(os.path.join(BASE_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def test_sample_document_matches_output_html():
+    converter = MarkdownToHTML()
+    assert converter.render(read("input.md")) == read("output.html")
+
+
+def test_single_pass_matches_multipass_pipeline():
+    converter = MarkdownToHTML()
+    random.seed(1)
+    document = benchmark.make_document(50_000)
+    assert converter.render(document) == converter.render_multipass(document)
+
+    extra = ("####### seven\n#nospace\n# \n- a\n\n- b\n  \n*a **b** c*\n"
+             "**[x](y)** and [*t*](u)\nplain `c` end")
+    # Intentional difference: a line that starts with inline markup is a
+    # paragraph too; the old pipeline left it unwrapped
+    expected = converter.render_multipass(extra)
+    for line in ('<em>a <strong>b</strong> c</em>',
+                 '<strong><a href="y">x</a></strong> and <a href="u"><em>t</em></a>'):
+        expected = expected.replace(f"\n{line}\n", f"\n<p>{line}</p>\n")
+    assert converter.render(extra) == expected
+
+    # Intentional difference: code span contents are escaped
+    assert converter.render("use `a<b>` here") == "<p>use <code>a&lt;b&gt;</code> here</p>"
+    assert converter.render_multipass("use `a<b>` here") == "<p>use <code>a<b></code> here</p>"
+
+
+def test_stream_matches_batch_with_bounded_memory(tmp_path):
+    converter = MarkdownToHTML()
+    random.seed(2)
+    document = benchmark.make_document(2_000_000) + "\n- last item"
+    source = tmp_path / "big.md"
+    source.write_text(document, encoding="utf-8")
+
+    tracemalloc.start()
+    converter.convert_stream(str(source), str(tmp_path / "big.html"))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert (tmp_path / "big.html").read_text(encoding="utf-8") == converter.render(document)
+    assert peak < 200_000   # a few lines' worth, not the 2 MB document
+
+
+def test_batch_build_skips_unchanged_files(tmp_path):
+    docs, site = tmp_path / "docs", tmp_path / "site"
+    (docs / "guide").mkdir(parents=True)
+    (docs / "index.md").write_text("# Home\n- [Guide](guide/intro.html)\n", encoding="utf-8")
+    (docs / "guide" / "intro.md").write_text("Some **bold** text\n", encoding="utf-8")
+
+    report = batch_convert.build(str(docs), str(site), workers=2)
+    assert (report["sources"], report["converted"]) == (2, 2)
+    assert (site / "guide" / "intro.html").read_text(encoding="utf-8") == \
+        "<p>Some <strong>bold</strong> text</p>"
+
+    assert batch_convert.build(str(docs), str(site))["hashed"] == 0
+    os.utime(docs / "index.md", ns=(0, 0))   # touched, same content
+    report = batch_convert.build(str(docs), str(site))
+    assert (report["hashed"], report["converted"]) == (1, 0)
+    (docs / "index.md").write_text("# Changed\n", encoding="utf-8")
+    assert batch_convert.build(str(docs), str(site))["converted"] == 1
+    assert (site / "index.html").read_text(encoding="utf-8") == "<h1>Changed</h1>"
+
+
+def test_batch_build_reports_failures_and_removes_stale_pages(tmp_path, monkeypatch, capsys):
+    docs, site = tmp_path / "docs", tmp_path / "site"
+    docs.mkdir()
+    for name in ("a", "b", "c"):
+        (docs / f"{name}.md").write_text(f"# {name}\n", encoding="utf-8")
+    (docs / "bad.md").write_bytes(b"# caf\xe9\n")     # not UTF-8
+
+    report = batch_convert.build(str(docs), str(site), workers=1)
+    assert (report["sources"], report["converted"], report["unchanged"]) == (4, 3, 0)
+    assert [relative for relative, _ in report["failed"]] == ["bad.md"]
+    assert "UnicodeDecodeError" in report["failed"][0][1]
+    assert (site / "c.html").exists() and not (site / "bad.html").exists()
+
+    # The failure is retried, and deleting a source deletes its page
+    (docs / "c.md").unlink()
+    report = batch_convert.build(str(docs), str(site), workers=1)
+    assert (report["hashed"], report["removed"], len(report["failed"])) == (1, 1, 1)
+    assert not (site / "c.html").exists()
+
+    (docs / "bad.md").write_text("# fixed\n", encoding="utf-8")
+    (docs / "a.md").write_text("# a, again\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["batch_convert.py", str(docs), "--out", str(site)])
+    batch_convert.main()
+    out = capsys.readouterr().out
+    assert "3 files: 2 converted, 1 unchanged, 0 failed, 0 removed" in out
+    assert "Throughput:" in out
+    assert (site / "bad.html").read_text(encoding="utf-8") == "<h1>fixed</h1>"
+
+
+def test_incremental_edits_match_full_render():
+    converter = MarkdownToHTML()
+    random.seed(3)
+    text = benchmark.make_document(5_000)
+    renderer = IncrementalRenderer(text)
+    for _ in range(300):
+        start = random.randint(0, len(text))
+        end = min(len(text), start + random.choice([0, 1, 5, 50]))
+        typed = random.choice(["\n", "\n\n", "- ", "# ", "x", "**", "  \n", ""])
+        patch = renderer.edit(start, end, typed)
+        text = text[:start] + typed + text[end:]
+        assert renderer.html == converter.render(text)
+
+    # Typing one character re-renders only the block it lands in and its neighbours
+    misses = renderer.misses
+    patch = renderer.edit(len(text) // 2, len(text) // 2, "x")
+    assert patch.removed <= 3 and renderer.misses - misses <= 3
+    assert renderer.blocks == split_blocks(text[:len(text) // 2] + "x" + text[len(text) // 2:])
+
+
+def test_incremental_edits_inside_fenced_code():
+    converter = MarkdownToHTML(extensions=["fenced_code", "tables"])
+    random.seed(4)
+    text = benchmark.make_document(3_000)
+    renderer = IncrementalRenderer(text, converter)
+    for _ in range(300):
+        start = random.randint(0, len(text))
+        end = min(len(text), start + random.choice([0, 1, 5, 50]))
+        typed = random.choice(["\n", "\n\n", "```", "```py\n", "\n```\n", "| a |\n|---|\n", "x"])
+        renderer.edit(start, end, typed)
+        text = text[:start] + typed + text[end:]
+        assert renderer.html == converter.render(text)
+
+    # A blank line inside a fence does not split the code block
+    renderer.set_text("```\na\n\nb\n```\n\ntail\n")
+    assert renderer.blocks == ["```\na\n\nb\n```\n\n", "tail\n"]
+
+
+def test_plugin_rules_with_unnamed_or_optional_groups():
+    converter = MarkdownToHTML()
+    converter.use(InlineRule(
+        "abbr", r'\+\+(?P<abbr_text>[^+]+)\+\+(\{[^}]*\})?',
+        lambda match, inline: f"<abbr>{match['abbr_text']}</abbr>", "+"))
+    converter.use(InlineRule(
+        "mark", r'==(?P<mark_text>[^=]+)?==',
+        lambda match, inline: f"<mark>{inline(match['mark_text'] or '')}</mark>", "="))
+    converter.add_inline_rule(InlineRule(
+        "kbd", r'\[\[\w+\]\]', lambda match, inline: f"<kbd>{match[0][2:-2]}</kbd>", "["),
+        before="link")
+    assert converter.render("a ++b++{x} c ++d++ ==== ==*e*== [[Ctrl]] [l](u)") == (
+        '<p>a <abbr>b</abbr> c <abbr>d</abbr> <mark></mark> <mark><em>e</em></mark> '
+        '<kbd>Ctrl</kbd> <a href="u">l</a></p>')